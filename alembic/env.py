@@ -10,6 +10,7 @@ from sqlmodel import SQLModel
 
 # Import settings to get DATABASE_URL
 from app.core.config import settings
+from app.core.migrations import set_migration_timeouts
 
 # Import all models to register them with SQLModel.metadata
 from app.models.user import User  # noqa: F401
@@ -54,9 +55,18 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
     )
 
     with context.begin_transaction():
+        if url.startswith("postgresql"):
+            context.execute(
+                f"SET lock_timeout = '{settings.MIGRATION_LOCK_TIMEOUT}'"
+            )
+            context.execute(
+                f"SET statement_timeout = "
+                f"'{settings.MIGRATION_STATEMENT_TIMEOUT}'"
+            )
         context.run_migrations()
 
 
@@ -74,10 +84,15 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
+        # Fail fast instead of queueing API queries behind a blocked lock
+        set_migration_timeouts(connection)
         context.configure(
             connection=connection, 
             target_metadata=target_metadata,
             compare_type=True,  # Detect column type changes
+            # Commit each revision on its own, so that long migrations do
+            # not hold the locks of earlier ones
+            transaction_per_migration=True,
         )
 
         with context.begin_transaction():
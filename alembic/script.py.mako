@@ -10,6 +10,8 @@ from typing import Sequence, Union
 from alembic import op
 import sqlalchemy as sa
 import sqlmodel
+# Large tables: see app.core.migrations for CONCURRENTLY indexes, safe
+# column additions and batched backfills
 ${imports if imports else ""}
 
 # revision identifiers, used by Alembic.
@@ -0,0 +1,31 @@
+"""Add last_login_at to users
+
+Revision ID: 3f6b2c1d9e4a
+Revises: cad9f2348eab
+Create Date: 2026-10-19 10:12:31.482907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+# Large tables: see app.core.migrations for CONCURRENTLY indexes, safe
+# column additions and batched backfills
+from app.core.migrations import add_column
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6b2c1d9e4a'
+down_revision: Union[str, None] = 'cad9f2348eab'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nullable without a default: a metadata-only change
+    add_column('users', sa.Column('last_login_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('users', 'last_login_at')
@@ -2,12 +2,14 @@ from typing import Annotated
 
 import jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import ValidationError
 from sqlmodel import Session, select
 
-from app.core.config import settings
 from app.core.database import get_session
+from app.core.security import decode_token, get_token_epoch
+from app.core.tracing import traced
 from app.models.user import User
 from app.schemas.token import TokenPayload
 
@@ -19,6 +21,7 @@ SessionDep = Annotated[Session, Depends(get_session)]
 TokenDep = Annotated[str, Depends(oauth2_scheme)]
 
 
+@traced("deps.get_current_user")
 async def get_current_user(session: SessionDep, token: TokenDep) -> User:
     """
     Get the current authenticated user from JWT token.
@@ -31,10 +34,8 @@ async def get_current_user(session: SessionDep, token: TokenDep) -> User:
         Current authenticated user
 
     Raises:
-        HTTPException: If token is invalid, blacklisted, or user not found
+        HTTPException: If token is invalid, revoked, or user not found
     """
-    from app.core.security import is_token_blacklisted
-    
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,28 +43,30 @@ async def get_current_user(session: SessionDep, token: TokenDep) -> User:
     )
 
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_token(token)
         token_data = TokenPayload(**payload)
 
         if token_data.sub is None:
             raise credentials_exception
         
-        # Check if token is blacklisted
-        if token_data.jti and await is_token_blacklisted(token_data.jti):
+        # Tokens issued before the user's current epoch have been revoked
+        if token_data.epoch < await get_token_epoch(int(token_data.sub)):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Token has been revoked",
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-    except (jwt.PyJWTError, ValidationError):
+    except (jwt.PyJWTError, ValidationError, ValueError):
         raise credentials_exception
 
-    user = session.exec(
-        select(User).where(User.id == int(token_data.sub))
-    ).first()
+    # Run the blocking query off the event loop: holding the loop while
+    # waiting for a pooled connection deadlocks under concurrency.
+    user = await run_in_threadpool(
+        lambda: session.exec(
+            select(User).where(User.id == int(token_data.sub))
+        ).first()
+    )
 
     if user is None:
         raise credentials_exception
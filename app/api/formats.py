@@ -0,0 +1,277 @@
+"""Binary request and response formats negotiated per request.
+
+Routes of a router built with ``route_class=NegotiatedRoute`` accept
+MessagePack request bodies (``Content-Type: application/msgpack``), which
+are decoded and validated against the same body models as JSON. A route
+answers in the format picked from the ``Accept`` header by its
+``ResponseFormat`` (JSON or MessagePack) or ``ListResponseFormat``
+(also Arrow IPC streams, for lists) dependency, passing its result and
+response model to ``negotiated_response``.
+
+MessagePack needs the ``msgpack`` package and Arrow the ``pyarrow``
+package; a format whose package is missing is not offered, so clients get
+JSON. Datetimes are sent as native timestamps (the MessagePack timestamp
+extension, Arrow ``timestamp[us, UTC]``) rather than ISO strings.
+"""
+import types
+import typing
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Annotated, Any, Union
+
+from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from pydantic import TypeAdapter
+
+from app.core.compression import parse_qvalues
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+# Names MessagePack clients send besides the registered one
+MSGPACK_ALIASES = (MSGPACK, "application/x-msgpack")
+EPOCH = datetime(1970, 1, 1)
+
+
+def negotiate_media_type(accept: str, offers: tuple[str, ...]) -> str:
+    """
+    Pick the response media type for an ``Accept`` header.
+
+    The offer with the highest quality wins, ties going to the earliest
+    offer, so ``*/*`` and browsers get the first one (JSON). Nothing
+    acceptable also falls back to the first offer rather than 406.
+
+    Args:
+        accept: Value of the request header (empty means ``*/*``)
+        offers: Media types the route can produce, in preference order
+
+    Returns:
+        One of ``offers``
+    """
+    accepted = parse_qvalues(accept or "*/*")
+    best, best_quality = offers[0], 0.0
+    for offer in offers:
+        names = MSGPACK_ALIASES if offer == MSGPACK else (offer,)
+        quality = max(
+            accepted.get(
+                name,
+                accepted.get(
+                    name.split("/")[0] + "/*", accepted.get("*/*", 0.0)
+                ),
+            )
+            for name in names
+        )
+        if quality > best_quality:
+            best, best_quality = offer, quality
+    return best
+
+
+def _offers(lists: bool) -> tuple[str, ...]:
+    offers = [JSON]
+    if msgpack is not None:
+        offers.append(MSGPACK)
+    if lists and pa is not None:
+        offers.append(ARROW)
+    return tuple(offers)
+
+
+def response_format(request: Request, response: Response) -> str:
+    """Media type of the response: JSON or MessagePack."""
+    response.headers["Vary"] = "Accept"
+    return negotiate_media_type(
+        request.headers.get("accept", ""), _offers(lists=False)
+    )
+
+
+def list_response_format(request: Request, response: Response) -> str:
+    """Media type of a list response: JSON, MessagePack or Arrow."""
+    response.headers["Vary"] = "Accept"
+    return negotiate_media_type(
+        request.headers.get("accept", ""), _offers(lists=True)
+    )
+
+
+ResponseFormat = Annotated[str, Depends(response_format)]
+ListResponseFormat = Annotated[str, Depends(list_response_format)]
+
+
+@lru_cache
+def _adapter(model: Any) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # Naive datetimes in this application are UTC. Building the
+        # Timestamp from the offset is ~3x faster than from_datetime.
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        delta = value - EPOCH
+        return msgpack.Timestamp(
+            delta.days * 86_400 + delta.seconds, delta.microseconds * 1_000
+        )
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _arrow_type(annotation: Any):
+    if typing.get_origin(annotation) in (Union, types.UnionType):
+        # Optional[X]: every Arrow column is nullable
+        (annotation,) = [
+            arg
+            for arg in typing.get_args(annotation)
+            if arg is not type(None)
+        ]
+    return {
+        bool: pa.bool_(),
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        datetime: pa.timestamp("us", tz="UTC"),
+    }[annotation]
+
+
+@lru_cache
+def arrow_schema(model: type) -> "pa.Schema":
+    """
+    Build the Arrow schema of a response model.
+
+    Args:
+        model: Pydantic/SQLModel class with scalar fields
+
+    Returns:
+        Schema with one nullable column per field, in declaration order
+    """
+    return pa.schema(
+        [
+            pa.field(name, _arrow_type(field.annotation))
+            for name, field in model.model_fields.items()
+        ]
+    )
+
+
+def encode_msgpack(data: Any, model: Any) -> bytes:
+    """
+    Serialize data as MessagePack through its response model.
+
+    Args:
+        data: Route result (ORM objects, models or dicts)
+        model: Response model, e.g. ``list[ItemPublic]``
+
+    Returns:
+        MessagePack bytes with datetimes as timestamps
+    """
+    adapter = _adapter(model)
+    payload = adapter.dump_python(
+        adapter.validate_python(data, from_attributes=True)
+    )
+    return msgpack.packb(payload, default=_msgpack_default)
+
+
+def encode_arrow(data: list, model: type) -> bytes:
+    """
+    Serialize a list as one Arrow IPC stream record batch.
+
+    Args:
+        data: Route result (ORM objects, models or dicts)
+        model: Response model of one element, e.g. ``ItemPublic``
+
+    Returns:
+        Arrow IPC stream bytes
+    """
+    adapter = _adapter(list[model])
+    rows = adapter.dump_python(
+        adapter.validate_python(data, from_attributes=True)
+    )
+    schema = arrow_schema(model)
+    table = pa.Table.from_pylist(rows, schema=schema)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def negotiated_response(
+    data: Any,
+    model: Any,
+    media_type: str,
+    status_code: int = status.HTTP_200_OK,
+) -> Any:
+    """
+    Encode a route result in the negotiated format.
+
+    Args:
+        data: Route result
+        model: The route's response model
+        media_type: Negotiated media type (``ResponseFormat``)
+        status_code: Status of a binary response
+
+    Returns:
+        ``data`` unchanged for JSON, which FastAPI then serializes with
+        the response model as usual, or a binary ``Response``
+    """
+    if media_type == MSGPACK:
+        content = encode_msgpack(data, model)
+    elif media_type == ARROW:
+        (element,) = typing.get_args(model)
+        content = encode_arrow(data, element)
+    else:
+        return data
+    return Response(
+        content=content,
+        status_code=status_code,
+        media_type=media_type,
+        headers={"Vary": "Accept"},
+    )
+
+
+class NegotiatedRoute(APIRoute):
+    """Route decoding MessagePack request bodies like JSON ones."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request) -> Response:
+            content_type = request.headers.get("content-type", "")
+            media_type = content_type.partition(";")[0].strip().lower()
+            if media_type in MSGPACK_ALIASES:
+                request = await _decode_msgpack_body(request)
+            return await handler(request)
+
+        return route_handler
+
+
+async def _decode_msgpack_body(request: Request) -> Request:
+    """Hand FastAPI the decoded body as if it had been sent as JSON."""
+    if msgpack is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="MessagePack bodies are not supported",
+        )
+    body = await request.body()
+    try:
+        decoded = msgpack.unpackb(body, timestamp=3) if body else None
+    except Exception as e:  # msgpack raises several unrelated types
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid MessagePack body",
+        ) from e
+    scope = dict(request.scope)
+    scope["headers"] = [
+        (name, value)
+        for name, value in request.scope["headers"]
+        if name != b"content-type"
+    ] + [(b"content-type", JSON.encode())]
+    decoded_request = Request(scope, request.receive)
+    decoded_request._body = body
+    decoded_request._json = decoded
+    return decoded_request
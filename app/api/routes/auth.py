@@ -1,8 +1,11 @@
-from datetime import timedelta, datetime, timezone
+from datetime import timedelta
 from typing import Annotated
+import uuid
 
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from pydantic import ValidationError
 from sqlmodel import Session, select
 import jwt
 
@@ -11,20 +14,31 @@ from app.core.database import get_session
 from app.core.security import (
     create_access_token,
     create_refresh_token,
+    decode_token,
     verify_password,
     is_user_blocked,
     increment_login_attempts,
-    reset_login_attempts,
+    record_successful_login,
     block_user,
-    add_token_to_blacklist,
+    get_token_epoch,
+    get_token_epochs,
+    bump_token_epoch,
+    start_refresh_family,
+    rotate_refresh_token,
+    revoke_refresh_family,
+    get_user_status,
+    set_user_status,
 )
 from app.models.user import User
 from app.schemas.token import (
     TokenWithRefresh,
     RefreshTokenRequest,
     TokenPayload,
+    TokenIntrospection,
+    TokenIntrospectionRequest,
+    TokenIntrospectionResponse,
 )
-from app.api.deps import CurrentUser, TokenDep
+from app.api.deps import CurrentSuperUser, CurrentUser, TokenDep
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
@@ -56,11 +70,13 @@ async def login(
         )
     
     # Try to find user by username or email
-    user = session.exec(
-        select(User).where(
-            (User.username == identifier) | (User.email == identifier)
-        )
-    ).first()
+    user = await run_in_threadpool(
+        lambda: session.exec(
+            select(User).where(
+                (User.username == identifier) | (User.email == identifier)
+            )
+        ).first()
+    )
 
     if not user:
         # Increment failed attempts even if user doesn't exist
@@ -105,17 +121,24 @@ async def login(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
         )
 
-    # Reset login attempts on successful login
-    await reset_login_attempts(identifier)
+    # Reset login attempts and record the login, behind the request
+    await record_successful_login(identifier, user.id)
     
     # Create access and refresh tokens
+    epoch = await get_token_epoch(user.id)
+    family, jti = await start_refresh_family(user.id)
     access_token_expires = timedelta(
         minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
     )
     access_token = create_access_token(
-        subject=user.id, expires_delta=access_token_expires
+        subject=user.id,
+        expires_delta=access_token_expires,
+        epoch=epoch,
+        family=family,
+    )
+    refresh_token = create_refresh_token(
+        subject=user.id, epoch=epoch, jti=jti, family=family
     )
-    refresh_token = create_refresh_token(subject=user.id)
 
     return TokenWithRefresh(
         access_token=access_token,
@@ -127,43 +150,59 @@ async def login(
 @router.post("/logout")
 async def logout(current_user: CurrentUser, token: TokenDep) -> dict:
     """
-    Logout the current user by blacklisting the JWT token.
+    Logout the current session.
 
-    The token will be added to a Redis blacklist and cannot be reused.
+    Revokes the refresh family of the session, so its refresh token is
+    rejected; its access token expires within
+    ``ACCESS_TOKEN_EXPIRE_MINUTES``. The user's other sessions are kept.
+    Tokens issued without a family are logged out everywhere instead.
     """
     try:
-        # Decode token to get JTI and expiration
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
+        payload = decode_token(token)
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token"
         )
-        jti = payload.get("jti")
-        exp = payload.get("exp")
-        
-        if not jti or not exp:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid token format"
-            )
-        
-        # Calculate remaining TTL
-        expires_at = datetime.fromtimestamp(exp, tz=timezone.utc)
-        now = datetime.now(timezone.utc)
-        ttl = int((expires_at - now).total_seconds())
-        
-        if ttl > 0:
-            # Add to blacklist with TTL
-            await add_token_to_blacklist(jti, ttl)
-        
-        return {
-            "message": "Successfully logged out",
-            "username": current_user.username
-        }
+
+    if payload.get("fam"):
+        await revoke_refresh_family(payload["fam"])
+    else:
+        await bump_token_epoch(
+            current_user.id, known_epoch=payload.get("epoch", 0)
+        )
+
+    return {
+        "message": "Successfully logged out",
+        "username": current_user.username
+    }
+
+
+@router.post("/logout-all")
+async def logout_all(current_user: CurrentUser, token: TokenDep) -> dict:
+    """
+    Logout the current user from every session.
+
+    Bumps the user's token epoch, so all access and refresh tokens issued
+    so far are rejected. Nothing is stored per token.
+    """
+    try:
+        payload = decode_token(token)
     except jwt.InvalidTokenError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid token"
         )
 
+    await bump_token_epoch(
+        current_user.id, known_epoch=payload.get("epoch", 0)
+    )
+
+    return {
+        "message": "Successfully logged out from every session",
+        "username": current_user.username
+    }
+
 
 @router.post("/refresh", response_model=TokenWithRefresh)
 async def refresh_token(
@@ -173,15 +212,14 @@ async def refresh_token(
     """
     Refresh access token using a valid refresh token.
 
-    Returns a new access token and refresh token.
+    Returns a new access token and refresh token. Each refresh token can be
+    used once: presenting one that was already rotated revokes its whole
+    session. Deactivated or deleted users are rejected; their status is
+    cached in Redis, so the database is only read on a cache miss.
     """
     try:
         # Decode refresh token
-        payload = jwt.decode(
-            refresh_request.refresh_token,
-            settings.SECRET_KEY,
-            algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_token(refresh_request.refresh_token)
         token_data = TokenPayload(**payload)
         
         # Verify it's a refresh token
@@ -191,26 +229,38 @@ async def refresh_token(
                 detail="Invalid token type"
             )
         
-        if token_data.sub is None:
+        if token_data.sub is None or not token_data.jti or not token_data.fam:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token"
             )
         
-        # Get user from database
         user_id = int(token_data.sub)
-        user = session.get(User, user_id)
-        
-        if not user:
+        active = await get_user_status(user_id)
+        if active is None:
+            user = await run_in_threadpool(session.get, User, user_id)
+            active = user is not None and user.is_active
+            await set_user_status(user_id, active)
+        if not active:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Inactive user"
             )
-        
-        if not user.is_active:
+
+        new_jti = uuid.uuid4().hex
+        result, epoch = await rotate_refresh_token(
+            user_id, token_data.fam, token_data.jti, new_jti, token_data.epoch
+        )
+
+        if result == "reused":
             raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Inactive user"
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token reuse detected; session revoked"
+            )
+        if result != "ok":
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token has been revoked"
             )
         
         # Create new tokens
@@ -218,9 +268,14 @@ async def refresh_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
         access_token = create_access_token(
-            subject=user.id, expires_delta=access_token_expires
+            subject=user_id,
+            expires_delta=access_token_expires,
+            epoch=epoch,
+            family=token_data.fam,
+        )
+        new_refresh_token = create_refresh_token(
+            subject=user_id, epoch=epoch, jti=new_jti, family=token_data.fam
         )
-        new_refresh_token = create_refresh_token(subject=user.id)
         
         return TokenWithRefresh(
             access_token=access_token,
@@ -233,7 +288,7 @@ async def refresh_token(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Refresh token has expired"
         )
-    except jwt.InvalidTokenError:
+    except (jwt.InvalidTokenError, ValidationError, ValueError):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid refresh token"
@@ -253,3 +308,87 @@ def get_current_user_info(current_user: CurrentUser) -> dict:
         "is_active": current_user.is_active,
         "is_superuser": current_user.is_superuser,
     }
+
+
+@router.post("/introspect", response_model=TokenIntrospectionResponse)
+async def introspect_tokens(
+    session: Annotated[Session, Depends(get_session)],
+    introspection_request: TokenIntrospectionRequest,
+    current_user: CurrentSuperUser,
+) -> TokenIntrospectionResponse:
+    """
+    Verify a batch of access tokens for internal services (superuser only).
+
+    Duplicate tokens are verified once. Revocation is resolved with a
+    single Redis MGET of the users' token epochs and the users are loaded
+    with a single query, so a gateway can validate a whole batch of
+    requests for roughly the cost of one ``/auth/me`` call. Results are
+    returned in request order with the reason for every inactive token.
+    """
+    tokens = introspection_request.tokens
+    if len(tokens) > settings.INTROSPECTION_MAX_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"At most {settings.INTROSPECTION_MAX_TOKENS} tokens "
+                f"per request"
+            ),
+        )
+
+    # Verify signatures and expiry of each distinct token
+    results: dict[str, TokenIntrospection] = {}
+    claims: dict[str, TokenPayload] = {}
+    expiry: dict[str, int] = {}
+    for token in dict.fromkeys(tokens):
+        try:
+            payload = decode_token(token)
+            token_data = TokenPayload(**payload)
+            if token_data.type == "refresh" or token_data.sub is None:
+                raise ValueError("Not an access token")
+            int(token_data.sub)
+        except jwt.ExpiredSignatureError:
+            results[token] = TokenIntrospection(active=False, reason="expired")
+        except (jwt.InvalidTokenError, ValidationError, ValueError):
+            results[token] = TokenIntrospection(active=False, reason="invalid")
+        else:
+            claims[token] = token_data
+            expiry[token] = payload.get("exp")
+
+    user_ids = {int(token_data.sub) for token_data in claims.values()}
+    epochs = await get_token_epochs(user_ids)
+    users = {}
+    if user_ids:
+        users = await run_in_threadpool(
+            lambda: {
+                user.id: user
+                for user in session.exec(
+                    select(User).where(User.id.in_(user_ids))
+                )
+            }
+        )
+
+    for token, token_data in claims.items():
+        user_id = int(token_data.sub)
+        user = users.get(user_id)
+        if token_data.epoch < epochs[user_id]:
+            results[token] = TokenIntrospection(active=False, reason="revoked")
+        elif user is None:
+            results[token] = TokenIntrospection(
+                active=False, reason="user_not_found"
+            )
+        elif not user.is_active:
+            results[token] = TokenIntrospection(
+                active=False, reason="inactive_user"
+            )
+        else:
+            results[token] = TokenIntrospection(
+                active=True,
+                user_id=user.id,
+                username=user.username,
+                is_superuser=user.is_superuser,
+                exp=expiry[token],
+            )
+
+    return TokenIntrospectionResponse(
+        results=[results[token] for token in tokens]
+    )
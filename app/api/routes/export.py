@@ -0,0 +1,46 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session
+
+from app.api.deps import CurrentSuperUser
+from app.core import export
+from app.core.database import get_session
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+
+@router.get("/{table}")
+def export_table(
+    *,
+    session: Annotated[Session, Depends(get_session)],
+    current_user: CurrentSuperUser,
+    table: export.ExportTable,
+    format: export.ExportFormat = "parquet",
+    batch_size: int | None = Query(default=None, ge=1, le=1_000_000),
+) -> StreamingResponse:
+    """
+    Stream a whole table as Parquet or an Arrow IPC stream (superuser only).
+
+    Rows are read and sent in batches of ``EXPORT_BATCH_SIZE``, so memory
+    stays bounded however large the table is. ``users`` is exported
+    without password hashes.
+    """
+    if export.pa is None:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Export is not available (pyarrow is not installed)",
+        )
+    extension = "arrow" if format == "arrow" else "parquet"
+    return StreamingResponse(
+        export.stream_export(
+            session.connection(), table, format, batch_size
+        ),
+        media_type=export.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="{table}.{extension}"'
+            )
+        },
+    )
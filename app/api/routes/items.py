@@ -2,13 +2,74 @@ from datetime import datetime
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from sqlmodel import Session, select
 
+from app.api.formats import (
+    ListResponseFormat,
+    NegotiatedRoute,
+    ResponseFormat,
+    negotiated_response,
+)
+from app.core.changefeed import event_stream, publish_item_event
+from app.core.coalescing import coalesced
 from app.core.database import get_session
+from app.core.query_budget import query_budget
 from app.models.item import Item, ItemCreate, ItemPublic, ItemUpdate
+from app.models.user import User
 from app.api.deps import CurrentUser
 
-router = APIRouter(prefix="/items", tags=["Items"])
+# Items can also be sent and received as MessagePack (app.api.formats)
+router = APIRouter(
+    prefix="/items", tags=["Items"], route_class=NegotiatedRoute
+)
+
+
+def _get_owned_item(
+    session: Session, current_user: User, item_id: int, action: str
+) -> Item:
+    """
+    Load an item of the current user.
+
+    The lookup filters on ``owner_id`` too, so on a table partitioned by
+    owner (``app.core.partitioning``) it reads a single partition. Only
+    when it misses is the item looked up by id alone, to tell a missing
+    item from another user's.
+
+    Args:
+        session: Database session
+        current_user: Authenticated user
+        item_id: Item ID
+        action: Verb for the permission error message
+
+    Returns:
+        The item
+
+    Raises:
+        HTTPException: 404 if the item does not exist, 403 if it belongs
+            to another user
+    """
+    item = session.exec(
+        select(Item).where(
+            Item.id == item_id, Item.owner_id == current_user.id
+        )
+    ).first()
+    if item:
+        return item
+
+    owner_id = session.exec(
+        select(Item.owner_id).where(Item.id == item_id)
+    ).first()
+    if owner_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Item not found",
+        )
+    raise HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail=f"Not enough permissions to {action} this item",
+    )
 
 
 @router.post(
@@ -19,7 +80,8 @@ def create_item(
     session: Annotated[Session, Depends(get_session)],
     current_user: CurrentUser,
     item_in: ItemCreate,
-) -> Item:
+    media_type: ResponseFormat,
+) -> Item | Response:
     """
     Create a new item for the current user.
     """
@@ -30,22 +92,32 @@ def create_item(
     )
 
     session.add(db_item)
+    session.flush()
+    publish_item_event(session, "created", db_item)
     session.commit()
     session.refresh(db_item)
 
-    return db_item
+    return negotiated_response(
+        db_item, ItemPublic, media_type, status.HTTP_201_CREATED
+    )
 
 
 @router.get("/", response_model=list[ItemPublic])
+@query_budget(2)
+@coalesced
 def read_items(
     *,
     session: Annotated[Session, Depends(get_session)],
     current_user: CurrentUser,
+    media_type: ListResponseFormat,
     offset: int = 0,
     limit: int = Query(default=100, le=100),
-) -> list[Item]:
+) -> list[Item] | Response:
     """
     Get all items for the current user.
+
+    Also served as MessagePack or an Arrow IPC stream
+    (``Accept: application/vnd.apache.arrow.stream``).
     """
     statement = (
         select(Item)
@@ -54,7 +126,34 @@ def read_items(
         .limit(limit)
     )
     items = session.exec(statement).all()
-    return list(items)
+    return negotiated_response(list(items), list[ItemPublic], media_type)
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"text/event-stream": {}}}},
+)
+async def item_events(
+    *,
+    session: Annotated[Session, Depends(get_session)],
+    current_user: CurrentUser,
+) -> StreamingResponse:
+    """
+    Stream the changes to the current user's items as server-sent events.
+
+    Each event is ``{"type", "owner_id", "item"}``, ``type`` being
+    ``created``, ``updated`` or ``deleted``. A client that falls too far
+    behind gets an ``overflow`` event and is disconnected; it should
+    reconnect and refetch its items (see ``app.core.changefeed``).
+    """
+    # The stream can stay open for hours: give the connection back now
+    await run_in_threadpool(session.close)
+    return StreamingResponse(
+        event_stream(current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/{item_id}", response_model=ItemPublic)
@@ -63,26 +162,14 @@ def read_item(
     session: Annotated[Session, Depends(get_session)],
     current_user: CurrentUser,
     item_id: int,
-) -> Item:
+    media_type: ResponseFormat,
+) -> Item | Response:
     """
     Get a specific item by ID.
     """
-    item = session.get(Item, item_id)
-
-    if not item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Item not found",
-        )
-
-    # Check if the item belongs to the current user
-    if item.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to access this item",
-        )
+    item = _get_owned_item(session, current_user, item_id, "access")
 
-    return item
+    return negotiated_response(item, ItemPublic, media_type)
 
 
 @router.patch("/{item_id}", response_model=ItemPublic)
@@ -92,24 +179,12 @@ def update_item(
     current_user: CurrentUser,
     item_id: int,
     item_in: ItemUpdate,
-) -> Item:
+    media_type: ResponseFormat,
+) -> Item | Response:
     """
     Update an item.
     """
-    item = session.get(Item, item_id)
-
-    if not item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Item not found",
-        )
-
-    # Check if the item belongs to the current user
-    if item.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to update this item",
-        )
+    item = _get_owned_item(session, current_user, item_id, "update")
 
     # Update only provided fields
     item_data = item_in.model_dump(exclude_unset=True)
@@ -120,10 +195,11 @@ def update_item(
     item.updated_at = datetime.utcnow()
 
     session.add(item)
+    publish_item_event(session, "updated", item)
     session.commit()
     session.refresh(item)
 
-    return item
+    return negotiated_response(item, ItemPublic, media_type)
 
 
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -136,20 +212,8 @@ def delete_item(
     """
     Delete an item.
     """
-    item = session.get(Item, item_id)
-
-    if not item:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Item not found",
-        )
-
-    # Check if the item belongs to the current user
-    if item.owner_id != current_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Not enough permissions to delete this item",
-        )
+    item = _get_owned_item(session, current_user, item_id, "delete")
 
+    publish_item_event(session, "deleted", item)
     session.delete(item)
     session.commit()
@@ -1,12 +1,34 @@
+import io
+from dataclasses import asdict
 from datetime import datetime
+from itertools import islice
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from anyio import from_thread
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Query,
+    UploadFile,
+    status,
+)
 from sqlmodel import Session, select
 from pydantic import BaseModel
 
+from app.core.coalescing import coalesced
+from app.core.config import settings
 from app.core.database import get_session
+from app.core.provisioning import (
+    Format,
+    detect_format,
+    provision_users,
+    read_rows,
+)
+from app.core.query_budget import query_budget
 from app.core.security import (
+    bump_token_epoch,
+    set_user_status,
     get_password_hash,
     get_all_blocked_users,
     unblock_user,
@@ -31,6 +53,20 @@ class UnblockResponse(BaseModel):
     identifier: str
 
 
+class RejectedUserRow(BaseModel):
+    """Schema for a row rejected by bulk provisioning."""
+    line: int
+    reason: str
+    email: str | None = None
+    username: str | None = None
+
+
+class BulkProvisionResponse(BaseModel):
+    """Schema for the bulk provisioning report."""
+    created: int
+    rejected: list[RejectedUserRow]
+
+
 @router.post(
     "/", response_model=UserPublic, status_code=status.HTTP_201_CREATED
 )
@@ -77,7 +113,50 @@ def create_user(
     return db_user
 
 
+@router.post("/bulk", response_model=BulkProvisionResponse)
+def bulk_create_users(
+    *,
+    session: Annotated[Session, Depends(get_session)],
+    current_user: CurrentSuperUser,
+    file: UploadFile,
+    format: Format | None = None,
+) -> dict:
+    """
+    Create users in bulk from a CSV or NDJSON file (superuser only).
+
+    The file holds ``email``, ``username``, ``password`` and optionally
+    ``full_name`` per row; the format defaults to the one of the file
+    extension. Rows that fail validation or whose email or username is
+    taken are reported instead of aborting the import. Larger imports
+    than ``PROVISION_MAX_ROWS_PER_REQUEST`` rows go through
+    ``python -m app.core.provisioning``.
+    """
+    limit = settings.PROVISION_MAX_ROWS_PER_REQUEST
+    stream = io.TextIOWrapper(file.file, encoding="utf-8", newline="")
+    try:
+        rows = list(
+            islice(
+                read_rows(stream, format or detect_format(file.filename)),
+                limit + 1,
+            )
+        )
+    except UnicodeDecodeError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="File must be UTF-8 encoded",
+        )
+    finally:
+        stream.detach()
+    if len(rows) > limit:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {limit} rows per request",
+        )
+    return asdict(provision_users(session, rows))
+
+
 @router.get("/", response_model=list[UserPublic])
+@query_budget(2)
 def read_users(
     *,
     session: Annotated[Session, Depends(get_session)],
@@ -93,6 +172,7 @@ def read_users(
 
 
 @router.get("/me", response_model=UserPublic)
+@coalesced
 def read_user_me(current_user: CurrentUser) -> User:
     """
     Get current user.
@@ -148,9 +228,50 @@ def update_user_me(
     session.commit()
     session.refresh(current_user)
 
+    # A new password or a deactivation revokes every token issued so far
+    if "hashed_password" in user_data or user_data.get("is_active") is False:
+        from_thread.run(bump_token_epoch, current_user.id)
+    if "is_active" in user_data:
+        from_thread.run(set_user_status, current_user.id, current_user.is_active)
+
     return current_user
 
 
+@router.get("/blocked", response_model=list[BlockedUserInfo])
+async def list_blocked_users(
+    current_user: CurrentSuperUser,
+) -> list[BlockedUserInfo]:
+    """
+    List all currently blocked users (superuser only).
+    
+    Returns information about users who have been temporarily blocked
+    due to failed login attempts or other security reasons.
+    """
+    blocked_users = await get_all_blocked_users()
+    return [BlockedUserInfo(**user) for user in blocked_users]
+
+
+@router.delete("/blocked/{identifier}", response_model=UnblockResponse)
+async def unblock_user_endpoint(
+    identifier: str,
+    current_user: CurrentSuperUser,
+) -> UnblockResponse:
+    """
+    Unblock a user account manually (superuser only).
+    
+    Args:
+        identifier: The email or username of the blocked user
+    
+    This will remove the block and reset login attempts counter.
+    """
+    await unblock_user(identifier)
+    
+    return UnblockResponse(
+        message="User successfully unblocked",
+        identifier=identifier
+    )
+
+
 @router.get("/{user_id}", response_model=UserPublic)
 def read_user(
     *,
@@ -224,6 +345,12 @@ def update_user(
     session.commit()
     session.refresh(db_user)
 
+    # A new password or a deactivation revokes every token issued so far
+    if "hashed_password" in user_data or user_data.get("is_active") is False:
+        from_thread.run(bump_token_epoch, db_user.id)
+    if "is_active" in user_data:
+        from_thread.run(set_user_status, db_user.id, db_user.is_active)
+
     return db_user
 
 
@@ -252,38 +379,5 @@ def delete_user(
 
     session.delete(user)
     session.commit()
-
-
-@router.get("/blocked", response_model=list[BlockedUserInfo])
-async def list_blocked_users(
-    current_user: CurrentSuperUser,
-) -> list[BlockedUserInfo]:
-    """
-    List all currently blocked users (superuser only).
-    
-    Returns information about users who have been temporarily blocked
-    due to failed login attempts or other security reasons.
-    """
-    blocked_users = await get_all_blocked_users()
-    return [BlockedUserInfo(**user) for user in blocked_users]
-
-
-@router.delete("/blocked/{identifier}", response_model=UnblockResponse)
-async def unblock_user_endpoint(
-    identifier: str,
-    current_user: CurrentSuperUser,
-) -> UnblockResponse:
-    """
-    Unblock a user account manually (superuser only).
-    
-    Args:
-        identifier: The email or username of the blocked user
-    
-    This will remove the block and reset login attempts counter.
-    """
-    await unblock_user(identifier)
-    
-    return UnblockResponse(
-        message="User successfully unblocked",
-        identifier=identifier
-    )
+    from_thread.run(bump_token_epoch, user_id)
+    from_thread.run(set_user_status, user_id, False)
@@ -0,0 +1,475 @@
+"""Per-user change feed of items, streamed as server-sent events.
+
+The item routes publish an event for every create, update and delete with
+``publish_item_event`` and ``GET /api/items/events`` streams the events of
+the current user, so clients stop polling ``GET /api/items/``. Events are
+JSON objects ``{"type": "created" | "updated" | "deleted", "owner_id",
+"item"}``; a deleted item is only ``{"id"}``. So is an item too large
+for ``MAX_PAYLOAD_BYTES``: clients refetch it when the event carries no
+``title``.
+
+``CHANGE_FEED_BACKEND`` selects how events reach every worker:
+
+- ``postgres``: the route sends the event with ``pg_notify`` inside its
+  own transaction, so it is delivered if and when the write commits, and
+  each worker ``LISTEN``s on ``CHANGE_FEED_CHANNEL`` with one dedicated
+  connection polled from the event loop;
+- ``redis``: events are published to the ``CHANGE_FEED_CHANNEL`` pub/sub
+  channel after the commit and each worker holds one subscription;
+- ``memory``: events only reach the subscribers of the worker that made
+  the change (tests, single process).
+
+Within a worker, ``ChangeHub`` indexes subscribers by user, so an event
+costs one enqueue per subscriber of its owner however many other users
+are connected. Every subscriber has a bounded queue of
+``CHANGE_FEED_QUEUE_SIZE`` events: one that falls that far behind is sent
+an ``overflow`` event and disconnected, instead of buffering without
+bound, and should reconnect and refetch its items.
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from collections.abc import AsyncIterator, Callable
+
+import sqlalchemy as sa
+from fastapi import FastAPI
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.circuit_breaker import guarded
+from app.core.config import settings
+from app.core.database import app_session
+from app.core.metrics import (
+    CHANGE_FEED_EVENTS,
+    CHANGE_FEED_SLOW_CONSUMERS,
+    CHANGE_FEED_SUBSCRIBERS,
+)
+from app.core.redis import get_redis_client
+from app.models.item import Item, ItemPublic
+
+logger = logging.getLogger(__name__)
+
+# Events of a session waiting for its commit (redis and memory backends)
+PENDING_EVENTS = "change_feed_events"
+# pg_notify rejects payloads of 8000 bytes or more
+MAX_PAYLOAD_BYTES = 7900
+
+
+class Subscription:
+    """A connected client: its user and its bounded event queue."""
+
+    __slots__ = ("owner_id", "queue", "overflowed")
+
+    def __init__(self, owner_id: int, size: int):
+        self.owner_id = owner_id
+        # None marks the end of the stream
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(size)
+        self.overflowed = False
+
+
+class ChangeHub:
+    """Fan-out of one worker's events to its subscribers, by user."""
+
+    def __init__(self, queue_size: int | None = None):
+        self.queue_size = queue_size or settings.CHANGE_FEED_QUEUE_SIZE
+        self._subscribers: dict[int, set[Subscription]] = defaultdict(set)
+        self.count = 0
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        """Register a subscriber to the events of a user."""
+        subscription = Subscription(owner_id, self.queue_size)
+        self._subscribers[owner_id].add(subscription)
+        self.count += 1
+        CHANGE_FEED_SUBSCRIBERS.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        """Remove a subscriber; removing it twice is harmless."""
+        subscribers = self._subscribers.get(subscription.owner_id)
+        if subscribers is None or subscription not in subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.owner_id]
+        self.count -= 1
+        CHANGE_FEED_SUBSCRIBERS.dec()
+
+    def dispatch(self, payload: str) -> int:
+        """
+        Queue an event for every subscriber of its owner.
+
+        Must run on the event loop of the subscribers.
+
+        Args:
+            payload: Event as published (JSON)
+
+        Returns:
+            Number of subscribers the event was queued for
+        """
+        CHANGE_FEED_EVENTS.inc()
+        try:
+            owner_id = json.loads(payload)["owner_id"]
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring malformed change event %r", payload)
+            return 0
+        delivered = 0
+        for subscription in list(self._subscribers.get(owner_id, ())):
+            try:
+                subscription.queue.put_nowait(payload)
+                delivered += 1
+            except asyncio.QueueFull:
+                self._disconnect_slow(subscription)
+        return delivered
+
+    def _disconnect_slow(self, subscription: Subscription) -> None:
+        self.unsubscribe(subscription)
+        subscription.overflowed = True
+        # The client refetches anyway: drop its backlog for the end marker
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+        CHANGE_FEED_SLOW_CONSUMERS.inc()
+
+
+class ChangeFeed:
+    """
+    In-process feed (``memory`` backend).
+
+    Events are handed to the hub once the session that published them
+    commits, and dropped if it rolls back. Subclasses change how they
+    travel between workers.
+    """
+
+    def __init__(self):
+        self.hub = ChangeHub()
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    async def start(self) -> None:
+        """Bind the feed to the running event loop."""
+        self.loop = asyncio.get_running_loop()
+
+    async def stop(self) -> None:
+        """Stop listening and end every subscriber's stream."""
+        for subscribers in list(self.hub._subscribers.values()):
+            for subscription in list(subscribers):
+                self.hub.unsubscribe(subscription)
+                subscription.queue.put_nowait(None)
+
+    def publish(self, session: Session, payload: str) -> None:
+        """
+        Publish an event with the session's transaction.
+
+        Args:
+            session: Session of the write, not yet committed
+            payload: Event (JSON)
+        """
+        session.info.setdefault(PENDING_EVENTS, []).append(payload)
+
+    def deliver(self, payload: str) -> None:
+        """Hand a committed event over, from any thread."""
+        self._call_in_loop(self.hub.dispatch, payload)
+
+    def _call_in_loop(self, callback: Callable, *args) -> None:
+        if self.loop is None or self.loop.is_closed():
+            return
+        try:
+            self.loop.call_soon_threadsafe(callback, *args)
+        except RuntimeError:  # Loop closed meanwhile (shutdown)
+            pass
+
+
+class RedisChangeFeed(ChangeFeed):
+    """Feed fanned out through a Redis pub/sub channel."""
+
+    def __init__(self, client=None):
+        super().__init__()
+        self.channel = settings.CHANGE_FEED_CHANNEL
+        self._client = client
+        self._task: asyncio.Task | None = None
+        self._publishing: set[asyncio.Task] = set()
+        self.listening = asyncio.Event()
+
+    async def _get_client(self):
+        if self._client is None:
+            self._client = await get_redis_client()
+        return self._client
+
+    async def start(self) -> None:
+        await super().start()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await super().stop()
+
+    def deliver(self, payload: str) -> None:
+        self._call_in_loop(self._start_publish, payload)
+
+    def _start_publish(self, payload: str) -> None:
+        task = asyncio.create_task(self._publish(payload))
+        # The loop only keeps weak references to its tasks
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def _publish(self, payload: str) -> None:
+        client = await self._get_client()
+        # Dropped while Redis is unavailable ("changes" fails open)
+        await guarded(
+            "changes",
+            lambda: client.publish(self.channel, payload),
+            lambda: 0,
+        )
+
+    async def _listen(self) -> None:
+        # Reads are capped below the socket timeout, which would
+        # otherwise cut an idle subscription
+        timeout = settings.REDIS_SOCKET_TIMEOUT / 2
+        while True:
+            pubsub = None
+            try:
+                client = await self._get_client()
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                await pubsub.subscribe(self.channel)
+                self.listening.set()
+                while True:
+                    message = await pubsub.get_message(timeout=timeout)
+                    if message is not None:
+                        self.hub.dispatch(message["data"])
+            except (RedisError, OSError) as e:
+                self.listening.clear()
+                logger.warning("Change feed subscription lost: %s", e)
+                await asyncio.sleep(settings.CHANGE_FEED_RECONNECT_SECONDS)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+
+class PostgresChangeFeed(ChangeFeed):
+    """Feed carried by PostgreSQL ``NOTIFY`` in the writing transaction."""
+
+    def __init__(self, engine: sa.Engine):
+        super().__init__()
+        self.channel = settings.CHANGE_FEED_CHANNEL
+        self.engine = engine
+        self._task: asyncio.Task | None = None
+        self.listening = asyncio.Event()
+
+    async def start(self) -> None:
+        await super().start()
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await super().stop()
+
+    def publish(self, session: Session, payload: str) -> None:
+        session.execute(
+            sa.text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": self.channel, "payload": payload},
+        )
+
+    def _connect(self):
+        """Open the listening connection, outside the pool."""
+        pooled = self.engine.raw_connection()
+        pooled.detach()
+        connection = pooled.driver_connection
+        connection.rollback()
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f'LISTEN "{self.channel}"')
+        return connection
+
+    @staticmethod
+    def _ping(connection) -> None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    async def _listen(self) -> None:
+        while True:
+            connection = None
+            readable = asyncio.Event()
+            try:
+                connection = await asyncio.to_thread(self._connect)
+                self.loop.add_reader(connection.fileno(), readable.set)
+                self.listening.set()
+                while True:
+                    try:
+                        async with asyncio.timeout(
+                            settings.CHANGE_FEED_HEARTBEAT_SECONDS
+                        ):
+                            await readable.wait()
+                    except TimeoutError:
+                        # Idle: make sure the connection is still alive,
+                        # without blocking the loop on a slow round trip
+                        await asyncio.to_thread(self._ping, connection)
+                    readable.clear()
+                    connection.poll()
+                    while connection.notifies:
+                        self.hub.dispatch(connection.notifies.pop(0).payload)
+            except (sa.exc.DBAPIError, OSError) as e:
+                logger.warning("Change feed listener lost: %s", e)
+            except Exception as e:
+                # psycopg2 errors are not wrapped by SQLAlchemy here
+                if not isinstance(e, self.engine.dialect.dbapi.Error):
+                    raise
+                logger.warning("Change feed listener lost: %s", e)
+            finally:
+                self.listening.clear()
+                if connection is not None:
+                    self.loop.remove_reader(connection.fileno())
+                    connection.close()
+            await asyncio.sleep(settings.CHANGE_FEED_RECONNECT_SECONDS)
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_committed(session: Session) -> None:
+    events = session.info.pop(PENDING_EVENTS, None)
+    if events and _feed is not None:
+        for payload in events:
+            _feed.deliver(payload)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session) -> None:
+    session.info.pop(PENDING_EVENTS, None)
+
+
+_feed: ChangeFeed | None = None
+
+
+async def start_change_feed(app: FastAPI) -> ChangeFeed:
+    """
+    Create and start the feed selected by ``CHANGE_FEED_BACKEND``.
+
+    The ``postgres`` backend falls back to ``memory`` when the database
+    is not PostgreSQL.
+
+    Args:
+        app: Application whose database carries the notifications
+
+    Returns:
+        The started feed
+    """
+    global _feed
+    backend = settings.CHANGE_FEED_BACKEND
+    engine = None
+    if backend == "postgres":
+        with app_session(app) as session:
+            engine = session.get_bind()
+    if engine is not None and engine.dialect.name != "postgresql":
+        logger.warning(
+            "CHANGE_FEED_BACKEND=postgres needs PostgreSQL; events will "
+            "only reach this worker's subscribers"
+        )
+        backend = "memory"
+    if backend == "postgres":
+        _feed = PostgresChangeFeed(engine)
+    elif backend == "redis":
+        _feed = RedisChangeFeed()
+    else:
+        _feed = ChangeFeed()
+    await _feed.start()
+    return _feed
+
+
+async def stop_change_feed() -> None:
+    """Stop the feed, ending every open stream."""
+    global _feed
+    if _feed is not None:
+        await _feed.stop()
+        _feed = None
+
+
+def publish_item_event(session: Session, kind: str, item: Item) -> None:
+    """
+    Publish a change of an item, delivered once the session commits.
+
+    Call it after the write is flushed (the item has its id) and before
+    the commit. A no-op when no feed was started (scripts).
+
+    Args:
+        session: Session of the write
+        kind: ``created``, ``updated`` or ``deleted``
+        item: The changed item
+    """
+    if _feed is None:
+        return
+    data = (
+        {"id": item.id}
+        if kind == "deleted"
+        else ItemPublic.model_validate(item).model_dump(mode="json")
+    )
+    # Unescaped: an emoji is 4 bytes of UTF-8 instead of a 12-byte pair
+    payload = json.dumps(
+        {"type": kind, "owner_id": item.owner_id, "item": data},
+        separators=(",", ":"),
+        ensure_ascii=False,
+    )
+    if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+        # Would fail the write on PostgreSQL: the client refetches it
+        payload = json.dumps(
+            {"type": kind, "owner_id": item.owner_id, "item": {"id": item.id}},
+            separators=(",", ":"),
+        )
+    _feed.publish(session, payload)
+
+
+async def event_stream(owner_id: int) -> AsyncIterator[str]:
+    """
+    Server-sent events of a user's item changes.
+
+    Args:
+        owner_id: User whose events to stream
+
+    Yields:
+        SSE frames: the events (those already queued in a single chunk),
+        a comment every ``CHANGE_FEED_HEARTBEAT_SECONDS`` while idle, and
+        a final ``overflow`` event when the client was too slow
+    """
+    feed = _feed
+    if feed is None:
+        return
+    subscription = feed.hub.subscribe(owner_id)
+    queue = subscription.queue
+    try:
+        reconnect_ms = int(settings.CHANGE_FEED_RECONNECT_SECONDS * 1000)
+        yield f"retry: {reconnect_ms}\n\n"
+        while True:
+            if queue.empty():
+                # The heartbeat timer is only armed while idle
+                try:
+                    async with asyncio.timeout(
+                        settings.CHANGE_FEED_HEARTBEAT_SECONDS
+                    ):
+                        payload = await queue.get()
+                except TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+            else:
+                payload = queue.get_nowait()
+            frames = []
+            while payload is not None:
+                frames.append(f"data: {payload}\n\n")
+                if queue.empty():
+                    break
+                payload = queue.get_nowait()
+            if frames:
+                yield "".join(frames)
+            if payload is None:
+                if subscription.overflowed:
+                    yield "event: overflow\ndata: {}\n\n"
+                return
+    finally:
+        feed.hub.unsubscribe(subscription)
@@ -0,0 +1,213 @@
+"""Circuit breaker and local fallback for Redis-backed security helpers.
+
+Every Redis call made by ``app.core.security`` runs under a deadline
+through :func:`guarded`. Consecutive failures open the breaker, after
+which calls skip Redis entirely until a trial call succeeds. Failed or
+skipped calls are answered according to a per-operation policy:
+
+* ``open``: degrade to the in-process :class:`LocalFallbackStore`, so the
+  API keeps serving (revocations and blocks then apply to this process
+  only until Redis is back).
+* ``closed``: raise :class:`RedisUnavailableError`, returned as 503.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from typing import TypeVar
+
+from redis.exceptions import RedisError
+
+from app.core.config import settings
+from app.core.metrics import REDIS_BREAKER_STATE, REDIS_FALLBACKS
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, OPEN: 1, HALF_OPEN: 2}
+
+
+class RedisUnavailableError(RuntimeError):
+    """Redis is unavailable and the operation's policy is fail-closed."""
+
+    def __init__(self, operation: str):
+        super().__init__(f"Redis unavailable for operation '{operation}'")
+        self.operation = operation
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the breaker opens and
+    rejects calls for ``recovery_seconds``; it then lets a single trial
+    call through (half-open) and closes again if that call succeeds.
+    """
+
+    def __init__(self, failure_threshold: int, recovery_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        REDIS_BREAKER_STATE.set(STATE_VALUES[CLOSED])
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        REDIS_BREAKER_STATE.set(STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        """Whether a call may be attempted now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                return False
+            self._set_state(HALF_OPEN)
+        if self._trial_in_flight:
+            return False
+        self._trial_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._trial_in_flight = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def release_trial(self) -> None:
+        """Let another trial through after one ended without an answer."""
+        self._trial_in_flight = False
+
+    def reset(self) -> None:
+        self.failures = 0
+        self._trial_in_flight = False
+        self._set_state(CLOSED)
+
+
+class LocalFallbackStore:
+    """
+    In-process stand-in for the Redis keys used by the security helpers.
+
+    Values expire like their Redis counterparts. The store is bounded; when
+    full, the oldest entries are dropped first.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._data: OrderedDict[str, tuple[str | int, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _live(self, key: str) -> tuple[str | int, float] | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> str | int | None:
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    def set(self, key: str, value: str | int, ttl: int) -> None:
+        self._data.pop(key, None)
+        self._data[key] = (value, time.monotonic() + ttl)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+
+    def incr(self, key: str, ttl: int) -> int:
+        """Increment a counter, starting its expiry on first use."""
+        entry = self._live(key)
+        if entry is None:
+            self.set(key, 1, ttl)
+            return 1
+        value = int(entry[0]) + 1
+        self._data[key] = (value, entry[1])
+        return value
+
+    def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def scan(self, prefix: str) -> list[tuple[str, str | int, int]]:
+        """List live entries under a prefix as (key, value, ttl) tuples."""
+        now = time.monotonic()
+        return [
+            (key, value, int(expires - now))
+            for key, (value, expires) in list(self._data.items())
+            if key.startswith(prefix) and self._live(key)
+        ]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+redis_breaker = CircuitBreaker(
+    failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+    recovery_seconds=settings.REDIS_BREAKER_RECOVERY_SECONDS,
+)
+fallback_store = LocalFallbackStore(max_keys=settings.REDIS_FALLBACK_MAX_KEYS)
+
+
+def failure_policy(operation: str) -> str:
+    """Get the configured policy (``open`` or ``closed``) of an operation."""
+    return settings.REDIS_FAILURE_POLICY.get(operation, "open")
+
+
+def _degrade(operation: str, fallback: Callable[[], T]) -> T:
+    policy = failure_policy(operation)
+    REDIS_FALLBACKS.labels(operation, policy).inc()
+    if policy == "closed":
+        raise RedisUnavailableError(operation)
+    return fallback()
+
+
+async def guarded(
+    operation: str,
+    call: Callable[[], Awaitable[T]],
+    fallback: Callable[[], T],
+) -> T:
+    """
+    Run a Redis call under the breaker and the operation deadline.
+
+    Args:
+        operation: Operation name used for the policy and metrics
+        call: Coroutine function performing the Redis call
+        fallback: Answer used when Redis fails and the policy is ``open``
+
+    Returns:
+        Result of ``call``, or of ``fallback`` when degraded
+
+    Raises:
+        RedisUnavailableError: If Redis fails and the policy is ``closed``
+    """
+    if not redis_breaker.allow():
+        return _degrade(operation, fallback)
+    try:
+        result = await asyncio.wait_for(
+            call(), settings.REDIS_OPERATION_TIMEOUT
+        )
+    except (RedisError, OSError, asyncio.TimeoutError):
+        redis_breaker.record_failure()
+        return _degrade(operation, fallback)
+    except asyncio.CancelledError:
+        # Cancelled callers say nothing about Redis: do not count them,
+        # but do not leave a half-open trial in flight forever either
+        redis_breaker.release_trial()
+        raise
+    redis_breaker.record_success()
+    return result
@@ -0,0 +1,419 @@
+"""Single-flight coalescing of concurrent identical reads.
+
+Bursty clients send the same read several times at once (many tabs
+loading ``GET /api/items/`` or ``/api/users/me`` right after a token
+refresh). For endpoints marked with ``@coalesced``, the first request of
+a key leads: it runs the endpoint while the identical requests that
+arrive before it finishes wait for it and are answered with its bytes,
+so the burst costs one database query and one serialization.
+
+The key is the method, path, sorted query parameters, ``Accept`` and the
+``Authorization`` header: requests are only merged with others carrying
+the same credential, so a follower never gets an answer its own token
+would not have been given. Followers wait for up to
+``COALESCING_WAIT_SECONDS`` and then run the endpoint themselves.
+
+Committing a change to a user or their items ends the user's flights in
+the worker (a per-user generation, bumped by a ``Session`` hook, is part
+of the flight's name), so a read that starts after a write in the same
+worker committed never joins a flight that started before it.
+
+With ``COALESCING_BACKEND=redis`` the flights span every worker: the
+leading worker holds ``coalesce:lock:<key>`` (naming its flight) and
+publishes its response as ``coalesce:result:<flight>`` for
+``COALESCING_RESULT_TTL_MS``; the other workers poll for it, for up to
+``COALESCING_WAIT_SECONDS``. Generations are per worker, so a read may
+still join another worker's flight that started before a write committed
+elsewhere: it can be stale by at most the duration of that flight. While
+Redis is unavailable, flights are per worker ("coalesce" fails open).
+
+Requests coalesced by role (``leader``, ``follower`` in the same worker,
+``remote`` for another worker's response and ``fallback`` when waiting
+failed) are counted in ``http_coalesced_requests_total``.
+"""
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+import time
+import uuid
+from collections.abc import Callable
+from dataclasses import dataclass
+from urllib.parse import parse_qsl, urlencode
+
+import jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from starlette.routing import BaseRoute
+
+from app.core.circuit_breaker import guarded
+from app.core.config import settings
+from app.core.metrics import COALESCED_REQUESTS
+from app.core.redis import get_redis_client
+from app.models.item import Item
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "coalesce:lock:"
+RESULT_PREFIX = "coalesce:result:"
+
+# Release the lock only if it still names our flight
+_RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+# Stored for responses too large to share: followers run themselves
+_NOT_SHARED = ""
+# Users whose rows a session flushed, ending their flights on commit
+WRITTEN_USERS = "coalescing_written_users"
+
+# User ID -> generation; next() on a count is atomic, so the endpoints'
+# threads can bump it without a lock
+_generations: dict[str, int] = {}
+_generation_counter = itertools.count(1)
+
+
+def coalesced(endpoint: Callable) -> Callable:
+    """
+    Let concurrent identical requests to an endpoint share one response.
+
+    Apply it below the router decorator, to read-only ``GET`` endpoints::
+
+        @router.get("/")
+        @coalesced
+        def read_things(...): ...
+
+    Args:
+        endpoint: Endpoint function
+
+    Returns:
+        The endpoint, tagged for ``CoalescingMiddleware``
+    """
+    endpoint.__coalesced__ = True
+    return endpoint
+
+
+@dataclass(slots=True)
+class CapturedResponse:
+    """A complete response, as sent by the leader of a flight."""
+
+    status: int
+    headers: list[tuple[bytes, bytes]]
+    body: bytes
+
+    async def replay(self, send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status,
+                # Outer middlewares edit the headers of the message
+                "headers": list(self.headers),
+            }
+        )
+        await send({"type": "http.response.body", "body": self.body})
+
+    def dumps(self) -> str:
+        return json.dumps(
+            {
+                "status": self.status,
+                "headers": [
+                    [name.decode("latin-1"), value.decode("latin-1")]
+                    for name, value in self.headers
+                ],
+                "body": base64.b64encode(self.body).decode("ascii"),
+            }
+        )
+
+    @classmethod
+    def loads(cls, data: str) -> "CapturedResponse":
+        response = json.loads(data)
+        return cls(
+            status=response["status"],
+            headers=[
+                (name.encode("latin-1"), value.encode("latin-1"))
+                for name, value in response["headers"]
+            ],
+            body=base64.b64decode(response["body"]),
+        )
+
+
+def coalescing_key(scope) -> str:
+    """
+    Key of the requests a request may be merged with.
+
+    Args:
+        scope: ASGI HTTP scope
+
+    Returns:
+        Hex digest of the method, path, sorted query parameters,
+        ``Accept`` and ``Authorization``
+    """
+    headers = dict(scope["headers"])
+    params = sorted(
+        parse_qsl(scope["query_string"].decode("latin-1"), True)
+    )
+    material = "\n".join(
+        (
+            scope["method"],
+            scope["path"],
+            urlencode(params),
+            headers.get(b"accept", b"").decode("latin-1"),
+            headers.get(b"authorization", b"").decode("latin-1"),
+        )
+    )
+    return hashlib.blake2b(material.encode(), digest_size=16).hexdigest()
+
+
+def end_flights(*user_ids: int | str) -> None:
+    """
+    End the users' flights in this worker.
+
+    Requests that arrive from now on start new flights; the ones already
+    waiting still get the answer they joined.
+
+    Args:
+        *user_ids: IDs of the users whose data just changed
+    """
+    for user_id in user_ids:
+        _generations[str(user_id)] = next(_generation_counter)
+
+
+def _subject(scope) -> str:
+    """User ID named by the request's bearer token, unverified."""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            _, _, token = value.decode("latin-1").partition(" ")
+            try:
+                # Only used to scope the flight: the key still holds the
+                # whole credential, which the endpoint verifies
+                claims = jwt.decode(
+                    token, options={"verify_signature": False}
+                )
+            except jwt.InvalidTokenError:
+                return ""
+            return str(claims.get("sub", ""))
+    return ""
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_written_users(session: Session, flush_context) -> None:
+    written = session.info.setdefault(WRITTEN_USERS, set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(instance, Item):
+            written.add(instance.owner_id)
+        elif isinstance(instance, User):
+            written.add(instance.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _end_written_users_flights(session: Session) -> None:
+    written = session.info.pop(WRITTEN_USERS, None)
+    if written:
+        end_flights(*written)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_written_users(session: Session) -> None:
+    session.info.pop(WRITTEN_USERS, None)
+
+
+class CoalescingMiddleware:
+    """
+    ASGI middleware merging concurrent identical reads into one flight.
+
+    Only ``GET`` requests to endpoints marked with ``@coalesced`` are
+    considered; route templates are resolved as in
+    ``PrometheusMiddleware``.
+    """
+
+    def __init__(self, app, routes: list[BaseRoute], client=None):
+        self.app = app
+        self.routes = routes
+        self._client = client
+        self._static_routes: dict[str, str] | None = None
+        self._dynamic_routes: list[BaseRoute] = []
+        # (key, user, generation) -> response of the running flight
+        self._flights: dict[tuple[str, str, int], asyncio.Future] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+        template = self._resolve_route(scope)
+        if template is None:
+            await self.app(scope, receive, send)
+            return
+
+        key = coalescing_key(scope)
+        user = _subject(scope)
+        local_key = (key, user, _generations.get(user, 0))
+        flight = self._flights.get(local_key)
+        if flight is not None:
+            try:
+                # shield: a follower that goes away (or stops waiting)
+                # must not cancel the flight
+                response = await asyncio.wait_for(
+                    asyncio.shield(flight), settings.COALESCING_WAIT_SECONDS
+                )
+            except TimeoutError:
+                response = None
+            if response is not None:
+                COALESCED_REQUESTS.labels(template, "follower").inc()
+                await response.replay(send)
+                return
+            COALESCED_REQUESTS.labels(template, "fallback").inc()
+            await self.app(scope, receive, send)
+            return
+
+        flight = asyncio.get_running_loop().create_future()
+        self._flights[local_key] = flight
+        response = None
+        try:
+            if settings.COALESCING_BACKEND == "redis":
+                response = await self._lead_cluster(
+                    key, template, scope, receive, send
+                )
+            else:
+                COALESCED_REQUESTS.labels(template, "leader").inc()
+                response = await self._run(scope, receive, send)
+        finally:
+            del self._flights[local_key]
+            # None (the leader failed): the followers run themselves
+            flight.set_result(response)
+
+    async def _run(self, scope, receive, send) -> CapturedResponse | None:
+        """Run the endpoint, sending and recording its response."""
+        status = 500
+        headers: list[tuple[bytes, bytes]] = []
+        chunks: list[bytes] = []
+        complete = False
+
+        async def send_wrapper(message):
+            nonlocal status, headers, complete
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", ()))
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                complete = not message.get("more_body", False)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+        if not complete:
+            return None
+        return CapturedResponse(status, headers, b"".join(chunks))
+
+    async def _get_client(self):
+        if self._client is None:
+            self._client = await get_redis_client()
+        return self._client
+
+    async def _lead_cluster(
+        self, key: str, template: str, scope, receive, send
+    ) -> CapturedResponse | None:
+        """Lead the flight of the worker, joining another worker's one."""
+        client = await self._get_client()
+        lock = LOCK_PREFIX + key
+        flight_id = uuid.uuid4().hex
+        acquired = await guarded(
+            "coalesce",
+            lambda: client.set(
+                lock, flight_id, nx=True, px=settings.COALESCING_LOCK_MS
+            ),
+            lambda: True,
+        )
+        if not acquired:
+            running = await guarded(
+                "coalesce", lambda: client.get(lock), lambda: None
+            )
+            if running is not None:
+                response = await self._wait_for(client, running)
+                if response is not None:
+                    COALESCED_REQUESTS.labels(template, "remote").inc()
+                    await response.replay(send)
+                    return response
+                COALESCED_REQUESTS.labels(template, "fallback").inc()
+                return await self._run(scope, receive, send)
+
+        COALESCED_REQUESTS.labels(template, "leader").inc()
+        response = None
+        try:
+            response = await self._run(scope, receive, send)
+        finally:
+            if acquired:
+                await self._publish(client, lock, flight_id, response)
+        return response
+
+    async def _publish(
+        self,
+        client,
+        lock: str,
+        flight_id: str,
+        response: CapturedResponse | None,
+    ) -> None:
+        if (
+            response is None
+            or len(response.body) > settings.COALESCING_MAX_SHARED_BYTES
+        ):
+            data = _NOT_SHARED
+        else:
+            data = response.dumps()
+        pipeline = client.pipeline(transaction=False)
+        pipeline.set(
+            RESULT_PREFIX + flight_id,
+            data,
+            px=settings.COALESCING_RESULT_TTL_MS,
+        )
+        pipeline.eval(_RELEASE_LOCK, 1, lock, flight_id)
+        await guarded("coalesce", pipeline.execute, lambda: None)
+
+    async def _wait_for(
+        self, client, flight_id: str
+    ) -> CapturedResponse | None:
+        """Poll for the response of another worker's flight."""
+        result = RESULT_PREFIX + flight_id
+        deadline = time.monotonic() + settings.COALESCING_WAIT_SECONDS
+        while time.monotonic() < deadline:
+            data = await guarded(
+                "coalesce", lambda: client.get(result), lambda: _NOT_SHARED
+            )
+            if data == _NOT_SHARED:
+                return None
+            if data is not None:
+                return CapturedResponse.loads(data)
+            await asyncio.sleep(settings.COALESCING_POLL_SECONDS)
+        logger.warning("Gave up waiting for coalesced flight %s", flight_id)
+        return None
+
+    def _resolve_route(self, scope) -> str | None:
+        """Template of the matched coalesced route, if any."""
+        if self._static_routes is None:
+            self._index_routes()
+        path = scope["path"]
+        template = self._static_routes.get(path)
+        if template is not None:
+            return template
+        for route in self._dynamic_routes:
+            if route.path_regex.match(path):
+                return route.path
+        return None
+
+    def _index_routes(self) -> None:
+        # Built lazily, like PrometheusMiddleware's index
+        static_routes = {}
+        for route in self.routes:
+            endpoint = getattr(route, "endpoint", None)
+            if not getattr(endpoint, "__coalesced__", False):
+                continue
+            if "GET" not in getattr(route, "methods", ()):
+                continue
+            if getattr(route, "param_convertors", None):
+                self._dynamic_routes.append(route)
+            else:
+                static_routes[route.path] = route.path
+        self._static_routes = static_routes
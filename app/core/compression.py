@@ -0,0 +1,332 @@
+"""Content-negotiated response compression.
+
+``CompressionMiddleware`` compresses response bodies of compressible media
+types with the best encoding the client accepts among
+``COMPRESSION_ENCODINGS`` (zstd, brotli, gzip by default; zstd and brotli
+only when the ``zstandard`` / ``brotli`` packages are installed). Bodies
+under ``COMPRESSION_MIN_SIZE`` bytes are sent as they are: the headers and
+CPU would cost more than the bytes saved.
+
+Compression at ``COMPRESSION_*_LEVEL`` runs on the event loop for small
+bodies and in a worker thread from ``COMPRESSION_THREAD_THRESHOLD`` bytes
+on, so one large export does not stall every other request of the worker
+(zlib, brotli and zstd release the GIL while compressing).
+
+Compressed bodies are kept in a per-process LRU keyed by a digest of the
+uncompressed body and the encoding, up to ``COMPRESSION_CACHE_MAX_BYTES``:
+hashing is an order of magnitude cheaper than compressing, so a payload
+served repeatedly (the OpenAPI schema, JWKS, an unchanged page) is
+compressed once. Streaming responses are compressed incrementally.
+"""
+import hashlib
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Protocol
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+
+from app.core.config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+# Media types worth compressing; text/event-stream is excluded since its
+# events must reach the client as soon as they are sent
+COMPRESSIBLE_TYPES = (
+    "text/plain",
+    "text/html",
+    "text/css",
+    "text/csv",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/vnd.apache.arrow.stream",
+)
+COMPRESSIBLE_SUFFIXES = ("+json", "+xml")
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class _BrotliCompressor:
+    """Give ``brotli.Compressor`` the zlib-style interface."""
+
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+@dataclass(frozen=True)
+class Codec:
+    """A content coding and how to build its compressors."""
+
+    name: str
+    factory: Callable[[int], Compressor]
+    level_setting: str
+
+    def compressor(self, level: int | None = None) -> Compressor:
+        """Start a streaming compressor at ``level`` (or the setting)."""
+        return self.factory(self.level if level is None else level)
+
+    def compress(self, data: bytes, level: int | None = None) -> bytes:
+        """Compress a whole body at once."""
+        compressor = self.compressor(level)
+        return compressor.compress(data) + compressor.flush()
+
+    @property
+    def level(self) -> int:
+        return getattr(settings, self.level_setting)
+
+
+CODECS: dict[str, Codec] = {
+    # wbits 31: gzip container
+    "gzip": Codec(
+        "gzip",
+        lambda level: zlib.compressobj(level, zlib.DEFLATED, 31),
+        "COMPRESSION_GZIP_LEVEL",
+    ),
+}
+if brotli is not None:
+    CODECS["br"] = Codec("br", _BrotliCompressor, "COMPRESSION_BROTLI_LEVEL")
+if zstandard is not None:
+    CODECS["zstd"] = Codec(
+        "zstd",
+        lambda level: zstandard.ZstdCompressor(level=level).compressobj(),
+        "COMPRESSION_ZSTD_LEVEL",
+    )
+
+
+def parse_qvalues(header: str) -> dict[str, float]:
+    """
+    Parse an ``Accept``-style header into its values and their quality.
+
+    Args:
+        header: Header value, e.g. ``"br;q=1.0, gzip;q=0.5"``
+
+    Returns:
+        Lower-cased values mapped to their q-value (1.0 when absent)
+    """
+    values: dict[str, float] = {}
+    for part in header.lower().split(","):
+        value, *params = (piece.strip() for piece in part.split(";"))
+        quality = 1.0
+        for param in params:
+            name, _, raw = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(raw)
+                except ValueError:
+                    quality = 0.0
+        if value:
+            values[value] = quality
+    return values
+
+
+def negotiate(accept_encoding: str) -> Codec | None:
+    """
+    Pick the encoding of a response from an ``Accept-Encoding`` header.
+
+    Among the encodings the client accepts (q > 0), the first one of
+    ``COMPRESSION_ENCODINGS`` that is available wins; ``*`` accepts any.
+
+    Args:
+        accept_encoding: Value of the request header
+
+    Returns:
+        The codec to use, or None to send the body uncompressed
+    """
+    accepted = parse_qvalues(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    for name in settings.COMPRESSION_ENCODINGS:
+        if name in CODECS and accepted.get(name, wildcard) > 0:
+            return CODECS[name]
+    return None
+
+
+def is_compressible(content_type: str) -> bool:
+    """Whether a response of this media type should be compressed."""
+    media_type = content_type.partition(";")[0].strip().lower()
+    return media_type in COMPRESSIBLE_TYPES or media_type.endswith(
+        COMPRESSIBLE_SUFFIXES
+    )
+
+
+class CompressedBodyCache:
+    """LRU of compressed bodies, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple[str, bytes], bytes] = OrderedDict()
+
+    @staticmethod
+    def key(codec: Codec, body: bytes) -> tuple[str, bytes]:
+        # The level is part of the key so a settings change takes effect
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        return f"{codec.name}:{codec.level}", digest
+
+    def get(self, key: tuple[str, bytes]) -> bytes | None:
+        compressed = self._entries.get(key)
+        if compressed is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return compressed
+
+    def put(self, key: tuple[str, bytes], compressed: bytes) -> None:
+        if len(compressed) > self.max_bytes or key in self._entries:
+            return
+        self._entries[key] = compressed
+        self.size += len(compressed)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.size = self.hits = self.misses = 0
+
+
+compressed_bodies = CompressedBodyCache(settings.COMPRESSION_CACHE_MAX_BYTES)
+
+
+async def compress_body(codec: Codec, body: bytes) -> bytes:
+    """
+    Compress a whole response body, reusing a cached result if any.
+
+    Args:
+        codec: Negotiated encoding
+        body: Uncompressed body
+
+    Returns:
+        The compressed body
+    """
+    cache = compressed_bodies if compressed_bodies.max_bytes > 0 else None
+    if cache is not None:
+        key = cache.key(codec, body)
+        compressed = cache.get(key)
+        if compressed is not None:
+            return compressed
+    if len(body) >= settings.COMPRESSION_THREAD_THRESHOLD:
+        compressed = await anyio.to_thread.run_sync(codec.compress, body)
+    else:
+        compressed = codec.compress(body)
+    if cache is not None:
+        cache.put(key, compressed)
+    return compressed
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies.
+
+    A raw ASGI middleware like ``PrometheusMiddleware``: the start message
+    is held back until the first body chunk shows whether the response
+    is complete (threshold, one-shot and cached compression) or streamed
+    (incremental compression).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codec = negotiate(
+            Headers(scope=scope).get("accept-encoding", "")
+        )
+        if codec is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, compressor, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if (
+                    "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type", ""))
+                    or message["status"] in (204, 304)
+                ):
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None and not more_body:
+                # Complete response
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if len(body) < settings.COMPRESSION_MIN_SIZE:
+                    await send(start_message)
+                    await send(message)
+                    return
+                body = await compress_body(codec, body)
+                headers["Content-Encoding"] = codec.name
+                headers["Content-Length"] = str(len(body))
+                await send(start_message)
+                await send({"type": "http.response.body", "body": body})
+                return
+
+            if compressor is None:
+                # First chunk of a streaming response
+                compressor = codec.compressor()
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                headers["Content-Encoding"] = codec.name
+                del headers["Content-Length"]
+                await send(start_message)
+            if len(body) >= settings.COMPRESSION_THREAD_THRESHOLD:
+                chunk = await anyio.to_thread.run_sync(
+                    compressor.compress, body
+                )
+            else:
+                chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.flush()
+            if chunk or not more_body:
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": more_body,
+                    }
+                )
+
+        await self.app(scope, receive, send_compressed)
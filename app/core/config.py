@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from functools import lru_cache
+from typing import Literal
 
 
 class Settings(BaseSettings):
@@ -12,12 +13,59 @@ class Settings(BaseSettings):
 
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0
+    REDIS_SOCKET_TIMEOUT: float = 2.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 2.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_RETRY_ATTEMPTS: int = 3
+    REDIS_RETRY_BACKOFF_BASE: float = 0.01
+    REDIS_RETRY_BACKOFF_CAP: float = 0.5
+    REDIS_BATCHING_ENABLED: bool = True
+    REDIS_BATCH_WINDOW_SECONDS: float = 0.0
+    REDIS_BATCH_MAX_SIZE: int = 128
+    REDIS_CLIENT_CACHE_ENABLED: bool = True
+    REDIS_CLIENT_CACHE_MAX_SIZE: int = 10_000
+
+    # Redis degradation (circuit breaker and per-operation failure policy)
+    REDIS_OPERATION_TIMEOUT: float = 0.1
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5
+    REDIS_BREAKER_RECOVERY_SECONDS: float = 10.0
+    REDIS_FALLBACK_MAX_KEYS: int = 10_000
+    REDIS_FAILURE_POLICY: dict[str, Literal["open", "closed"]] = {
+        "epoch": "open",
+        "revoke": "open",
+        "blocked": "open",
+        "block": "open",
+        "login_attempts": "open",
+        # Sessions started without Redis could not be rotated or revoked
+        "refresh_issue": "closed",
+        # Refreshes read the user's status from the database instead
+        "user_status": "open",
+        # Jobs are run inline while Redis is down (JOBS_BACKEND=redis)
+        "jobs": "open",
+        # Item change events are dropped (CHANGE_FEED_BACKEND=redis)
+        "changes": "open",
+        # Flights are per worker (COALESCING_BACKEND=redis)
+        "coalesce": "open",
+        # Rotating without Redis would let replayed refresh tokens through
+        "refresh_rotate": "closed",
+    }
 
     # JWT
     SECRET_KEY: str = "tu-clave-secreta-super-segura-cambiar-en-produccion"
+    # HS256 signs with SECRET_KEY; EdDSA / ES256 use the keys in
+    # JWT_KEYS_DIR (see app.core.keys)
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    JWT_KEYS_DIR: str = "keys"
+    JWT_ACTIVE_KID: str | None = None
+    # Short: a logged-out session keeps its access token until it expires
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Cached is_active of users, checked on /auth/refresh
+    USER_STATUS_TTL_SECONDS: int = 3600
+    # Maximum number of tokens per /auth/introspect call
+    INTROSPECTION_MAX_TOKENS: int = 100
 
     # Security - Rate Limiting
     MAX_LOGIN_ATTEMPTS: int = 5
@@ -27,6 +75,107 @@ class Settings(BaseSettings):
     APP_NAME: str = "Flujo-MCP API"
     DEBUG: bool = True
 
+    # Migrations (alembic/env.py and app.core.migrations)
+    MIGRATION_LOCK_TIMEOUT: str = "5s"
+    MIGRATION_STATEMENT_TIMEOUT: str = "10min"
+    MIGRATION_BACKFILL_BATCH_SIZE: int = 10_000
+    MIGRATION_BACKFILL_PAUSE_SECONDS: float = 0.05
+    ITEMS_PARTITIONS: int = 16  # python -m app.core.partitioning
+
+    # Write-behind jobs (app.core.jobs): "inline" runs them in the request,
+    # "memory" batches them in-process, "redis" in a Redis Stream shared by
+    # every worker through a consumer group
+    JOBS_BACKEND: Literal["inline", "memory", "redis"] = "memory"
+    JOBS_QUEUE_SIZE: int = 10_000
+    JOBS_ENQUEUE_TIMEOUT_SECONDS: float = 0.05
+    JOBS_BATCH_SIZE: int = 500
+    JOBS_FLUSH_INTERVAL_SECONDS: float = 0.5
+    JOBS_MAX_RETRIES: int = 5
+    JOBS_RETRY_BACKOFF_SECONDS: float = 0.1
+    JOBS_DRAIN_TIMEOUT_SECONDS: float = 10.0
+    JOBS_STREAM: str = "jobs"
+    JOBS_STREAM_GROUP: str = "writers"
+    JOBS_STREAM_CLAIM_IDLE_SECONDS: float = 60.0
+
+    # Item change feed (app.core.changefeed, GET /api/items/events):
+    # "postgres" uses LISTEN/NOTIFY, "redis" pub/sub, "memory" reaches the
+    # subscribers of the same worker only
+    CHANGE_FEED_BACKEND: Literal["memory", "postgres", "redis"] = "postgres"
+    CHANGE_FEED_CHANNEL: str = "item_changes"
+    # Events buffered per subscriber before it is disconnected as too slow
+    CHANGE_FEED_QUEUE_SIZE: int = 100
+    CHANGE_FEED_HEARTBEAT_SECONDS: float = 15.0
+    CHANGE_FEED_RECONNECT_SECONDS: float = 1.0
+
+    # Single-flight coalescing of identical concurrent reads
+    # (app.core.coalescing): "memory" merges them within a worker, "redis"
+    # across workers
+    COALESCING_ENABLED: bool = True
+    COALESCING_BACKEND: Literal["memory", "redis"] = "memory"
+    COALESCING_LOCK_MS: int = 5_000  # Expiry if the leading worker dies
+    COALESCING_RESULT_TTL_MS: int = 2_000
+    COALESCING_WAIT_SECONDS: float = 1.0
+    COALESCING_POLL_SECONDS: float = 0.005
+    COALESCING_MAX_SHARED_BYTES: int = 1_024 * 1_024  # Through Redis
+
+    # Response compression (app.core.compression); encodings in order of
+    # preference, br and zstd need the brotli / zstandard packages
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: list[str] = ["zstd", "br", "gzip"]
+    COMPRESSION_MIN_SIZE: int = 1_024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_LEVEL: int = 4
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    # Bodies from this size on are compressed in a worker thread
+    COMPRESSION_THREAD_THRESHOLD: int = 64 * 1_024
+    COMPRESSION_CACHE_MAX_BYTES: int = 16 * 1_024 * 1_024  # 0 disables
+
+    # Columnar export (python -m app.core.export, GET /api/export/{table})
+    EXPORT_BATCH_SIZE: int = 50_000
+
+    # Bulk user provisioning (python -m app.core.provisioning, POST
+    # /api/users/bulk)
+    PROVISION_CHUNK_SIZE: int = 1_000
+    PROVISION_WORKERS: int | None = None  # None: one per available CPU
+    PROVISION_MAX_ROWS_PER_REQUEST: int = 10_000
+
+    # Production server (python -m app.server)
+    SERVER_WORKERS: int | None = None  # None: one per available CPU
+    SERVER_MAX_REQUESTS: int = 10_000  # Recycle workers; 0 disables
+    SERVER_MAX_REQUESTS_JITTER: int = 1_000
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    # Delay before replacing a crashed worker, doubled per crash in a row
+    SERVER_RESPAWN_BACKOFF_SECONDS: float = 0.5
+    SERVER_RESPAWN_BACKOFF_MAX_SECONDS: float = 30.0
+
+    # Worker warm-up before reporting ready on /ready
+    WARMUP_ENABLED: bool = True
+    WARMUP_DB_CONNECTIONS: int = 5
+    WARMUP_REDIS_CONNECTIONS: int = 5
+    WARMUP_RETRY_SECONDS: float = 5.0
+
+    # Observability
+    METRICS_ENABLED: bool = True
+
+    # Query budgets (statements per request)
+    QUERY_BUDGET_MODE: Literal["off", "log", "raise"] = "log"
+    QUERY_BUDGET_DEFAULT: int = 10
+    QUERY_REPEAT_THRESHOLD: int = 3
+
+    # Request profiler
+    PROFILER_ENABLED: bool = True
+    PROFILER_SAMPLE_RATE: float = 0.0
+    PROFILER_INTERVAL_SECONDS: float = 0.001
+    PROFILER_OUTPUT_DIR: str = "profiles"
+
+    # Tracing
+    TRACING_ENABLED: bool = False
+    TRACING_SERVICE_NAME: str = "flujo-mcp-api"
+    TRACING_SAMPLE_RATE: float = 0.1
+    TRACING_EXPORTER: str = "file"
+    TRACING_FILE_PATH: str = "traces.jsonl"
+    TRACING_EXPORT_INTERVAL_SECONDS: float = 1.0
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,56 @@
+"""CPUs available to this process.
+
+Used to size the server's workers and the provisioning pool. The count
+takes the CPU affinity mask and the cgroup (container) CPU quota into
+account, which ``os.cpu_count()`` ignores.
+"""
+import math
+import os
+from pathlib import Path
+
+
+def _cgroup_cpu_quota(root: Path = Path("/sys/fs/cgroup")) -> float | None:
+    """
+    Read the CPU quota of the current cgroup, in CPUs.
+
+    Args:
+        root: Mount point of the cgroup filesystem
+
+    Returns:
+        Quota in CPUs, or None when unlimited or unknown
+    """
+    try:
+        # cgroup v2: "<quota> <period>" or "max <period>"
+        quota, period = (root / "cpu.max").read_text().split()
+        if quota == "max":
+            return None
+        return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        # cgroup v1: quota is -1 when unlimited
+        quota = int((root / "cpu" / "cpu.cfs_quota_us").read_text())
+        period = int((root / "cpu" / "cpu.cfs_period_us").read_text())
+    except (OSError, ValueError):
+        return None
+    return quota / period if quota > 0 and period > 0 else None
+
+
+def available_cpus(cgroup_root: Path = Path("/sys/fs/cgroup")) -> int:
+    """
+    Count the CPUs this process can actually use.
+
+    Args:
+        cgroup_root: Mount point of the cgroup filesystem
+
+    Returns:
+        Number of CPUs, at least 1
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota(cgroup_root)
+    if quota is not None:
+        cpus = min(cpus, math.ceil(quota))
+    return max(1, cpus)
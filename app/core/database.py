@@ -1,17 +1,52 @@
+import inspect
+from collections.abc import Iterator
+from contextlib import contextmanager
+
+from fastapi import FastAPI
+from sqlalchemy.engine import Engine
 from sqlmodel import Session, SQLModel, create_engine
 
 from app.core.config import settings
+from app.core.metrics import instrument_engine
+from app.core.query_budget import install_query_budget
+from app.core.tracing import install_tracing
+
+# Created on first use: building it loads the database driver, which
+# processes that never touch the database (or override get_session, like
+# the tests) should not pay for at import time.
+_engine: Engine | None = None
+
+
+def get_engine() -> Engine:
+    """
+    Get the database engine, creating and instrumenting it on first use.
+
+    Returns:
+        SQLAlchemy engine for ``DATABASE_URL``
+    """
+    global _engine
+    if _engine is None:
+        engine = create_engine(
+            settings.DATABASE_URL,
+            echo=settings.DEBUG,  # Log SQL queries in debug mode
+        )
+        instrument_engine(engine)
+        install_query_budget(engine)
+        install_tracing(engine)
+        _engine = engine
+    return _engine
+
 
-# Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,  # Log SQL queries in debug mode
-)
+def __getattr__(name: str):
+    # Keep ``from app.core.database import engine`` working
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def create_db_and_tables():
     """Create all database tables."""
-    SQLModel.metadata.create_all(engine)
+    SQLModel.metadata.create_all(get_engine())
 
 
 def get_session():
@@ -21,5 +56,30 @@ def get_session():
     Yields:
         Database session that auto-commits on success or rollbacks on error
     """
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         yield session
+
+
+@contextmanager
+def app_session(app: FastAPI) -> Iterator[Session]:
+    """
+    Open the session ``get_session`` would give the app's endpoints.
+
+    For code running outside a request (startup, middlewares, background
+    jobs); dependency overrides are honoured, so the tests' database is
+    used under the tests.
+
+    Args:
+        app: Application whose ``get_session`` to use
+
+    Yields:
+        Database session, closed on exit if the dependency owns it
+    """
+    source = app.dependency_overrides.get(get_session, get_session)()
+    if not inspect.isgenerator(source):
+        yield source
+        return
+    try:
+        yield next(source)
+    finally:
+        source.close()
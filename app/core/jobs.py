@@ -0,0 +1,496 @@
+"""Write-behind queue for writes that do not need to block a request.
+
+Bookkeeping writes such as recording the last login are enqueued with
+``enqueue(kind, payload)`` and applied later in bulk. A worker task
+collects jobs until ``JOBS_BATCH_SIZE`` are waiting or
+``JOBS_FLUSH_INTERVAL_SECONDS`` have passed. It then hands all the
+payloads of one kind to that kind's handler (registered with
+``@job_handler``), which applies them at once: one Redis pipeline, one
+bulk ``UPDATE``.
+
+``JOBS_BACKEND`` selects where jobs wait:
+
+* ``memory``: a bounded ``asyncio.Queue`` in each process. Jobs still
+  queued when the process dies are lost.
+* ``redis``: the ``JOBS_STREAM`` Redis Stream, read by every worker
+  through the ``JOBS_STREAM_GROUP`` consumer group. An entry is
+  acknowledged only once applied. Entries left pending by a dead worker
+  are claimed by another one after ``JOBS_STREAM_CLAIM_IDLE_SECONDS``.
+  Entries still failing after ``JOBS_MAX_RETRIES`` redeliveries are moved
+  to the ``<JOBS_STREAM>:dead`` stream. Handlers must be idempotent.
+* ``inline``: no queue; jobs run in the request. The tests use it.
+
+Backpressure: when ``JOBS_QUEUE_SIZE`` jobs are waiting, a producer waits
+up to ``JOBS_ENQUEUE_TIMEOUT_SECONDS`` and then applies its job inline. On
+the Redis backend the entry is already durable, so the producer is only
+slowed down. Either way, overload slows requests down instead of growing
+memory without bound or losing writes. While Redis is unavailable, jobs
+run inline. A failing batch is retried with exponential backoff.
+``main.lifespan`` drains the queue on shutdown.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from collections.abc import Awaitable, Callable
+from contextlib import suppress
+from dataclasses import dataclass
+
+import redis.asyncio as redis
+from fastapi import FastAPI
+from redis.exceptions import RedisError, ResponseError
+from sqlalchemy.engine import Engine
+
+from app.core.circuit_breaker import guarded
+from app.core.config import settings
+from app.core.database import app_session, get_engine
+from app.core.metrics import JOBS, JOBS_FLUSH_TIME, JOBS_QUEUE_DEPTH
+from app.core.redis import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[list[dict], Engine], Awaitable[None]]
+
+_handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """
+    Register the handler applying a batch of jobs of one kind.
+
+    The handler receives the JSON-serializable payloads of the batch and
+    the database engine, and must apply them all or raise.
+
+    Args:
+        kind: Job kind passed to ``enqueue``
+
+    Returns:
+        Decorator registering the handler
+    """
+    def register(handler: JobHandler) -> JobHandler:
+        _handlers[kind] = handler
+        return handler
+
+    return register
+
+
+@dataclass(slots=True)
+class Job:
+    """A write waiting to be applied."""
+
+    kind: str
+    payload: dict
+    entry_id: str | None = None  # Stream entry (Redis backend)
+
+
+class JobQueue:
+    """Bounded in-process queue flushed in batches by one worker task."""
+
+    def __init__(self, engine_factory: Callable[[], Engine] = get_engine):
+        self.engine_factory = engine_factory
+        self.max_size = settings.JOBS_QUEUE_SIZE
+        self.batch_size = settings.JOBS_BATCH_SIZE
+        self.flush_interval = settings.JOBS_FLUSH_INTERVAL_SECONDS
+        self.max_retries = settings.JOBS_MAX_RETRIES
+        self.retry_backoff = settings.JOBS_RETRY_BACKOFF_SECONDS
+        self.enqueue_timeout = settings.JOBS_ENQUEUE_TIMEOUT_SECONDS
+        self._queue: asyncio.Queue[Job | None] = asyncio.Queue(self.max_size)
+        self._worker: asyncio.Task | None = None
+        self._stopping = False
+
+    @property
+    def running(self) -> bool:
+        """Whether jobs are queued rather than run inline."""
+        return self._worker is not None and not self._stopping
+
+    async def start(self) -> None:
+        """Start the worker task flushing the queue."""
+        self._stopping = False
+        self._worker = asyncio.create_task(self._run(), name="jobs")
+
+    async def enqueue(self, kind: str, payload: dict) -> None:
+        """
+        Queue a job, or run it inline when the queue is not running.
+
+        Args:
+            kind: Job kind, with a registered handler
+            payload: JSON-serializable job data
+
+        Raises:
+            KeyError: If no handler is registered for ``kind``
+        """
+        if kind not in _handlers:
+            raise KeyError(f"No handler for {kind!r} jobs")
+        if not self.running:
+            await self.run_inline(kind, payload)
+            return
+        job = Job(kind, payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(
+                    self._queue.put(job), self.enqueue_timeout
+                )
+            except asyncio.TimeoutError:
+                # Still full: apply it ourselves, slowing this request down
+                await self.run_inline(kind, payload)
+                return
+        JOBS.labels(kind, "queued").inc()
+        JOBS_QUEUE_DEPTH.inc()
+
+    async def run_inline(self, kind: str, payload: dict) -> None:
+        """Apply one job right away, without retries."""
+        JOBS.labels(kind, "inline").inc()
+        if not await self._apply(kind, [payload], retries=0):
+            JOBS.labels(kind, "dropped").inc()
+
+    async def drain(self, timeout: float | None = None) -> None:
+        """
+        Stop queueing and apply the jobs still waiting.
+
+        Jobs enqueued from now on run inline.
+
+        Args:
+            timeout: Seconds to wait (``JOBS_DRAIN_TIMEOUT_SECONDS``)
+        """
+        if self._worker is None:
+            return
+        if timeout is None:
+            timeout = settings.JOBS_DRAIN_TIMEOUT_SECONDS
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._finish(), timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                "Write-behind queue not drained after %.1f s: %s",
+                timeout,
+                self._leftover(),
+            )
+        finally:
+            self._worker.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._worker
+            self._worker = None
+
+    async def _finish(self) -> None:
+        await self._queue.put(None)
+        await self._worker
+
+    def _leftover(self) -> str:
+        return f"{self._queue.qsize()} jobs lost"
+
+    async def _run(self) -> None:
+        stop = False
+        while not stop:
+            jobs, stop = await self._collect()
+            for job in await self._flush(jobs):
+                JOBS.labels(job.kind, "dropped").inc()
+
+    async def _collect(self) -> tuple[list[Job], bool]:
+        """Wait for a job, then gather more until the batch is due."""
+        loop = asyncio.get_running_loop()
+        jobs: list[Job] = []
+        job = await self._queue.get()
+        deadline = loop.time() + self.flush_interval
+        while job is not None:
+            jobs.append(job)
+            if len(jobs) >= self.batch_size:
+                break
+            try:
+                job = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+        JOBS_QUEUE_DEPTH.dec(len(jobs))
+        # None is the stop marker queued by drain()
+        return jobs, job is None
+
+    async def _flush(self, jobs: list[Job]) -> list[Job]:
+        """
+        Apply a batch, one handler call per kind.
+
+        Returns:
+            Jobs that still failed after the retries
+        """
+        by_kind: dict[str, list[Job]] = {}
+        for job in jobs:
+            by_kind.setdefault(job.kind, []).append(job)
+        failed = []
+        for kind, group in by_kind.items():
+            payloads = [job.payload for job in group]
+            if not await self._apply(kind, payloads, self.max_retries):
+                failed += group
+        return failed
+
+    async def _apply(
+        self, kind: str, payloads: list[dict], retries: int
+    ) -> bool:
+        handler = _handlers.get(kind)
+        if handler is None:
+            logger.error("No handler for %d %r jobs", len(payloads), kind)
+            return False
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                await handler(payloads, self.engine_factory())
+            except Exception:
+                if attempt == retries:
+                    logger.exception(
+                        "Failed to apply %d %r jobs", len(payloads), kind
+                    )
+                    return False
+                JOBS.labels(kind, "retried").inc(len(payloads))
+                await asyncio.sleep(self.retry_backoff * 2**attempt)
+            else:
+                JOBS_FLUSH_TIME.labels(kind).observe(
+                    time.perf_counter() - start
+                )
+                JOBS.labels(kind, "done").inc(len(payloads))
+                return True
+        return False
+
+
+class RedisStreamJobQueue(JobQueue):
+    """Durable queue on a Redis Stream consumed by a consumer group."""
+
+    def __init__(
+        self,
+        engine_factory: Callable[[], Engine] = get_engine,
+        client: redis.Redis | None = None,
+    ):
+        super().__init__(engine_factory)
+        self.client = client
+        self.stream = settings.JOBS_STREAM
+        self.group = settings.JOBS_STREAM_GROUP
+        self.dead_letters = f"{self.stream}:dead"
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = int(
+            settings.JOBS_STREAM_CLAIM_IDLE_SECONDS * 1000
+        )
+        # Blocking reads must return before the socket times out
+        self.max_block_ms = int(settings.REDIS_SOCKET_TIMEOUT * 500)
+        self._next_claim = 0.0
+
+    async def start(self) -> None:
+        if self.client is None:
+            self.client = await get_redis_client()
+        try:
+            await self._create_group()
+        except RedisError as exc:
+            # The worker creates it once Redis is back
+            logger.warning("Could not create the jobs group: %s", exc)
+        await super().start()
+
+    async def _create_group(self) -> None:
+        try:
+            await self.client.xgroup_create(
+                self.stream, self.group, id="0", mkstream=True
+            )
+        except ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def enqueue(self, kind: str, payload: dict) -> None:
+        if kind not in _handlers:
+            raise KeyError(f"No handler for {kind!r} jobs")
+        if not self.running:
+            await self.run_inline(kind, payload)
+            return
+        fields = {"kind": kind, "payload": json.dumps(payload)}
+
+        async def add() -> int:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.xadd(self.stream, fields)
+                pipe.xlen(self.stream)
+                _, length = await pipe.execute()
+            return length
+
+        length = await guarded("jobs", add, lambda: None)
+        if length is None:
+            await self.run_inline(kind, payload)
+            return
+        JOBS.labels(kind, "queued").inc()
+        if length > self.max_size:
+            await asyncio.sleep(self.enqueue_timeout)
+
+    async def _finish(self) -> None:
+        # The worker notices _stopping after its current read
+        await self._worker
+
+    def _leftover(self) -> str:
+        return "pending jobs will be claimed by another worker"
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                jobs = await self._collect_stream()
+            except ResponseError as exc:
+                if "NOGROUP" not in str(exc):
+                    raise
+                await self._create_group()
+                continue
+            except RedisError as exc:
+                logger.warning("Reading %s failed: %s", self.stream, exc)
+                await asyncio.sleep(self.flush_interval)
+                continue
+            if not jobs:
+                continue
+            failed = {id(job) for job in await self._flush(jobs)}
+            # Failed entries stay pending and are retried once claimed
+            done = [job.entry_id for job in jobs if id(job) not in failed]
+            if done:
+                await self._acknowledge(done)
+
+    async def _acknowledge(self, entry_ids: list[str]) -> None:
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.xack(self.stream, self.group, *entry_ids)
+                # Keep XLEN equal to the backlog for the backpressure check
+                pipe.xdel(self.stream, *entry_ids)
+                await pipe.execute()
+        except RedisError as exc:
+            # They are applied again after being claimed: handlers are
+            # idempotent
+            logger.warning("Acknowledging jobs failed: %s", exc)
+
+    async def _collect_stream(self) -> list[Job]:
+        """Read new entries until the batch is full or due."""
+        jobs = await self._claim_stale()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(jobs) < self.batch_size and not self._stopping:
+            block = int((deadline - loop.time()) * 1000)
+            if block <= 0:
+                break
+            reply = await self.client.xreadgroup(
+                self.group,
+                self.consumer,
+                {self.stream: ">"},
+                count=self.batch_size - len(jobs),
+                block=min(block, self.max_block_ms),
+            )
+            if not reply:
+                break
+            for _, entries in reply:
+                jobs += [self._decode(*entry) for entry in entries]
+        return jobs
+
+    async def _claim_stale(self) -> list[Job]:
+        """Take over entries left pending by dead or failing consumers."""
+        now = time.monotonic()
+        if now < self._next_claim:
+            return []
+        self._next_claim = now + self.claim_idle_ms / 2000
+        reply = await self.client.xautoclaim(
+            self.stream,
+            self.group,
+            self.consumer,
+            min_idle_time=self.claim_idle_ms,
+            start_id="0-0",
+            count=self.batch_size,
+        )
+        # Redis 7 adds a third element, the IDs of deleted entries
+        entries = [entry for entry in reply[1] if entry[1]]
+        if not entries:
+            return []
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for entry_id, _ in entries:
+                pipe.xpending_range(
+                    self.stream, self.group, entry_id, entry_id, 1
+                )
+            pending = await pipe.execute()
+        jobs, dead = [], []
+        for (entry_id, fields), info in zip(entries, pending):
+            deliveries = info[0]["times_delivered"] if info else 0
+            if deliveries > self.max_retries + 1:
+                dead.append((entry_id, fields))
+            else:
+                jobs.append(self._decode(entry_id, fields))
+        if dead:
+            await self._bury(dead)
+        return jobs
+
+    async def _bury(self, entries: list[tuple[str, dict]]) -> None:
+        """Move entries that keep failing to the dead-letter stream."""
+        async with self.client.pipeline(transaction=False) as pipe:
+            for entry_id, fields in entries:
+                pipe.xadd(self.dead_letters, {**fields, "id": entry_id})
+            pipe.xack(self.stream, self.group, *(e for e, _ in entries))
+            pipe.xdel(self.stream, *(e for e, _ in entries))
+            await pipe.execute()
+        for _, fields in entries:
+            JOBS.labels(fields.get("kind", "unknown"), "dropped").inc()
+        logger.error(
+            "Moved %d failing jobs to %s", len(entries), self.dead_letters
+        )
+
+    @staticmethod
+    def _decode(entry_id: str, fields: dict) -> Job:
+        return Job(fields["kind"], json.loads(fields["payload"]), entry_id)
+
+
+_queue: JobQueue | None = None
+
+
+async def start_job_queue(app: FastAPI) -> JobQueue:
+    """
+    Create and start the queue selected by ``JOBS_BACKEND``.
+
+    Args:
+        app: Application whose database the handlers write to
+
+    Returns:
+        The started queue (not running for the ``inline`` backend)
+    """
+    global _queue
+    engine: Engine | None = None
+
+    def engine_factory() -> Engine:
+        # Resolved on first flush, so startup opens no database session
+        nonlocal engine
+        if engine is None:
+            with app_session(app) as session:
+                engine = session.get_bind()
+        return engine
+
+    if settings.JOBS_BACKEND == "redis":
+        _queue = RedisStreamJobQueue(engine_factory)
+    else:
+        _queue = JobQueue(engine_factory)
+    if settings.JOBS_BACKEND != "inline":
+        await _queue.start()
+    return _queue
+
+
+async def drain_job_queue() -> None:
+    """Apply the jobs still queued and stop the queue."""
+    global _queue
+    if _queue is not None:
+        await _queue.drain()
+        _queue = None
+
+
+async def enqueue(kind: str, payload: dict) -> None:
+    """
+    Enqueue a write-behind job.
+
+    Runs it inline when no queue was started (scripts, or before the
+    application lifespan).
+
+    Args:
+        kind: Job kind, with a registered handler
+        payload: JSON-serializable job data
+    """
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    await _queue.enqueue(kind, payload)
@@ -0,0 +1,263 @@
+"""JWT signing keys, rotation and JWKS publication.
+
+With an HMAC ``ALGORITHM`` (the default, HS256) tokens are signed with
+``SECRET_KEY``. With ``EdDSA`` or ``ES256`` every ``<kid>.pem`` file in
+``JWT_KEYS_DIR`` is loaded once at startup:
+
+* a private key can sign and verify; the one named by ``JWT_ACTIVE_KID``
+  (or the last kid in sort order) signs new tokens;
+* a public key only verifies, for keys being retired.
+
+Tokens carry the signing key's ``kid`` header, so rotating is: add the new
+key, deploy, switch ``JWT_ACTIVE_KID``, and delete the old file once the
+longest-lived token signed with it has expired. Other services verify
+tokens locally with the public keys published at
+``/.well-known/jwks.json``.
+
+Generate a key with ``python -m app.core.keys generate --kid 2026-10``.
+"""
+import argparse
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jwt.algorithms import ECAlgorithm, OKPAlgorithm
+
+from app.core.config import settings
+
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "ES256")
+
+
+class KeyConfigurationError(RuntimeError):
+    """The configured signing keys are missing or inconsistent."""
+
+
+@dataclass(frozen=True, slots=True)
+class JWTKey:
+    """A parsed key; ``private`` is None for verification-only keys."""
+
+    kid: str
+    algorithm: str
+    private: Any
+    public: Any
+
+
+@dataclass(frozen=True, slots=True)
+class KeyRing:
+    """The key that signs new tokens and every key that verifies them."""
+
+    signing: JWTKey
+    verification: dict[str, JWTKey]
+
+
+def _algorithm_of(key: Any) -> str:
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)):
+        if key.curve.name != "secp256r1":
+            raise KeyConfigurationError(
+                f"ES256 needs a P-256 key, got {key.curve.name}"
+            )
+        return "ES256"
+    raise KeyConfigurationError(f"Unsupported key type {type(key).__name__}")
+
+
+def load_key(kid: str, pem: bytes) -> JWTKey:
+    """
+    Parse a PEM private or public key.
+
+    Args:
+        kid: Key ID
+        pem: PEM encoded key
+
+    Returns:
+        Parsed key
+    """
+    try:
+        private = serialization.load_pem_private_key(pem, password=None)
+        public = private.public_key()
+    except ValueError:
+        private = None
+        public = serialization.load_pem_public_key(pem)
+    return JWTKey(
+        kid=kid, algorithm=_algorithm_of(public), private=private, public=public
+    )
+
+
+def load_keyring() -> KeyRing:
+    """
+    Build the key ring described by the settings.
+
+    Returns:
+        Key ring with parsed key objects
+
+    Raises:
+        KeyConfigurationError: If no usable signing key is configured
+    """
+    if settings.ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+        kid = settings.JWT_ACTIVE_KID or "default"
+        key = JWTKey(
+            kid=kid,
+            algorithm=settings.ALGORITHM,
+            private=settings.SECRET_KEY,
+            public=settings.SECRET_KEY,
+        )
+        return KeyRing(signing=key, verification={kid: key})
+
+    keys_dir = Path(settings.JWT_KEYS_DIR)
+    verification = {
+        path.stem: load_key(path.stem, path.read_bytes())
+        for path in sorted(keys_dir.glob("*.pem"))
+    }
+    signers = [
+        key for key in verification.values()
+        if key.private is not None and key.algorithm == settings.ALGORITHM
+    ]
+    if settings.JWT_ACTIVE_KID:
+        signing = verification.get(settings.JWT_ACTIVE_KID)
+        if signing is None or not any(signing is key for key in signers):
+            raise KeyConfigurationError(
+                f"No {settings.ALGORITHM} private key "
+                f"'{settings.JWT_ACTIVE_KID}' in {keys_dir}"
+            )
+    elif signers:
+        signing = signers[-1]
+    else:
+        raise KeyConfigurationError(
+            f"No {settings.ALGORITHM} private key in {keys_dir}"
+        )
+    return KeyRing(signing=signing, verification=verification)
+
+
+_keyring: KeyRing | None = None
+
+
+def get_keyring() -> KeyRing:
+    """Get the key ring, loading and parsing the keys on first use."""
+    global _keyring
+    if _keyring is None:
+        _keyring = load_keyring()
+    return _keyring
+
+
+def reload_keyring() -> KeyRing:
+    """Re-read the keys, e.g. after adding or retiring one."""
+    global _keyring
+    _keyring = load_keyring()
+    return _keyring
+
+
+def encode_jwt(payload: dict[str, Any]) -> str:
+    """
+    Sign a payload with the active key, tagging it with its ``kid``.
+
+    Args:
+        payload: Claims to encode
+
+    Returns:
+        Encoded JWT
+    """
+    key = get_keyring().signing
+    return jwt.encode(
+        payload, key.private, algorithm=key.algorithm, headers={"kid": key.kid}
+    )
+
+
+def decode_jwt(token: str, **options: Any) -> dict[str, Any]:
+    """
+    Verify a JWT with the key named by its ``kid`` header.
+
+    Tokens without a ``kid`` (issued before keys had IDs) are verified
+    with the signing key.
+
+    Args:
+        token: Encoded JWT
+        **options: Extra keyword arguments for ``jwt.decode``
+
+    Returns:
+        Decoded claims
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or the kid unknown
+    """
+    ring = get_keyring()
+    kid = jwt.get_unverified_header(token).get("kid")
+    key = ring.signing if kid is None else ring.verification.get(kid)
+    if key is None:
+        raise jwt.InvalidTokenError(f"Unknown key id '{kid}'")
+    return jwt.decode(token, key.public, algorithms=[key.algorithm], **options)
+
+
+def jwks() -> dict[str, list[dict[str, Any]]]:
+    """
+    Get the public verification keys as a JSON Web Key Set.
+
+    Returns:
+        JWKS document (empty for HMAC algorithms, whose key is secret)
+    """
+    keys = []
+    for key in get_keyring().verification.values():
+        if key.algorithm == "EdDSA":
+            jwk = OKPAlgorithm.to_jwk(key.public, as_dict=True)
+        elif key.algorithm == "ES256":
+            jwk = ECAlgorithm.to_jwk(key.public, as_dict=True)
+        else:
+            continue
+        jwk.update(kid=key.kid, alg=key.algorithm, use="sig")
+        keys.append(jwk)
+    return {"keys": keys}
+
+
+def generate_private_key(algorithm: str) -> bytes:
+    """
+    Generate a new private key as PEM.
+
+    Args:
+        algorithm: ``EdDSA`` (Ed25519) or ``ES256`` (P-256)
+
+    Returns:
+        PKCS#8 PEM encoded private key
+    """
+    if algorithm == "EdDSA":
+        private = ed25519.Ed25519PrivateKey.generate()
+    elif algorithm == "ES256":
+        private = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise KeyConfigurationError(f"Cannot generate {algorithm} keys")
+    return private.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Manage JWT signing keys")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="Create a private key")
+    generate.add_argument("--kid", required=True)
+    generate.add_argument(
+        "--alg", choices=ASYMMETRIC_ALGORITHMS, default="EdDSA"
+    )
+    commands.add_parser("jwks", help="Print the public JWKS")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        keys_dir = Path(settings.JWT_KEYS_DIR)
+        keys_dir.mkdir(parents=True, exist_ok=True)
+        path = keys_dir / f"{args.kid}.pem"
+        if path.exists():
+            parser.error(f"{path} already exists")
+        path.write_bytes(generate_private_key(args.alg))
+        path.chmod(0o600)
+        print(f"Created {path}")
+    else:
+        print(json.dumps(jwks(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""Prometheus metrics collection and per-request instrumentation."""
+import os
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.routing import BaseRoute
+
+# Label used for requests that did not match any route, so that random
+# 404 paths cannot blow up the label cardinality.
+UNMATCHED_ROUTE = "<unmatched>"
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0,
+)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Total HTTP requests by route template and status code.",
+    ["method", "route", "status"],
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template.",
+    ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being served.",
+    ["method", "route"],
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Histogram(
+    "db_queries_per_request",
+    "Number of SQL statements executed per request.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_TIME = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent executing SQL statements per request.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+REDIS_COMMANDS = Histogram(
+    "redis_commands_per_request",
+    "Number of Redis commands executed per request.",
+    ["route"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+REDIS_TIME = Histogram(
+    "redis_time_per_request_seconds",
+    "Time spent executing Redis commands per request.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+REDIS_CACHE_LOOKUPS = Counter(
+    "redis_client_cache_lookups_total",
+    "Lookups of the Redis client-side cache by result (hit or miss).",
+    ["result"],
+)
+REDIS_BREAKER_STATE = Gauge(
+    "redis_circuit_breaker_state",
+    "Redis circuit breaker state (0 closed, 1 open, 2 half-open).",
+    multiprocess_mode="liveall",
+)
+REDIS_FALLBACKS = Counter(
+    "redis_fallbacks_total",
+    "Redis operations answered by the failure policy instead of Redis.",
+    ["operation", "policy"],
+)
+
+JOBS = Counter(
+    "write_behind_jobs_total",
+    "Write-behind jobs by kind and outcome (queued, inline, done, "
+    "retried, dropped).",
+    ["kind", "outcome"],
+)
+JOBS_QUEUE_DEPTH = Gauge(
+    "write_behind_queue_depth",
+    "Jobs waiting in the in-process write-behind queue.",
+    multiprocess_mode="livesum",
+)
+COALESCED_REQUESTS = Counter(
+    "http_coalesced_requests_total",
+    "Reads of coalesced routes by role: leader, follower (same worker), "
+    "remote (another worker's response) or fallback (waiting failed).",
+    ["route", "role"],
+)
+CHANGE_FEED_SUBSCRIBERS = Gauge(
+    "change_feed_subscribers",
+    "Clients connected to the item change feed.",
+    multiprocess_mode="livesum",
+)
+CHANGE_FEED_EVENTS = Counter(
+    "change_feed_events_total",
+    "Item change events received by the worker's change feed.",
+)
+CHANGE_FEED_SLOW_CONSUMERS = Counter(
+    "change_feed_slow_consumers_total",
+    "Change feed clients disconnected for falling too far behind.",
+)
+JOBS_FLUSH_TIME = Histogram(
+    "write_behind_flush_duration_seconds",
+    "Time spent flushing one batch of write-behind jobs of a kind.",
+    ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+
+
+@dataclass(slots=True)
+class RequestStats:
+    """Mutable counters accumulated while serving a single request."""
+
+    db_count: int = 0
+    db_time: float = 0.0
+    redis_count: int = 0
+    redis_time: float = 0.0
+
+
+# Shared by reference with the threadpool running sync endpoints, so
+# mutations made there are visible to the middleware.
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def record_db_query(duration: float) -> None:
+    """Record one SQL statement against the current request, if any."""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.db_count += 1
+        stats.db_time += duration
+
+
+def record_redis_command(duration: float) -> None:
+    """Record one Redis command against the current request, if any."""
+    stats = request_stats.get()
+    if stats is not None:
+        stats.redis_count += 1
+        stats.redis_time += duration
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    start = conn.info["query_start_time"].pop()
+    record_db_query(time.perf_counter() - start)
+
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failing statement
+    connection = exception_context.connection
+    starts = connection.info.get("query_start_time") if connection else None
+    if starts:
+        record_db_query(time.perf_counter() - starts.pop())
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Attach query counting hooks to a SQLAlchemy engine.
+
+    Args:
+        engine: Engine whose statements should be recorded per request
+    """
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+class PrometheusMiddleware:
+    """
+    ASGI middleware recording per-route request metrics.
+
+    Implemented as a raw ASGI middleware rather than ``BaseHTTPMiddleware``
+    to keep the per-request overhead in the low microseconds. Route
+    templates of static paths are resolved with a dict lookup, and labelled
+    children are cached so the hot path avoids label lookups.
+    """
+
+    def __init__(
+        self,
+        app,
+        routes: list[BaseRoute],
+        exclude_paths: tuple[str, ...] = ("/metrics",),
+    ):
+        self.app = app
+        self.routes = routes
+        self.exclude_paths = exclude_paths
+        self._static_routes: dict[str, str] | None = None
+        self._dynamic_routes: list[BaseRoute] = []
+        self._children: dict[str, tuple] = {}
+        self._requests: dict[tuple[str, str, int], Counter] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        template = self._resolve_route(scope)
+        children = self._children.get(method + template)
+        if children is None:
+            children = (
+                HTTP_IN_PROGRESS.labels(method, template),
+                HTTP_LATENCY.labels(method, template),
+                DB_QUERIES.labels(template),
+                DB_TIME.labels(template),
+                REDIS_COMMANDS.labels(template),
+                REDIS_TIME.labels(template),
+            )
+            self._children[method + template] = children
+        in_progress, latency, db_queries, db_time, redis_cmds, redis_time = (
+            children
+        )
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency.observe(time.perf_counter() - start)
+            in_progress.dec()
+            request_stats.reset(token)
+
+            key = (method, template, status_code)
+            counter = self._requests.get(key)
+            if counter is None:
+                counter = HTTP_REQUESTS.labels(method, template, status_code)
+                self._requests[key] = counter
+            counter.inc()
+            db_queries.observe(stats.db_count)
+            db_time.observe(stats.db_time)
+            redis_cmds.observe(stats.redis_count)
+            redis_time.observe(stats.redis_time)
+
+    def _resolve_route(self, scope) -> str:
+        if self._static_routes is None:
+            self._index_routes()
+        template = self._static_routes.get(scope["path"])
+        if template is not None:
+            return template
+        path = scope["path"]
+        for route in self._dynamic_routes:
+            if route.path_regex.match(path):
+                return route.path
+        return UNMATCHED_ROUTE
+
+    def _index_routes(self) -> None:
+        # Built lazily so that routers included after the middleware was
+        # registered are still taken into account.
+        static_routes = {}
+        for route in self.routes:
+            path = getattr(route, "path", None)
+            if path is None:
+                continue
+            if getattr(route, "param_convertors", None):
+                self._dynamic_routes.append(route)
+            else:
+                static_routes[path] = path
+        self._static_routes = static_routes
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Render all metrics in the Prometheus text exposition format.
+
+    When ``PROMETHEUS_MULTIPROC_DIR`` is set (multi-worker uvicorn), the
+    samples written by every worker process are aggregated.
+
+    Returns:
+        Tuple of (payload, content type)
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """
+    Remove live gauge samples of an exited worker in multiprocess mode.
+
+    Args:
+        pid: Process id of the worker that exited
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid)
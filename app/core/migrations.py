@@ -0,0 +1,340 @@
+"""Zero-downtime migration helpers for Alembic revisions.
+
+On PostgreSQL, plain ``op.create_index`` and column changes lock the table
+for as long as they scan it, blocking the API. Revisions touching large
+tables should use these helpers instead:
+
+* ``create_index_concurrently`` / ``drop_index_concurrently`` build or drop
+  indexes ``CONCURRENTLY``, outside the migration transaction;
+* ``add_column`` refuses columns that would rewrite or scan the table
+  (NOT NULL without a default, volatile defaults): add them nullable,
+  ``backfill`` them and then ``set_not_null``;
+* ``set_not_null`` validates a ``NOT VALID`` check constraint first, so
+  the final ``SET NOT NULL`` does not scan the table under an exclusive
+  lock;
+* ``backfill`` updates rows in primary-key batches, each committed on its
+  own, pausing between batches and logging progress (``run_in_batches``
+  does the same for any statement).
+
+``alembic/env.py`` runs each revision in its own transaction with
+``MIGRATION_LOCK_TIMEOUT`` and ``MIGRATION_STATEMENT_TIMEOUT`` (see
+``set_migration_timeouts``), so a migration waiting for a lock fails fast
+instead of queueing every API query behind it. On other databases (SQLite
+in the tests) the helpers fall back to the plain operations.
+"""
+import logging
+import time
+from collections.abc import Iterator, Sequence
+from contextlib import contextmanager, nullcontext
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Defaults PostgreSQL evaluates per row, forcing a table rewrite
+VOLATILE_DEFAULTS = (
+    "random(",
+    "gen_random_uuid(",
+    "uuid_generate_",
+    "clock_timestamp(",
+    "nextval(",
+)
+
+
+def set_migration_timeouts(connection: Connection) -> None:
+    """
+    Apply the migration lock and statement timeouts to a connection.
+
+    Args:
+        connection: Connection the migrations will run on
+    """
+    if connection.dialect.name != "postgresql":
+        return
+    connection.execute(
+        sa.text(
+            "SELECT set_config('lock_timeout', :lock_timeout, false), "
+            "set_config('statement_timeout', :statement_timeout, false)"
+        ),
+        {
+            "lock_timeout": settings.MIGRATION_LOCK_TIMEOUT,
+            "statement_timeout": settings.MIGRATION_STATEMENT_TIMEOUT,
+        },
+    )
+    # Leave no transaction open, so Alembic manages one per revision
+    connection.commit()
+
+
+def _is_postgresql() -> bool:
+    return op.get_bind().dialect.name == "postgresql"
+
+
+def _autocommit_block():
+    """Run outside the migration transaction (PostgreSQL only)."""
+    if _is_postgresql():
+        return op.get_context().autocommit_block()
+    return nullcontext()
+
+
+def _quote(name: str) -> str:
+    return op.get_bind().dialect.identifier_preparer.quote(name)
+
+
+@contextmanager
+def _without_statement_timeout() -> Iterator[None]:
+    """Lift the statement timeout for operations that do not block."""
+    bind = op.get_bind()
+    previous = bind.execute(sa.text("SHOW statement_timeout")).scalar()
+    bind.execute(sa.text("SET statement_timeout = 0"))
+    try:
+        yield
+    finally:
+        bind.execute(
+            sa.text("SELECT set_config('statement_timeout', :value, false)"),
+            {"value": previous},
+        )
+
+
+def create_index_concurrently(
+    index_name: str,
+    table_name: str,
+    columns: Sequence[str],
+    unique: bool = False,
+    **kw,
+) -> None:
+    """
+    Create an index without blocking writes to the table.
+
+    Args:
+        index_name: Index name
+        table_name: Table name
+        columns: Indexed columns
+        unique: Whether the index is unique
+        **kw: Extra keyword arguments for ``op.create_index``
+    """
+    if not _is_postgresql():
+        op.create_index(index_name, table_name, columns, unique=unique, **kw)
+        return
+    with op.get_context().autocommit_block(), _without_statement_timeout():
+        # A failed concurrent build leaves an INVALID index behind
+        invalid = op.get_bind().execute(
+            sa.text(
+                "SELECT NOT i.indisvalid FROM pg_index i "
+                "JOIN pg_class c ON c.oid = i.indexrelid "
+                "WHERE c.relname = :name"
+            ),
+            {"name": index_name},
+        ).scalar()
+        if invalid:
+            op.drop_index(
+                index_name,
+                table_name=table_name,
+                postgresql_concurrently=True,
+            )
+        op.create_index(
+            index_name,
+            table_name,
+            columns,
+            unique=unique,
+            postgresql_concurrently=True,
+            if_not_exists=True,
+            **kw,
+        )
+
+
+def drop_index_concurrently(index_name: str, table_name: str) -> None:
+    """
+    Drop an index without blocking reads and writes to the table.
+
+    Args:
+        index_name: Index name
+        table_name: Table name
+    """
+    if not _is_postgresql():
+        op.drop_index(index_name, table_name=table_name)
+        return
+    with op.get_context().autocommit_block(), _without_statement_timeout():
+        op.drop_index(
+            index_name,
+            table_name=table_name,
+            postgresql_concurrently=True,
+            if_exists=True,
+        )
+
+
+def add_column(table_name: str, column: sa.Column) -> None:
+    """
+    Add a column with a metadata-only change.
+
+    Args:
+        table_name: Table name
+        column: Column to add
+
+    Raises:
+        ValueError: If adding the column would rewrite or scan the table
+    """
+    default = column.server_default
+    if not column.nullable and default is None:
+        raise ValueError(
+            f"NOT NULL column {column.name} without a server default needs "
+            f"a full scan of {table_name}: add it nullable, backfill() it "
+            f"and set_not_null()"
+        )
+    if default is not None:
+        expression = str(getattr(default, "arg", default)).lower()
+        if any(volatile in expression for volatile in VOLATILE_DEFAULTS):
+            raise ValueError(
+                f"Volatile default for {column.name} rewrites {table_name}: "
+                f"add the column without it and backfill() instead"
+            )
+    op.add_column(table_name, column)
+
+
+def set_not_null(table_name: str, column_name: str) -> None:
+    """
+    Make a column NOT NULL without scanning under an exclusive lock.
+
+    Args:
+        table_name: Table name
+        column_name: Column that no longer contains NULLs
+    """
+    if not _is_postgresql():
+        with op.batch_alter_table(table_name) as batch:
+            batch.alter_column(column_name, nullable=False)
+        return
+
+    table, column = _quote(table_name), _quote(column_name)
+    constraint = _quote(f"{table_name}_{column_name}_not_null")
+    op.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {constraint} "
+        f"CHECK ({column} IS NOT NULL) NOT VALID"
+    )
+    # Validating only takes a SHARE UPDATE EXCLUSIVE lock
+    with op.get_context().autocommit_block(), _without_statement_timeout():
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint}")
+    # PostgreSQL 12+ skips the scan thanks to the validated constraint
+    op.alter_column(table_name, column_name, nullable=False)
+    op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {constraint}")
+
+
+def backfill(
+    table_name: str,
+    set_sql: str,
+    where: str | None = None,
+    *,
+    key: str = "id",
+    batch_size: int | None = None,
+    pause: float | None = None,
+) -> int:
+    """
+    Update a large table in throttled primary-key batches.
+
+    On PostgreSQL each batch is committed on its own, so row locks are
+    held briefly and replicas keep up; progress is logged every few
+    seconds.
+
+    Args:
+        table_name: Table name
+        set_sql: SQL for the SET clause, e.g. ``"slug = lower(title)"``
+        where: Optional SQL condition limiting the updated rows
+        key: Integer primary key column used to split the batches
+        batch_size: Key range per batch (``MIGRATION_BACKFILL_BATCH_SIZE``)
+        pause: Seconds to sleep between batches
+            (``MIGRATION_BACKFILL_PAUSE_SECONDS``)
+
+    Returns:
+        Number of updated rows
+    """
+    if op.get_context().as_sql:
+        raise RuntimeError("backfill() needs an online migration")
+    if batch_size is None:
+        batch_size = settings.MIGRATION_BACKFILL_BATCH_SIZE
+    if pause is None:
+        pause = settings.MIGRATION_BACKFILL_PAUSE_SECONDS
+
+    table, key_column = _quote(table_name), _quote(key)
+    condition = f" AND ({where})" if where else ""
+    update = sa.text(
+        f"UPDATE {table} SET {set_sql} "
+        f"WHERE {key_column} >= :start AND {key_column} < :end{condition}"
+    )
+    with _autocommit_block():
+        return run_in_batches(
+            op.get_bind(),
+            table_name,
+            update,
+            key=key,
+            batch_size=batch_size,
+            pause=pause,
+        )
+
+
+def run_in_batches(
+    connection: Connection,
+    table_name: str,
+    statement: sa.TextClause,
+    *,
+    key: str = "id",
+    batch_size: int,
+    pause: float,
+    label: str = "Backfill",
+) -> int:
+    """
+    Run a statement over consecutive key ranges of a table.
+
+    The statement receives the ``start`` (inclusive) and ``end``
+    (exclusive) bounds of each range; on an autocommit connection every
+    batch is committed on its own. Progress is logged every few seconds.
+
+    Args:
+        connection: Connection to run the batches on
+        table_name: Table whose key range is split into batches
+        statement: Statement with ``:start`` and ``:end`` parameters
+        key: Integer key column used to split the batches
+        batch_size: Key range per batch
+        pause: Seconds to sleep between batches
+        label: Name of the operation in the progress logs
+
+    Returns:
+        Number of rows affected by all the batches
+    """
+    preparer = connection.dialect.identifier_preparer
+    table, key_column = preparer.quote(table_name), preparer.quote(key)
+    bounds = sa.text(
+        f"SELECT min({key_column}), max({key_column}) FROM {table}"
+    )
+
+    low, high = connection.execute(bounds).one()
+    if low is None:
+        logger.info("%s of %s: table is empty", label, table_name)
+        return 0
+
+    affected = 0
+    started = last_report = time.monotonic()
+    start = low
+    while start <= high:
+        end = start + batch_size
+        result = connection.execute(statement, {"start": start, "end": end})
+        affected += result.rowcount
+        start = end
+
+        now = time.monotonic()
+        if now - last_report >= 5 or start > high:
+            last_report = now
+            done = min(1.0, (start - low) / (high - low + 1))
+            elapsed = now - started
+            logger.info(
+                "%s of %s: %.1f%% done, %d rows, %.0f rows/s, ETA %.0f s",
+                label,
+                table_name,
+                done * 100,
+                affected,
+                affected / elapsed if elapsed else 0.0,
+                elapsed / done - elapsed if done else 0.0,
+            )
+        if pause and start <= high:
+            time.sleep(pause)
+    return affected
@@ -0,0 +1,357 @@
+"""Opt-in online migration of ``items`` to hash partitions by owner.
+
+Every item query is scoped to its owner, so a table hash-partitioned by
+``owner_id`` lets PostgreSQL prune each query to a single partition: the
+indexes it walks and the pages it caches are those of one small table,
+and vacuum works on one partition at a time instead of the whole heap.
+
+``python -m app.core.partitioning migrate`` converts an existing table
+without downtime, resuming where it left off if interrupted:
+
+1. ``prepare`` creates ``items_partitioned`` (same columns, defaults and
+   sequence) with ``ITEMS_PARTITIONS`` partitions and a trigger that
+   mirrors every write on ``items`` into it;
+2. ``copy_rows`` copies the existing rows in throttled id batches, each
+   committed on its own; rows are read ``FOR SHARE`` so a concurrent
+   update or delete is either mirrored after the batch or skipped by it;
+3. ``swap`` renames the tables (and their indexes and constraints) in one
+   short transaction under ``MIGRATION_LOCK_TIMEOUT``.
+
+The old table is kept as ``items_unpartitioned`` for a manual rollback
+until ``drop-old`` removes it. The primary key becomes ``(id, owner_id)``
+(a partitioned table's unique keys must contain the partition key); ids
+still come from ``items_id_seq``, so they stay unique.
+"""
+import argparse
+import logging
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.engine import Connection
+
+from app.core.config import settings
+from app.core.database import get_engine
+from app.core.migrations import run_in_batches, set_migration_timeouts
+
+logger = logging.getLogger(__name__)
+
+TABLE = "items"
+PARTITIONED = "items_partitioned"
+OLD = "items_unpartitioned"
+MIRROR = "items_mirror"
+
+
+def partition_ddl(partitions: int) -> list[str]:
+    """
+    Build the statements creating the partitioned copy of ``items``.
+
+    Args:
+        partitions: Number of hash partitions
+
+    Returns:
+        SQL statements, to run in a single transaction
+
+    Raises:
+        ValueError: If ``partitions`` is not positive
+    """
+    if partitions < 1:
+        raise ValueError("At least one partition is needed")
+    statements = [
+        f"CREATE TABLE {PARTITIONED} "
+        f"(LIKE {TABLE} INCLUDING DEFAULTS) PARTITION BY HASH (owner_id)",
+    ]
+    statements += [
+        f"CREATE TABLE {TABLE}_p{remainder} "
+        f"PARTITION OF {PARTITIONED} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+    statements += [
+        # Same indexes as items; lookups by (id, owner_id) are pruned to
+        # one partition, id-only lookups probe every partition's index
+        f"ALTER TABLE {PARTITIONED} "
+        f"ADD CONSTRAINT {PARTITIONED}_pkey PRIMARY KEY (id, owner_id)",
+        f"ALTER TABLE {PARTITIONED} "
+        f"ADD CONSTRAINT {PARTITIONED}_owner_id_fkey "
+        f"FOREIGN KEY (owner_id) REFERENCES users (id)",
+        f"CREATE INDEX ix_{PARTITIONED}_owner_id "
+        f"ON {PARTITIONED} (owner_id)",
+        f"CREATE INDEX ix_{PARTITIONED}_title "
+        f"ON {PARTITIONED} (title)",
+        f"""CREATE FUNCTION {MIRROR}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM {PARTITIONED}
+        WHERE id = OLD.id AND owner_id = OLD.owner_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO {PARTITIONED} VALUES (NEW.*)
+        ON CONFLICT (id, owner_id) DO NOTHING;
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql""",
+        f"CREATE TRIGGER {MIRROR} "
+        f"AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {MIRROR}()",
+    ]
+    return statements
+
+
+def _exists(connection: Connection, name: str) -> bool:
+    return connection.execute(
+        sa.text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    ).scalar()
+
+
+def is_partitioned(connection: Connection) -> bool:
+    """
+    Check whether ``items`` already is the partitioned table.
+
+    Args:
+        connection: PostgreSQL connection
+
+    Returns:
+        True once ``swap`` has run
+    """
+    return connection.execute(
+        sa.text(
+            "SELECT relkind = 'p' FROM pg_class "
+            "WHERE oid = CAST(:name AS regclass)"
+        ),
+        {"name": TABLE},
+    ).scalar()
+
+
+def prepare(connection: Connection, partitions: int) -> None:
+    """
+    Create the partitioned table and start mirroring writes into it.
+
+    The DDL is transactional, so the table either exists complete with
+    its partitions and trigger or not at all.
+
+    Args:
+        connection: PostgreSQL connection
+        partitions: Number of hash partitions
+    """
+    if _exists(connection, PARTITIONED):
+        logger.info("%s already exists, resuming the copy", PARTITIONED)
+        connection.commit()
+        return
+    for statement in partition_ddl(partitions):
+        connection.execute(sa.text(statement))
+    connection.commit()
+
+
+def copy_rows(
+    connection: Connection,
+    batch_size: int | None = None,
+    pause: float | None = None,
+) -> int:
+    """
+    Copy the existing items into the partitioned table in id batches.
+
+    Rows already there (mirrored or copied by an earlier run) are kept.
+
+    Args:
+        connection: PostgreSQL connection in autocommit mode
+        batch_size: Id range per batch (``MIGRATION_BACKFILL_BATCH_SIZE``)
+        pause: Seconds to sleep between batches
+            (``MIGRATION_BACKFILL_PAUSE_SECONDS``)
+
+    Returns:
+        Number of copied rows
+    """
+    copy = sa.text(
+        f"WITH batch AS (SELECT * FROM {TABLE} "
+        f"WHERE id >= :start AND id < :end FOR SHARE) "
+        f"INSERT INTO {PARTITIONED} SELECT * FROM batch "
+        f"ON CONFLICT (id, owner_id) DO NOTHING"
+    )
+    copied = run_in_batches(
+        connection,
+        TABLE,
+        copy,
+        batch_size=batch_size or settings.MIGRATION_BACKFILL_BATCH_SIZE,
+        pause=(
+            settings.MIGRATION_BACKFILL_PAUSE_SECONDS
+            if pause is None
+            else pause
+        ),
+        label="Copy",
+    )
+    connection.execute(sa.text(f"ANALYZE {PARTITIONED}"))
+    return copied
+
+
+def _rename_all(connection: Connection, table: str, new: str) -> None:
+    """Rename a table with its constraints and standalone indexes."""
+    constraints = connection.execute(
+        sa.text(
+            "SELECT conname FROM pg_constraint "
+            "WHERE conrelid = CAST(:table AS regclass)"
+        ),
+        {"table": table},
+    ).scalars().all()
+    indexes = connection.execute(
+        sa.text(
+            "SELECT c.relname FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE i.indrelid = CAST(:table AS regclass) AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint "
+            "WHERE conindid = i.indexrelid AND conrelid = i.indrelid)"
+        ),
+        {"table": table},
+    ).scalars().all()
+    statements = [
+        f"ALTER TABLE {table} RENAME CONSTRAINT {name} "
+        f"TO {name.replace(table, new, 1)}"
+        for name in constraints
+        if table in name
+    ]
+    statements += [
+        f"ALTER INDEX {name} RENAME TO {name.replace(table, new, 1)}"
+        for name in indexes
+        if table in name
+    ]
+    statements.append(f"ALTER TABLE {table} RENAME TO {new}")
+    for statement in statements:
+        connection.execute(sa.text(statement))
+
+
+def swap(connection: Connection, attempts: int = 5) -> None:
+    """
+    Make the partitioned table ``items`` in one short transaction.
+
+    Args:
+        connection: PostgreSQL connection with the migration timeouts
+        attempts: Tries when the table lock is not granted in time
+
+    Raises:
+        OperationalError: If the lock was never granted
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            connection.execute(
+                sa.text(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+            )
+            connection.execute(sa.text(f"DROP TRIGGER {MIRROR} ON {TABLE}"))
+            _rename_all(connection, TABLE, OLD)
+            _rename_all(connection, PARTITIONED, TABLE)
+            # Dropping the old table must not drop the id sequence
+            connection.execute(
+                sa.text(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+            )
+            connection.execute(sa.text(f"DROP FUNCTION {MIRROR}()"))
+            connection.commit()
+            return
+        except sa.exc.OperationalError:
+            connection.rollback()
+            if attempt == attempts:
+                raise
+            logger.warning("Lock on %s not granted, retrying", TABLE)
+            time.sleep(attempt)
+
+
+def migrate(
+    partitions: int,
+    batch_size: int | None = None,
+    pause: float | None = None,
+    switch: bool = True,
+    engine: sa.Engine | None = None,
+) -> None:
+    """
+    Run (or resume) the whole migration.
+
+    Args:
+        partitions: Number of hash partitions
+        batch_size: Id range per copy batch
+        pause: Seconds to sleep between copy batches
+        switch: Whether to swap the tables once the copy is done
+        engine: Engine to migrate (default: the application's)
+    """
+    engine = engine or get_engine()
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("Partitioning needs PostgreSQL")
+    with engine.connect() as connection:
+        set_migration_timeouts(connection)
+        if is_partitioned(connection):
+            logger.info("%s is already partitioned", TABLE)
+            return
+        prepare(connection, partitions)
+        # One transaction per batch
+        autocommit = engine.execution_options(isolation_level="AUTOCOMMIT")
+        with autocommit.connect() as batches:
+            set_migration_timeouts(batches)
+            copied = copy_rows(batches, batch_size, pause)
+        logger.info("Copied %d rows into %s", copied, PARTITIONED)
+        if switch:
+            swap(connection)
+            logger.info(
+                "%s is partitioned; the old table is %s", TABLE, OLD
+            )
+
+
+def status() -> str:
+    """Describe the migration state of ``items``."""
+    with get_engine().connect() as connection:
+        if connection.dialect.name != "postgresql":
+            return "not supported (needs PostgreSQL)"
+        if is_partitioned(connection):
+            partitions = connection.execute(
+                sa.text(
+                    "SELECT count(*) FROM pg_inherits "
+                    "WHERE inhparent = CAST(:name AS regclass)"
+                ),
+                {"name": TABLE},
+            ).scalar()
+            old = " (old table kept)" if _exists(connection, OLD) else ""
+            return f"partitioned in {partitions} partitions{old}"
+        if _exists(connection, PARTITIONED):
+            return "copy in progress: run migrate to resume"
+        return "not partitioned"
+
+
+def drop_old() -> None:
+    """Drop the unpartitioned table kept after the swap."""
+    with get_engine().connect() as connection:
+        set_migration_timeouts(connection)
+        connection.execute(sa.text(f"DROP TABLE IF EXISTS {OLD}"))
+        connection.commit()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Hash-partition the items table by owner"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = commands.add_parser(
+        "migrate", help="Create, fill and switch to the partitioned table"
+    )
+    migrate_parser.add_argument(
+        "--partitions", type=int, default=settings.ITEMS_PARTITIONS
+    )
+    migrate_parser.add_argument("--batch-size", type=int)
+    migrate_parser.add_argument("--pause", type=float)
+    migrate_parser.add_argument(
+        "--no-swap",
+        dest="switch",
+        action="store_false",
+        help="Stop after the copy, keeping the trigger in place",
+    )
+    commands.add_parser("status", help="Show the migration state")
+    commands.add_parser("drop-old", help="Drop items_unpartitioned")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "migrate":
+        migrate(args.partitions, args.batch_size, args.pause, args.switch)
+    elif args.command == "status":
+        print(f"{TABLE}: {status()}")
+    else:
+        drop_old()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
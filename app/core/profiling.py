@@ -0,0 +1,278 @@
+"""Opt-in sampling profiler for individual requests."""
+import asyncio
+import contextvars
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+from urllib.parse import parse_qsl
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+
+# Module prefixes attributing a stack to a cost category. The innermost
+# matching frame wins, so a JSON dump inside SQLAlchemy counts as
+# serialization while a query issued from a validator counts as SQL.
+CATEGORIES = (
+    ("argon2", "argon2"),
+    ("jwt", "jwt"),
+    ("sqlalchemy", "sqlalchemy"),
+    ("sqlmodel", "sqlalchemy"),
+    ("psycopg2", "sqlalchemy"),
+    ("sqlite3", "sqlalchemy"),
+    ("redis", "redis"),
+    ("pydantic", "serialization"),
+    ("pydantic_core", "serialization"),
+    ("json", "serialization"),
+    ("fastapi.encoders", "serialization"),
+)
+
+# Leaf functions of threads that are parked rather than doing work.
+IDLE_FUNCTIONS = frozenset(
+    {"wait", "select", "poll", "_worker", "get", "acquire", "sleep",
+     "run", "run_forever", "run_until_complete"}
+)
+IDLE_MODULES = frozenset(
+    {"threading", "selectors", "queue", "concurrent.futures.thread",
+     "anyio._backends._asyncio", "asyncio.runners", "asyncio.base_events"}
+)
+
+
+def _module_name(frame) -> str:
+    return frame.f_globals.get("__name__", "?")
+
+
+def _category(module: str) -> str | None:
+    for prefix, category in CATEGORIES:
+        if module == prefix or module.startswith(prefix + "."):
+            return category
+    return None
+
+
+def collapse_stack(frame) -> str | None:
+    """
+    Convert a frame into a collapsed-stack line prefixed by its category.
+
+    Args:
+        frame: Leaf frame of a sampled thread
+
+    Returns:
+        ``category;root;...;leaf`` or None if the thread is idle
+    """
+    if (
+        frame.f_code.co_name in IDLE_FUNCTIONS
+        and _module_name(frame) in IDLE_MODULES
+    ):
+        return None
+
+    names = []
+    category = None
+    while frame is not None:
+        module = _module_name(frame)
+        if category is None:
+            category = _category(module)
+        names.append(f"{module}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    names.append(category or "app")
+    return ";".join(reversed(names))
+
+
+# Set while a request is profiled; copied into the threads running its
+# synchronous dependencies and endpoint
+_profiled: contextvars.ContextVar["StackSampler | None"] = (
+    contextvars.ContextVar("profiled_request", default=None)
+)
+
+
+def _worker_context(frame) -> contextvars.Context | None:
+    """Context an anyio worker thread is running a function in, if any."""
+    while frame is not None:
+        if (
+            frame.f_code.co_name == "run"
+            and _module_name(frame) == "anyio._backends._asyncio"
+        ):
+            context = frame.f_locals.get("context")
+            if isinstance(context, contextvars.Context):
+                return context
+        frame = frame.f_back
+    return None
+
+
+class StackSampler:
+    """
+    Background thread sampling the stacks working for one request.
+
+    Those are the event loop thread while the request's task runs on it,
+    and the worker threads running code in the request's context, so
+    concurrent requests do not show up in its profile.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def start(self) -> None:
+        """Start sampling the current task and its worker threads.
+
+        The worker threads are recognized by ``_profiled``, which the
+        caller sets to this sampler.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._loop_thread = threading.get_ident()
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self._stop.is_set():
+            self._stop.set()
+            self._thread.join()
+
+    def _owns(self, ident: int, frame) -> bool:
+        if ident == self._loop_thread:
+            return asyncio.current_task(self._loop) is self._task
+        context = _worker_context(frame)
+        return context is not None and context.get(_profiled) is self
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident or not self._owns(ident, frame):
+                    continue
+                stack = collapse_stack(frame)
+                if stack is not None:
+                    self.samples[stack] += 1
+
+    def category_times(self) -> dict[str, float]:
+        """Get the sampled time in seconds spent in each category."""
+        times: dict[str, float] = {}
+        for stack, count in self.samples.items():
+            category = stack.split(";", 1)[0]
+            times[category] = times.get(category, 0.0) + count * self.interval
+        return times
+
+    def server_timing(self) -> str:
+        """Format the category breakdown as a ``Server-Timing`` header."""
+        return ", ".join(
+            f"{category};dur={seconds * 1000:.1f}"
+            for category, seconds in sorted(self.category_times().items())
+        )
+
+    def write_collapsed(self, path: Path) -> None:
+        """Write samples in collapsed-stack format for flamegraph tools."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _profile_requested(scope) -> bool:
+    query = parse_qsl(scope["query_string"].decode("latin-1"))
+    if ("profile", "1") in query:
+        return True
+    for name, value in scope["headers"]:
+        if name == b"x-profile":
+            return value == b"1"
+    return False
+
+
+async def _is_superuser(scope) -> bool:
+    """Authorize a profiling request through the regular auth dependencies."""
+    from app.api.deps import get_current_superuser, get_current_user
+    from app.core.database import app_session
+
+    token = None
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer":
+                token = None
+            break
+    if not token:
+        return False
+
+    # Opening and releasing the session may touch the database (engine
+    # creation, the rollback on release): keep them off the event loop,
+    # like the routes do with their queries
+    sessions = app_session(scope["app"])
+    session = await run_in_threadpool(sessions.__enter__)
+    try:
+        get_current_superuser(await get_current_user(session, token))
+        return True
+    except HTTPException:
+        return False
+    finally:
+        await run_in_threadpool(sessions.__exit__, None, None, None)
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware profiling flagged or randomly sampled requests.
+
+    A request is profiled when a superuser sends ``X-Profile: 1`` or
+    ``?profile=1``, or with probability ``PROFILER_SAMPLE_RATE``. The
+    stacks are written to ``PROFILER_OUTPUT_DIR`` in collapsed format and,
+    for superusers only, the category breakdown is returned in the
+    ``Server-Timing`` header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if _profile_requested(scope):
+            profile = show_timing = await _is_superuser(scope)
+        else:
+            rate = settings.PROFILER_SAMPLE_RATE
+            profile = rate > 0 and random.random() < rate
+            # Sampled requests are usually anonymous: only the file
+            show_timing = profile and await _is_superuser(scope)
+        if not profile:
+            await self.app(scope, receive, send)
+            return
+
+        sampler = StackSampler(settings.PROFILER_INTERVAL_SECONDS)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                sampler.stop()
+                if show_timing:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", sampler.server_timing())
+            await send(message)
+
+        token = _profiled.set(sampler)
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            sampler.stop()
+            _profiled.reset(token)
+            await asyncio.to_thread(
+                sampler.write_collapsed, self._output_path(scope)
+            )
+
+    @staticmethod
+    def _output_path(scope) -> Path:
+        route = scope["path"].strip("/").replace("/", "_") or "root"
+        name = (
+            f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}-"
+            f"{scope['method']}-{route}"
+        )
+        return Path(settings.PROFILER_OUTPUT_DIR) / f"{name}.collapsed"
@@ -0,0 +1,482 @@
+"""Bulk user provisioning from CSV or NDJSON.
+
+``python -m app.core.provisioning users.csv`` and ``POST /api/users/bulk``
+create accounts in chunks of ``PROVISION_CHUNK_SIZE`` rows. For each chunk:
+
+1. rows are validated as ``UserCreate`` and checked against the rest of
+   the file for repeated emails and usernames;
+2. the emails and usernames already registered are found with one
+   set-based query;
+3. passwords are hashed across a process pool (``PROVISION_WORKERS``, by
+   default one process per available CPU), Argon2 being the dominant cost.
+   The pool is started on first use and kept for the life of the process,
+   so requests do not pay for spawning it; ``main.lifespan`` shuts it
+   down;
+4. the rows are written with ``COPY`` on PostgreSQL (psycopg2) or one
+   multi-row ``INSERT`` elsewhere, and committed.
+
+A bad row is rejected with its line number and reason instead of aborting
+the import, and progress is logged after every chunk.
+"""
+import argparse
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+from typing import Literal, TextIO
+
+import sqlalchemy as sa
+from pydantic import ValidationError
+from sqlmodel import Session, select
+
+from app.core.config import settings
+from app.core.cpus import available_cpus
+from app.core.database import get_engine
+from app.core.security import get_password_hash
+from app.models.user import User, UserCreate
+
+logger = logging.getLogger(__name__)
+
+Format = Literal["csv", "ndjson"]
+
+# Written by COPY, in this order
+COLUMNS = (
+    "email",
+    "username",
+    "full_name",
+    "is_active",
+    "is_superuser",
+    "hashed_password",
+    "created_at",
+    "updated_at",
+)
+
+
+@dataclass
+class RejectedRow:
+    """A row of the input that was not provisioned."""
+
+    line: int
+    reason: str
+    email: str | None = None
+    username: str | None = None
+
+
+@dataclass
+class ProvisioningReport:
+    """Outcome of a bulk provisioning run."""
+
+    created: int = 0
+    rejected: list[RejectedRow] = field(default_factory=list)
+
+
+def detect_format(filename: str | None) -> Format:
+    """
+    Guess the input format from a file name.
+
+    Args:
+        filename: Name of the uploaded or given file
+
+    Returns:
+        ``ndjson`` for ``.ndjson``/``.jsonl`` files, ``csv`` otherwise
+    """
+    if filename and Path(filename).suffix.lower() in (".ndjson", ".jsonl"):
+        return "ndjson"
+    return "csv"
+
+
+def read_rows(
+    stream: Iterable[str], fmt: Format
+) -> Iterator[tuple[int, dict | None]]:
+    """
+    Read the user records of a CSV or NDJSON stream.
+
+    CSV input needs a header with at least ``email``, ``username`` and
+    ``password`` (``full_name`` is optional); NDJSON holds one object with
+    the same keys per line.
+
+    Args:
+        stream: Text lines of the file
+        fmt: ``csv`` or ``ndjson``
+
+    Yields:
+        The line number of each record and its fields, or None if the
+        line could not be parsed
+    """
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # Empty cells are missing values, not empty strings
+            yield reader.line_num, {
+                key: value for key, value in row.items() if value
+            }
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            record = None
+        yield line_number, record if isinstance(record, dict) else None
+
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+def _hashing_pool(workers: int) -> ProcessPoolExecutor:
+    """The process-wide hashing pool, started by its first user."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: the caller may be a threaded server
+            # worker
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_hashing_pool() -> None:
+    """Stop the hashing pool, if it was started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+
+@contextmanager
+def password_hasher(workers: int | None = None) -> Iterator[
+    Callable[[list[str]], list[str]]
+]:
+    """
+    Provide a function hashing a list of passwords.
+
+    Args:
+        workers: Hashing processes (default: ``PROVISION_WORKERS``, else
+            one per available CPU); 1 hashes in the calling process. The
+            first caller sizes the shared pool.
+
+    Yields:
+        Function mapping passwords to their hashes, in order
+    """
+    workers = workers or settings.PROVISION_WORKERS or available_cpus()
+    if workers <= 1:
+        yield lambda passwords: [get_password_hash(p) for p in passwords]
+        return
+    pool = _hashing_pool(workers)
+
+    def hash_all(passwords: list[str]) -> list[str]:
+        global _pool
+        chunksize = max(1, len(passwords) // (workers * 4))
+        try:
+            return list(
+                pool.map(get_password_hash, passwords, chunksize=chunksize)
+            )
+        except BrokenProcessPool:
+            # A hashing process died: start a new pool on the next call
+            with _pool_lock:
+                if _pool is pool:
+                    _pool = None
+            raise
+
+    yield hash_all
+
+
+def _validate(
+    line: int, record: dict | None, report: ProvisioningReport
+) -> UserCreate | None:
+    if record is None:
+        report.rejected.append(RejectedRow(line, "Unreadable record"))
+        return None
+    try:
+        return UserCreate.model_validate(record)
+    except ValidationError as e:
+        reason = "; ".join(
+            f"{'.'.join(map(str, error['loc']))}: {error['msg']}"
+            for error in e.errors()
+        )
+        email, username = record.get("email"), record.get("username")
+        report.rejected.append(
+            RejectedRow(
+                line,
+                reason,
+                email=str(email) if email is not None else None,
+                username=str(username) if username is not None else None,
+            )
+        )
+        return None
+
+
+def _reject_registered(
+    session: Session,
+    users: list[tuple[int, UserCreate]],
+    report: ProvisioningReport,
+) -> list[tuple[int, UserCreate]]:
+    """Drop the users whose email or username is already taken."""
+    if not users:
+        return users
+    taken = session.exec(
+        select(User.email, User.username).where(
+            User.email.in_([user.email for _, user in users])
+            | User.username.in_([user.username for _, user in users])
+        )
+    ).all()
+    emails = {email for email, _ in taken}
+    usernames = {username for _, username in taken}
+    available = []
+    for line, user in users:
+        if user.email in emails:
+            reason = "Email already registered"
+        elif user.username in usernames:
+            reason = "Username already taken"
+        else:
+            available.append((line, user))
+            continue
+        report.rejected.append(
+            RejectedRow(line, reason, user.email, user.username)
+        )
+    return available
+
+
+def _copy(session: Session, records: list[dict]) -> None:
+    """Write the records with COPY through the psycopg2 connection."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # None is written as an empty unquoted field, which COPY reads as NULL
+    writer.writerows(
+        [record[column] for column in COLUMNS] for record in records
+    )
+    buffer.seek(0)
+    statement = (
+        f"COPY {User.__tablename__} ({', '.join(COLUMNS)}) "
+        f"FROM STDIN WITH (FORMAT csv)"
+    )
+    dbapi = session.get_bind().dialect.dbapi
+    cursor = session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except dbapi.IntegrityError as e:
+        # The raw cursor bypasses SQLAlchemy's exception wrapping
+        raise sa.exc.IntegrityError(statement, None, e) from e
+    finally:
+        cursor.close()
+
+
+def _insert(session: Session, records: list[dict]) -> None:
+    if session.get_bind().dialect.driver == "psycopg2":
+        _copy(session, records)
+    else:
+        session.execute(sa.insert(User).values(records))
+
+
+def _write(
+    session: Session,
+    users: list[tuple[int, UserCreate]],
+    hashes: list[str],
+    report: ProvisioningReport,
+) -> int:
+    """Insert and commit a chunk; returns the number of created users."""
+    now = datetime.utcnow()
+    records = [
+        {
+            "email": user.email,
+            "username": user.username,
+            "full_name": user.full_name,
+            "is_active": True,
+            "is_superuser": False,
+            "hashed_password": hashed,
+            "created_at": now,
+            "updated_at": now,
+        }
+        for (_, user), hashed in zip(users, hashes)
+    ]
+    try:
+        _insert(session, records)
+        session.commit()
+        return len(records)
+    except sa.exc.IntegrityError:
+        # Someone registered one of these accounts since the check
+        session.rollback()
+    available = {
+        line for line, _ in _reject_registered(session, users, report)
+    }
+    remaining = [
+        (user, record)
+        for user, record in zip(users, records)
+        if user[0] in available
+    ]
+    if not remaining:
+        return 0
+    try:
+        _insert(session, [record for _, record in remaining])
+        session.commit()
+        return len(remaining)
+    except sa.exc.IntegrityError:
+        # Lost the race again: find the conflicting rows one by one
+        session.rollback()
+    created = 0
+    for (line, user), record in remaining:
+        try:
+            with session.begin_nested():
+                _insert(session, [record])
+        except sa.exc.IntegrityError:
+            report.rejected.append(
+                RejectedRow(
+                    line,
+                    "Email or username already registered",
+                    user.email,
+                    user.username,
+                )
+            )
+        else:
+            created += 1
+    session.commit()
+    return created
+
+
+def _chunks(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def provision_users(
+    session: Session,
+    rows: Iterable[tuple[int, dict | None]],
+    *,
+    chunk_size: int | None = None,
+    workers: int | None = None,
+) -> ProvisioningReport:
+    """
+    Create the users of an input file, skipping the rows that fail.
+
+    Args:
+        session: Database session; every chunk is committed on its own
+        rows: Line numbers and records, as yielded by ``read_rows``
+        chunk_size: Rows per chunk (default: ``PROVISION_CHUNK_SIZE``)
+        workers: Hashing processes (see ``password_hasher``)
+
+    Returns:
+        Number of created users and the rejected rows
+    """
+    chunk_size = chunk_size or settings.PROVISION_CHUNK_SIZE
+    report = ProvisioningReport()
+    seen_emails: set[str] = set()
+    seen_usernames: set[str] = set()
+    read = 0
+    start = time.perf_counter()
+    with password_hasher(workers) as hash_all:
+        for chunk in _chunks(rows, chunk_size):
+            read += len(chunk)
+            users = []
+            for line, record in chunk:
+                user = _validate(line, record, report)
+                if user is None:
+                    continue
+                if user.email in seen_emails:
+                    reason = "Email repeated in the file"
+                elif user.username in seen_usernames:
+                    reason = "Username repeated in the file"
+                else:
+                    seen_emails.add(user.email)
+                    seen_usernames.add(user.username)
+                    users.append((line, user))
+                    continue
+                report.rejected.append(
+                    RejectedRow(line, reason, user.email, user.username)
+                )
+
+            users = _reject_registered(session, users, report)
+            hashes = hash_all([user.password for _, user in users])
+            report.created += _write(session, users, hashes, report)
+            elapsed = time.perf_counter() - start
+            logger.info(
+                "Provisioning: %d rows read, %d created, %d rejected "
+                "(%.0f rows/s)",
+                read,
+                report.created,
+                len(report.rejected),
+                read / elapsed if elapsed else 0,
+            )
+    report.rejected.sort(key=lambda row: row.line)
+    return report
+
+
+def write_rejected(rejected: list[RejectedRow], stream: TextIO) -> None:
+    """
+    Write the rejected rows as CSV.
+
+    Args:
+        rejected: Rejected rows of a report
+        stream: Text stream to write to
+    """
+    writer = csv.writer(stream)
+    writer.writerow(["line", "email", "username", "reason"])
+    writer.writerows(
+        [row.line, row.email or "", row.username or "", row.reason]
+        for row in rejected
+    )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Create users in bulk from a CSV or NDJSON file"
+    )
+    parser.add_argument(
+        "file", help="CSV (email,username,password[,full_name]) or NDJSON"
+    )
+    parser.add_argument(
+        "--format",
+        choices=("csv", "ndjson"),
+        help="Input format (default: from the file extension)",
+    )
+    parser.add_argument(
+        "--rejected",
+        type=Path,
+        help="Write the rejected rows to this CSV file",
+    )
+    parser.add_argument("--chunk-size", type=int)
+    parser.add_argument("--workers", type=int)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    fmt = args.format or detect_format(args.file)
+    try:
+        with open(args.file, encoding="utf-8", newline="") as stream:
+            with Session(get_engine()) as session:
+                report = provision_users(
+                    session,
+                    read_rows(stream, fmt),
+                    chunk_size=args.chunk_size,
+                    workers=args.workers,
+                )
+    finally:
+        shutdown_hashing_pool()
+
+    print(f"{report.created} users created, {len(report.rejected)} rejected")
+    if args.rejected:
+        with args.rejected.open("w", encoding="utf-8", newline="") as out:
+            write_rejected(report.rejected, out)
+    elif report.rejected:
+        write_rejected(report.rejected, sys.stderr)
+    return 1 if report.rejected else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
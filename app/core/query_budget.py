@@ -0,0 +1,181 @@
+"""Per-request SQL query budgets and N+1 detection."""
+import logging
+from collections import Counter
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in ``raise`` mode when a request breaks its query budget."""
+
+
+@dataclass(slots=True)
+class QueryReport:
+    """Summary of the SQL statements executed while serving a request."""
+
+    method: str
+    route: str
+    count: int
+    budget: int
+    repeated: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.count > self.budget
+
+
+@dataclass(slots=True)
+class QueryTracker:
+    """Statement counters for the request currently being served."""
+
+    scope: dict
+    budget: int | None = None
+    count: int = 0
+    statements: Counter = field(default_factory=Counter)
+    repeated: dict[str, int] = field(default_factory=dict)
+
+    def record(self, statement: str) -> None:
+        if self.budget is None:
+            # Routing has happened by the time the first statement runs.
+            self.budget = route_budget(self.scope.get("route"))
+        self.count += 1
+        seen = self.statements[statement] + 1
+        self.statements[statement] = seen
+
+        if seen >= settings.QUERY_REPEAT_THRESHOLD:
+            first_time = statement not in self.repeated
+            self.repeated[statement] = seen
+            if first_time:
+                self._violation(
+                    f"Possible N+1: statement executed {seen} times in "
+                    f"{self.route}: {statement}"
+                )
+        if self.count == self.budget + 1:
+            self._violation(
+                f"Query budget exceeded in {self.route}: more than "
+                f"{self.budget} statements"
+            )
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route")
+        return getattr(route, "path", self.scope["path"])
+
+    def _violation(self, message: str) -> None:
+        if settings.QUERY_BUDGET_MODE == "raise":
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+_tracker: ContextVar[QueryTracker | None] = ContextVar(
+    "query_tracker", default=None
+)
+_listeners: list[Callable[[QueryReport], None]] = []
+
+
+def query_budget(max_queries: int) -> Callable:
+    """
+    Declare the maximum number of SQL statements an endpoint may run.
+
+    Apply it below the router decorator::
+
+        @router.get("/")
+        @query_budget(2)
+        def read_things(...): ...
+
+    Args:
+        max_queries: Statement budget, including authentication queries
+
+    Returns:
+        Decorator that tags the endpoint with its budget
+    """
+    def decorator(endpoint: Callable) -> Callable:
+        endpoint.__query_budget__ = max_queries
+        return endpoint
+
+    return decorator
+
+
+def route_budget(route: Any) -> int:
+    """
+    Get the statement budget configured for a route.
+
+    Args:
+        route: Matched route, or None if routing failed
+
+    Returns:
+        The endpoint budget, or ``QUERY_BUDGET_DEFAULT`` if none is set
+    """
+    endpoint = getattr(route, "endpoint", None)
+    return getattr(
+        endpoint, "__query_budget__", settings.QUERY_BUDGET_DEFAULT
+    )
+
+
+def add_report_listener(listener: Callable[[QueryReport], None]) -> None:
+    """Register a callback that receives a report after every request."""
+    _listeners.append(listener)
+
+
+def remove_report_listener(listener: Callable[[QueryReport], None]) -> None:
+    """Unregister a callback added with ``add_report_listener``."""
+    _listeners.remove(listener)
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    tracker = _tracker.get()
+    if tracker is not None:
+        tracker.record(statement)
+
+
+def install_query_budget(engine: Engine) -> None:
+    """
+    Attach statement tracking to a SQLAlchemy engine.
+
+    Args:
+        engine: Engine whose statements count against request budgets
+    """
+    if not event.contains(
+        engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+class QueryBudgetMiddleware:
+    """ASGI middleware that tracks SQL statements for each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tracker = QueryTracker(scope=scope)
+        token = _tracker.set(tracker)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _tracker.reset(token)
+            if tracker.count and _listeners:
+                report = QueryReport(
+                    method=scope["method"],
+                    route=tracker.route,
+                    count=tracker.count,
+                    budget=tracker.budget,
+                    repeated=dict(tracker.repeated),
+                )
+                for listener in _listeners:
+                    listener(report)
@@ -1,10 +1,395 @@
 """Redis client configuration and management."""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable, Iterable
+
 import redis.asyncio as redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, ResponseError, TimeoutError
 
 from app.core.config import settings
+from app.core.metrics import REDIS_CACHE_LOOKUPS, record_redis_command
+from app.core.tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+# Keys read on every authenticated request but written rarely; these are
+# served from the client-side cache.
+CACHED_PREFIXES = ("token_epoch:", "user_blocked:", "user_status:")
+
+_MISSING = object()
+
+
+class InstrumentedRedis(redis.Redis):
+    """Redis client that records command count and time per request."""
+
+    async def execute_command(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            with start_span(f"redis {args[0]}", kind="CLIENT"):
+                return await super().execute_command(*args, **options)
+        finally:
+            record_redis_command(time.perf_counter() - start)
+
+
+class RedisBatcher:
+    """
+    Coalesce commands issued by concurrent requests into one pipeline.
+
+    Commands queued during the same event loop iteration (or within
+    ``window`` seconds, if set) are sent as a single non-transactional
+    pipeline, turning N round trips into one under load. A lone command
+    is sent directly, so an idle server pays no pipeline overhead.
+    """
+
+    def __init__(
+        self, client: redis.Redis, window: float = 0.0, max_size: int = 128
+    ):
+        self.client = client
+        self.window = window
+        self.max_size = max_size
+        self._pending: list[tuple[tuple, asyncio.Future]] = []
+        self._scheduled: asyncio.Handle | None = None
+        self._flushes: set[asyncio.Task] = set()
+
+    async def execute(self, *args):
+        """
+        Queue a command and wait for its reply.
+
+        Args:
+            *args: Command name and arguments, e.g. ``("GET", key)``
+
+        Returns:
+            The parsed reply of the command
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((args, future))
+        if len(self._pending) >= self.max_size:
+            self._flush_now()
+        elif self._scheduled is None:
+            if self.window > 0:
+                self._scheduled = loop.call_later(self.window, self._flush_now)
+            else:
+                self._scheduled = loop.call_soon(self._flush_now)
+
+        start = time.perf_counter()
+        try:
+            with start_span(
+                f"redis {args[0]}",
+                kind="CLIENT",
+                attributes={"db.redis.batched": True},
+            ):
+                return await future
+        finally:
+            record_redis_command(time.perf_counter() - start)
+
+    def _flush_now(self) -> None:
+        if self._scheduled is not None:
+            self._scheduled.cancel()
+            self._scheduled = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # Run outside the caller's context so that the pipeline is not
+            # attributed to whichever request happened to fill the batch.
+            task = asyncio.get_running_loop().create_task(
+                self._flush(batch), context=contextvars.Context()
+            )
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[tuple, asyncio.Future]]) -> None:
+        try:
+            if len(batch) == 1:
+                args, _ = batch[0]
+                results = [await self.client.execute_command(*args)]
+            else:
+                pipe = self.client.pipeline(transaction=False)
+                for args, _ in batch:
+                    pipe.execute_command(*args)
+                results = await pipe.execute(raise_on_error=False)
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def aclose(self) -> None:
+        """Send any queued commands and wait for in-flight pipelines."""
+        self._flush_now()
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+
+class LocalCache:
+    """Bounded LRU map of Redis keys to values; ``None`` marks absent keys."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: OrderedDict[str, str | None] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def get(self, key: str):
+        value = self._data.get(key, _MISSING)
+        if value is not _MISSING:
+            self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str | None) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, keys: Iterable[str]) -> None:
+        for key in keys:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+class ClientSideCache:
+    """
+    Server-assisted client-side cache (RESP3 ``CLIENT TRACKING``).
+
+    A dedicated RESP3 connection enables tracking in broadcast mode for
+    ``prefixes``, so Redis pushes an invalidation for every write to a
+    matching key, whichever client made it, and the local copy is dropped.
+    While the tracking connection is down invalidations could be missed,
+    so lookups bypass the cache until it has reconnected.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        prefixes: tuple[str, ...] = CACHED_PREFIXES,
+        max_size: int = 10_000,
+    ):
+        self.client = client
+        self.prefixes = prefixes
+        self.local = LocalCache(max_size)
+        self.connected = False
+        # Bumped on every invalidation, so that a read racing with one is
+        # not stored.
+        self._generation = 0
+        self._connection = None
+        self._task: asyncio.Task | None = None
+
+    def handles(self, key: str) -> bool:
+        """Whether lookups of ``key`` are currently served by the cache."""
+        return self.connected and key.startswith(self.prefixes)
+
+    async def get(
+        self, key: str, fetch: Callable[[], Awaitable[str | None]]
+    ) -> str | None:
+        """
+        Get a key from the local cache, loading it with ``fetch`` on a miss.
+
+        Args:
+            key: Redis key
+            fetch: Coroutine function reading the key from Redis
+
+        Returns:
+            The value of the key, or None if it does not exist
+        """
+        value = self.local.get(key)
+        if value is not _MISSING:
+            REDIS_CACHE_LOOKUPS.labels("hit").inc()
+            return value
+        REDIS_CACHE_LOOKUPS.labels("miss").inc()
+        generation = self._generation
+        value = await fetch()
+        if self.connected and generation == self._generation:
+            self.local.set(key, value)
+        return value
+
+    def invalidate(self, *keys: str) -> None:
+        """Drop keys from the local cache (e.g. right after writing them)."""
+        self._generation += 1
+        self.local.invalidate(keys)
+
+    async def _on_invalidate(self, response: list) -> list:
+        keys = response[1]
+        if keys is None:
+            # FLUSHDB / FLUSHALL
+            self._generation += 1
+            self.local.clear()
+        else:
+            self.invalidate(*keys)
+        return response
+
+    async def _connect(self) -> None:
+        pool = self.client.connection_pool
+        connection = pool.connection_class(
+            **{
+                **pool.connection_kwargs,
+                "protocol": 3,
+                "health_check_interval": 0,
+            }
+        )
+        await connection.connect()
+        connection._parser.set_invalidation_push_handler(self._on_invalidate)
+        args = ["CLIENT", "TRACKING", "ON", "BCAST"]
+        for prefix in self.prefixes:
+            args += ["PREFIX", prefix]
+        await connection.send_command(*args)
+        reply = await connection.read_response()
+        if isinstance(reply, Exception):
+            await connection.disconnect()
+            raise reply
+        self._connection = connection
+        self.local.clear()
+        self.connected = True
+
+    async def _reset(self) -> None:
+        self.connected = False
+        self._generation += 1
+        self.local.clear()
+        if self._connection is not None:
+            try:
+                await self._connection.disconnect()
+            except Exception:
+                pass
+            self._connection = None
+
+    async def _read_invalidations(self) -> None:
+        interval = settings.REDIS_HEALTH_CHECK_INTERVAL or 30
+        awaiting_pong = False
+        while True:
+            reply = await self._connection.read_response(
+                push_request=True, timeout=interval
+            )
+            if reply is not None:
+                awaiting_pong = False
+            elif awaiting_pong:
+                raise ConnectionError("Redis tracking connection timed out")
+            else:
+                await self._connection.send_command("PING")
+                awaiting_pong = True
+
+    async def _listen(self) -> None:
+        delay = settings.REDIS_RETRY_BACKOFF_BASE
+        while True:
+            try:
+                if self._connection is None:
+                    await self._connect()
+                    delay = settings.REDIS_RETRY_BACKOFF_BASE
+                await self._read_invalidations()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                if self.connected:
+                    logger.warning(
+                        "Redis client-side cache disabled until the "
+                        "tracking connection recovers: %s",
+                        exc,
+                    )
+                await self._reset()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.REDIS_RETRY_BACKOFF_CAP)
+
+    async def start(self) -> None:
+        """Open the tracking connection and start listening for pushes."""
+        try:
+            await self._connect()
+        except ResponseError as exc:
+            logger.warning(
+                "Redis client-side cache unavailable (needs Redis 6+): %s",
+                exc,
+            )
+            return
+        except (ConnectionError, TimeoutError, OSError) as exc:
+            logger.warning("Redis client-side cache not connected: %s", exc)
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """Stop listening and close the tracking connection."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._reset()
+
 
 # Global Redis client instance (Singleton pattern)
 redis_client: redis.Redis | None = None
+redis_batcher: RedisBatcher | None = None
+client_cache: ClientSideCache | None = None
+_init_lock = threading.Lock()
+
+
+def create_redis_client() -> InstrumentedRedis:
+    """
+    Build a Redis client backed by an explicitly sized blocking pool.
+
+    When all connections are busy, callers wait up to
+    ``REDIS_POOL_TIMEOUT`` seconds for one instead of opening new
+    connections without bound.
+
+    Returns:
+        Redis client configured with application settings.
+    """
+    pool = redis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        retry=Retry(
+            ExponentialBackoff(
+                cap=settings.REDIS_RETRY_BACKOFF_CAP,
+                base=settings.REDIS_RETRY_BACKOFF_BASE,
+            ),
+            settings.REDIS_RETRY_ATTEMPTS,
+        ),
+        retry_on_error=[ConnectionError, TimeoutError],
+        encoding="utf-8",
+        decode_responses=True,
+    )
+    return InstrumentedRedis(connection_pool=pool)
+
+
+async def init_redis_client() -> redis.Redis:
+    """
+    Create the Redis client and client-side cache eagerly.
+
+    Called from the application lifespan so that the pool is bound to the
+    server's event loop before the first request arrives.
+
+    Returns:
+        Redis client instance
+    """
+    global client_cache
+    client = await get_redis_client()
+    if settings.REDIS_CLIENT_CACHE_ENABLED and client_cache is None:
+        client_cache = ClientSideCache(
+            client, max_size=settings.REDIS_CLIENT_CACHE_MAX_SIZE
+        )
+        await client_cache.start()
+    return client
 
 
 async def get_redis_client() -> redis.Redis:
@@ -16,21 +401,86 @@ async def get_redis_client() -> redis.Redis:
     """
     global redis_client
     if redis_client is None:
-        redis_client = redis.from_url(
-            settings.REDIS_URL,
-            encoding="utf-8",
-            decode_responses=True,
-        )
+        with _init_lock:
+            if redis_client is None:
+                redis_client = create_redis_client()
     return redis_client
 
 
+async def get_redis_batcher() -> RedisBatcher:
+    """
+    Get the command batcher wrapping the current Redis client.
+
+    Returns:
+        Shared batcher; it sends each command on its own when
+        ``REDIS_BATCHING_ENABLED`` is off.
+    """
+    global redis_batcher
+    client = await get_redis_client()
+    if redis_batcher is None or redis_batcher.client is not client:
+        redis_batcher = RedisBatcher(
+            client,
+            window=settings.REDIS_BATCH_WINDOW_SECONDS,
+            max_size=(
+                settings.REDIS_BATCH_MAX_SIZE
+                if settings.REDIS_BATCHING_ENABLED
+                else 1
+            ),
+        )
+    return redis_batcher
+
+
+async def get_cached(key: str) -> str | None:
+    """
+    GET a key, serving it from the client-side cache when possible.
+
+    Keys outside ``CACHED_PREFIXES``, or any key while the cache is not
+    connected, are read through the command batcher.
+
+    Args:
+        key: Redis key
+
+    Returns:
+        The value of the key, or None if it does not exist
+    """
+    batcher = await get_redis_batcher()
+    cache = client_cache
+    if (
+        cache is None
+        or cache.client is not batcher.client
+        or not cache.handles(key)
+    ):
+        return await batcher.execute("GET", key)
+    return await cache.get(key, lambda: batcher.execute("GET", key))
+
+
+def invalidate_cached(*keys: str) -> None:
+    """
+    Drop keys from this process's client-side cache.
+
+    Redis also pushes an invalidation for the write, but doing it
+    immediately guarantees the writer reads its own update.
+
+    Args:
+        *keys: Redis keys that were just written
+    """
+    if client_cache is not None:
+        client_cache.invalidate(*keys)
+
+
 async def close_redis_client() -> None:
     """
     Close the Redis client connection.
 
     Should be called during application shutdown.
     """
-    global redis_client
+    global redis_client, redis_batcher, client_cache
+    if client_cache is not None:
+        await client_cache.stop()
+        client_cache = None
+    if redis_batcher is not None:
+        await redis_batcher.aclose()
+        redis_batcher = None
     if redis_client:
-        await redis_client.close()
+        await redis_client.aclose(close_connection_pool=True)
         redis_client = None
@@ -1,21 +1,38 @@
+from collections.abc import Iterable
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from typing import Any
+import json
 import uuid
 
-import jwt
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import bindparam, update
+from sqlalchemy.engine import Engine
+from sqlmodel import Session
 
+from app.core.circuit_breaker import fallback_store, guarded
 from app.core.config import settings
+from app.core.jobs import enqueue, job_handler
+from app.core.keys import decode_jwt, encode_jwt
+from app.core.redis import get_cached, get_redis_client, invalidate_cached
+from app.core.tracing import traced
+from app.models.user import User
 
-# Password hasher using Argon2id (modern and secure)
-ph = PasswordHasher()
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    """Get the Argon2id password hasher (modern and secure)."""
+    return PasswordHasher()
 
 
 def create_access_token(
     subject: str | Any,
     expires_delta: timedelta | None = None,
     jti: str | None = None,
+    epoch: int = 0,
+    family: str | None = None,
 ) -> str:
     """
     Create a JWT access token.
@@ -23,7 +40,9 @@ def create_access_token(
     Args:
         subject: The subject of the token (usually user id or email)
         expires_delta: Optional custom expiration time
-        jti: Optional JWT ID for token tracking (required for blacklist)
+        jti: Optional JWT ID for token tracking
+        epoch: Token epoch of the user (see ``get_token_epoch``)
+        family: Refresh family of the session, revoked on logout
 
     Returns:
         Encoded JWT token string
@@ -35,26 +54,33 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
-    to_encode = {"exp": expire, "sub": str(subject)}
+    to_encode = {"exp": expire, "sub": str(subject), "epoch": epoch}
     
-    # Add JTI (JWT ID) for token blacklisting support
+    # Add JTI (JWT ID) for token tracking
     if jti:
         to_encode["jti"] = jti
     else:
         to_encode["jti"] = str(uuid.uuid4())
+    if family:
+        to_encode["fam"] = family
     
-    encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
-    )
-    return encoded_jwt
+    return encode_jwt(to_encode)
 
 
-def create_refresh_token(subject: str | Any) -> str:
+def create_refresh_token(
+    subject: str | Any,
+    epoch: int = 0,
+    jti: str | None = None,
+    family: str | None = None,
+) -> str:
     """
     Create a JWT refresh token with longer expiration.
 
     Args:
         subject: The subject of the token (usually user id or email)
+        epoch: Token epoch of the user (see ``get_token_epoch``)
+        jti: JWT ID, the current token of its rotation family
+        family: Rotation family ID (see ``start_refresh_family``)
 
     Returns:
         Encoded JWT refresh token string
@@ -62,13 +88,35 @@ def create_refresh_token(subject: str | Any) -> str:
     expire = datetime.now(timezone.utc) + timedelta(
         days=settings.REFRESH_TOKEN_EXPIRE_DAYS
     )
-    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh"}
-    encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
-    )
-    return encoded_jwt
+    to_encode = {
+        "exp": expire,
+        "sub": str(subject),
+        "type": "refresh",
+        "epoch": epoch,
+        "jti": jti or str(uuid.uuid4()),
+    }
+    if family:
+        to_encode["fam"] = family
+    return encode_jwt(to_encode)
+
+
+def decode_token(token: str) -> dict[str, Any]:
+    """
+    Verify a JWT and return its claims.
+
+    Args:
+        token: Encoded JWT
+
+    Returns:
+        Decoded claims
+
+    Raises:
+        jwt.InvalidTokenError: If the token is invalid or expired
+    """
+    return decode_jwt(token)
 
 
+@traced("security.verify_password")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a plain password against a hashed password using Argon2.
@@ -81,7 +129,7 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
         True if passwords match, False otherwise
     """
     try:
-        ph.verify(hashed_password, plain_password)
+        get_password_hasher().verify(hashed_password, plain_password)
         return True
     except VerifyMismatchError:
         return False
@@ -98,41 +146,265 @@ def get_password_hash(password: str) -> str:
     Returns:
         Hashed password string using Argon2id algorithm
     """
-    return ph.hash(password)
+    return get_password_hasher().hash(password)
 
 
 # Redis Helper Functions for Security
+#
+# Every Redis call goes through ``guarded`` (deadline + circuit breaker).
+# When Redis fails, fail-open operations use ``fallback_store`` instead;
+# reads also consult it so that revocations and blocks recorded during an
+# outage keep applying after Redis recovers.
 
 
-async def add_token_to_blacklist(jti: str, expires_in: int) -> None:
+@traced("security.get_token_epoch")
+async def get_token_epoch(user_id: int) -> int:
     """
-    Add a token JTI to the blacklist in Redis.
+    Get the current token epoch of a user.
+
+    Tokens carry the epoch they were issued in; a token whose epoch is
+    lower than the user's current one has been revoked. This replaces a
+    per-token blacklist with one integer per user, and is served from the
+    Redis client-side cache on the hot path.
 
     Args:
-        jti: JWT ID (unique identifier for the token)
-        expires_in: Seconds until token naturally expires (used as TTL)
+        user_id: User ID
+
+    Returns:
+        Current epoch (0 if never bumped)
     """
-    from app.core.redis import get_redis_client
-    
-    redis = await get_redis_client()
-    await redis.setex(f"blacklist:{jti}", expires_in, "revoked")
+    key = f"token_epoch:{user_id}"
+    local = fallback_store.get(key)
+    result = await guarded("epoch", lambda: get_cached(key), lambda: None)
+    return max(int(result or 0), int(local or 0))
 
 
-async def is_token_blacklisted(jti: str) -> bool:
+@traced("security.get_token_epochs")
+async def get_token_epochs(user_ids: Iterable[int]) -> dict[int, int]:
     """
-    Check if a token JTI is in the blacklist.
+    Get the current token epochs of several users with a single MGET.
 
     Args:
-        jti: JWT ID to check
+        user_ids: User IDs
 
     Returns:
-        True if token is blacklisted, False otherwise
+        Dictionary mapping each user ID to its epoch
     """
-    from app.core.redis import get_redis_client
-    
-    redis = await get_redis_client()
-    result = await redis.get(f"blacklist:{jti}")
-    return result is not None
+    ids = list(dict.fromkeys(user_ids))
+    keys = [f"token_epoch:{user_id}" for user_id in ids]
+    if not keys:
+        return {}
+
+    async def mget() -> list[str | None]:
+        redis = await get_redis_client()
+        return await redis.mget(keys)
+
+    values = await guarded("epoch", mget, lambda: [None] * len(keys))
+    return {
+        user_id: max(int(value or 0), int(fallback_store.get(key) or 0))
+        for user_id, key, value in zip(ids, keys, values)
+    }
+
+
+async def bump_token_epoch(user_id: int, known_epoch: int = 0) -> int:
+    """
+    Revoke every access and refresh token of a user.
+
+    Args:
+        user_id: User ID
+        known_epoch: Epoch the caller knows to be current, used to keep the
+            local fallback ahead of it while Redis is unavailable
+
+    Returns:
+        The new epoch
+    """
+    key = f"token_epoch:{user_id}"
+
+    async def incr() -> int:
+        redis = await get_redis_client()
+        return await redis.incr(key)
+
+    def incr_locally() -> int:
+        epoch = max(known_epoch, int(fallback_store.get(key) or 0)) + 1
+        fallback_store.set(
+            key, epoch, settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+        )
+        return epoch
+
+    epoch = await guarded("revoke", incr, incr_locally)
+    invalidate_cached(key)
+    return epoch
+
+
+@traced("security.get_user_status")
+async def get_user_status(user_id: int) -> bool | None:
+    """
+    Get the cached ``is_active`` of a user.
+
+    Served from the Redis client-side cache; a status recorded locally
+    while Redis was down takes precedence.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Whether the user is active, or None if it is not cached
+    """
+    key = f"user_status:{user_id}"
+    value = fallback_store.get(key)
+    if value is None:
+        value = await guarded(
+            "user_status", lambda: get_cached(key), lambda: None
+        )
+    return None if value is None else value == "1"
+
+
+async def set_user_status(user_id: int, active: bool) -> None:
+    """
+    Cache the ``is_active`` of a user; call it whenever it changes.
+
+    Deleted users are cached as inactive.
+
+    Args:
+        user_id: User ID
+        active: Whether the user is active
+    """
+    key = f"user_status:{user_id}"
+    value = "1" if active else "0"
+
+    async def write() -> None:
+        redis = await get_redis_client()
+        await redis.set(key, value, ex=settings.USER_STATUS_TTL_SECONDS)
+
+    def write_locally() -> None:
+        fallback_store.set(key, value, settings.USER_STATUS_TTL_SECONDS)
+
+    fallback_store.delete(key)
+    await guarded("user_status", write, write_locally)
+    invalidate_cached(key)
+
+
+# Refresh-token rotation
+#
+# Each login starts a family ``refresh_family:<id>`` holding the JTI of the
+# only refresh token of that family that may still be used. A refresh
+# atomically checks the user's token epoch and the family, and moves the
+# family to the new token. Presenting an older token means it was stolen
+# or replayed, so the whole family is revoked.
+
+REFRESH_ROTATE_SCRIPT = """
+local epoch = tonumber(redis.call('GET', KEYS[2]) or '0')
+if epoch > tonumber(ARGV[4]) then
+    return {'revoked', epoch}
+end
+local current = redis.call('HGET', KEYS[1], 'current')
+if not current then
+    return {'unknown', epoch}
+end
+if current ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return {'reused', epoch}
+end
+redis.call('HSET', KEYS[1], 'current', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return {'ok', epoch}
+"""
+
+_rotate_script = None
+
+
+async def start_refresh_family(user_id: int) -> tuple[str, str]:
+    """
+    Start a refresh-token rotation family for a new login session.
+
+    Args:
+        user_id: User ID
+
+    Returns:
+        Tuple of (family_id, jti of the first refresh token)
+    """
+    family = uuid.uuid4().hex
+    jti = uuid.uuid4().hex
+    key = f"refresh_family:{family}"
+
+    async def write() -> None:
+        redis = await get_redis_client()
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={"current": jti, "user": user_id})
+            pipe.expire(key, settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600)
+            await pipe.execute()
+
+    await guarded("refresh_issue", write, lambda: None)
+    return family, jti
+
+
+async def rotate_refresh_token(
+    user_id: int, family: str, jti: str, new_jti: str, epoch: int
+) -> tuple[str, int]:
+    """
+    Rotate a refresh token in a single atomic script call.
+
+    Args:
+        user_id: User ID (subject of the token)
+        family: Family ID from the token's ``fam`` claim
+        jti: JTI of the presented refresh token
+        new_jti: JTI of the refresh token that replaces it
+        epoch: Epoch claim of the presented token
+
+    Returns:
+        Tuple of (status, current epoch). Status is ``ok``, ``revoked``
+        (older epoch), ``unknown`` (expired or revoked family) or
+        ``reused`` (replayed token; the family has just been revoked).
+    """
+    async def rotate() -> tuple[str, int]:
+        global _rotate_script
+        redis = await get_redis_client()
+        script = _rotate_script
+        if script is None or script.registered_client is not redis:
+            script = _rotate_script = redis.register_script(
+                REFRESH_ROTATE_SCRIPT
+            )
+        status, current_epoch = await script(
+            keys=[f"refresh_family:{family}", f"token_epoch:{user_id}"],
+            args=[
+                jti,
+                new_jti,
+                settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600,
+                epoch,
+            ],
+        )
+        return status, int(current_epoch)
+
+    if fallback_store.get(f"refresh_family_revoked:{family}"):
+        return "unknown", epoch
+    return await guarded("refresh_rotate", rotate, lambda: ("unknown", epoch))
+
+
+async def revoke_refresh_family(family: str) -> None:
+    """
+    Revoke a refresh family, ending that login session only.
+
+    Access tokens of the session stay valid until they expire
+    (``ACCESS_TOKEN_EXPIRE_MINUTES``); revoking them as well would need
+    a Redis read per request, which is what the epoch avoids.
+
+    Args:
+        family: Family ID from the token's ``fam`` claim
+    """
+    key = f"refresh_family:{family}"
+
+    async def delete() -> None:
+        redis = await get_redis_client()
+        await redis.delete(key)
+
+    def revoke_locally() -> None:
+        fallback_store.set(
+            f"refresh_family_revoked:{family}",
+            1,
+            settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600,
+        )
+
+    await guarded("revoke", delete, revoke_locally)
 
 
 async def increment_login_attempts(identifier: str) -> int:
@@ -145,17 +417,22 @@ async def increment_login_attempts(identifier: str) -> int:
     Returns:
         Current number of attempts
     """
-    from app.core.redis import get_redis_client
-    
-    redis = await get_redis_client()
     key = f"login_attempts:{identifier}"
-    
-    # Increment and set expiry if first attempt
-    attempts = await redis.incr(key)
-    if attempts == 1:
-        await redis.expire(key, settings.BLOCK_DURATION_MINUTES * 60)
-    
-    return attempts
+    ttl = settings.BLOCK_DURATION_MINUTES * 60
+
+    async def incr() -> int:
+        redis = await get_redis_client()
+        # Create the counter with its expiry and increment it in one round
+        # trip
+        async with redis.pipeline(transaction=False) as pipe:
+            pipe.set(key, 0, ex=ttl, nx=True)
+            pipe.incr(key)
+            _, attempts = await pipe.execute()
+        return attempts
+
+    return await guarded(
+        "login_attempts", incr, lambda: fallback_store.incr(key, ttl)
+    )
 
 
 async def reset_login_attempts(identifier: str) -> None:
@@ -165,10 +442,58 @@ async def reset_login_attempts(identifier: str) -> None:
     Args:
         identifier: User email or username
     """
-    from app.core.redis import get_redis_client
-    
-    redis = await get_redis_client()
-    await redis.delete(f"login_attempts:{identifier}")
+    key = f"login_attempts:{identifier}"
+    fallback_store.delete(key)
+
+    async def delete() -> None:
+        redis = await get_redis_client()
+        await redis.delete(key)
+
+    await guarded("login_attempts", delete, lambda: None)
+
+
+async def record_successful_login(identifier: str, user_id: int) -> None:
+    """
+    Reset the attempts counter and record the login.
+
+    The counter is deleted right away, so a failed attempt just after
+    the login starts from zero; only the ``last_login_at`` write goes
+    through the write-behind queue (``app.core.jobs``).
+
+    Args:
+        identifier: User email or username used to log in
+        user_id: ID of the user who logged in
+    """
+    await reset_login_attempts(identifier)
+    await enqueue(
+        "last_login",
+        {"user_id": user_id, "at": datetime.utcnow().isoformat()},
+    )
+
+
+@job_handler("last_login")
+async def _record_last_logins(payloads: list[dict], engine: Engine) -> None:
+    """Store the latest login of each user of a batch in one UPDATE."""
+    latest: dict[int, str] = {}
+    for payload in payloads:
+        user_id = payload["user_id"]
+        latest[user_id] = max(latest.get(user_id, ""), payload["at"])
+    statement = (
+        update(User)
+        .where(User.id == bindparam("user_id"))
+        .values(last_login_at=bindparam("at"))
+    )
+    rows = [
+        {"user_id": user_id, "at": datetime.fromisoformat(at)}
+        for user_id, at in latest.items()
+    ]
+
+    def write() -> None:
+        with Session(engine) as session:
+            session.connection().execute(statement, rows)
+            session.commit()
+
+    await run_in_threadpool(write)
 
 
 async def block_user(
@@ -181,22 +506,25 @@ async def block_user(
         identifier: User email or username
         reason: Reason for blocking
     """
-    from app.core.redis import get_redis_client
-    import json
-    
-    redis = await get_redis_client()
-    block_data = {
-        "identifier": identifier,
-        "reason": reason,
-        "blocked_at": datetime.now(timezone.utc).isoformat(),
-    }
-    
-    await redis.setex(
-        f"user_blocked:{identifier}",
-        settings.BLOCK_DURATION_MINUTES * 60,
-        json.dumps(block_data)
+    key = f"user_blocked:{identifier}"
+    ttl = settings.BLOCK_DURATION_MINUTES * 60
+    block_data = json.dumps(
+        {
+            "identifier": identifier,
+            "reason": reason,
+            "blocked_at": datetime.now(timezone.utc).isoformat(),
+        }
     )
 
+    async def write() -> None:
+        redis = await get_redis_client()
+        await redis.setex(key, ttl, block_data)
+
+    await guarded(
+        "block", write, lambda: fallback_store.set(key, block_data, ttl)
+    )
+    invalidate_cached(key)
+
 
 async def is_user_blocked(identifier: str) -> tuple[bool, dict | None]:
     """
@@ -208,12 +536,13 @@ async def is_user_blocked(identifier: str) -> tuple[bool, dict | None]:
     Returns:
         Tuple of (is_blocked, block_data)
     """
-    from app.core.redis import get_redis_client
-    import json
-    
-    redis = await get_redis_client()
-    result = await redis.get(f"user_blocked:{identifier}")
-    
+    key = f"user_blocked:{identifier}"
+    result = fallback_store.get(key)
+    if result is None:
+        result = await guarded(
+            "blocked", lambda: get_cached(key), lambda: None
+        )
+
     if result:
         return True, json.loads(result)
     return False, None
@@ -226,11 +555,15 @@ async def unblock_user(identifier: str) -> None:
     Args:
         identifier: User email or username
     """
-    from app.core.redis import get_redis_client
-    
-    redis = await get_redis_client()
-    await redis.delete(f"user_blocked:{identifier}")
-    await redis.delete(f"login_attempts:{identifier}")
+    keys = (f"user_blocked:{identifier}", f"login_attempts:{identifier}")
+    fallback_store.delete(*keys)
+
+    async def delete() -> None:
+        redis = await get_redis_client()
+        await redis.delete(*keys)
+
+    await guarded("block", delete, lambda: None)
+    invalidate_cached(keys[0])
 
 
 async def get_all_blocked_users() -> list[dict]:
@@ -240,20 +573,35 @@ async def get_all_blocked_users() -> list[dict]:
     Returns:
         List of block data dictionaries
     """
-    from app.core.redis import get_redis_client
-    import json
-    
-    redis = await get_redis_client()
+    async def scan() -> list[tuple[str, int]]:
+        redis = await get_redis_client()
+        # Scan for all blocked user keys
+        keys = [key async for key in redis.scan_iter("user_blocked:*")]
+        if not keys:
+            return []
+
+        # Fetch data and TTL (remaining time) of every key in one round trip
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in keys:
+                pipe.get(key)
+                pipe.ttl(key)
+            results = await pipe.execute()
+        return list(zip(results[::2], results[1::2]))
+
+    entries = await guarded("blocked", scan, list)
+    entries += [
+        (data, ttl) for _, data, ttl in fallback_store.scan("user_blocked:")
+    ]
+
     blocked_users = []
-    
-    # Scan for all blocked user keys
-    async for key in redis.scan_iter("user_blocked:*"):
-        data = await redis.get(key)
+    seen = set()
+    for data, ttl in entries:
         if data:
             block_info = json.loads(data)
-            # Get TTL (remaining time)
-            ttl = await redis.ttl(key)
+            if block_info["identifier"] in seen:
+                continue
+            seen.add(block_info["identifier"])
             block_info["expires_in_seconds"] = ttl
             blocked_users.append(block_info)
-    
+
     return blocked_users
@@ -0,0 +1,481 @@
+"""Lightweight OpenTelemetry-compatible request tracing.
+
+Trace context is propagated with the W3C ``traceparent`` header and spans
+are exported as OTLP-style JSON, so traces can be merged with those of
+services instrumented with the OpenTelemetry SDK. Sampling is decided
+once per trace at the edge; unsampled requests skip all span work.
+"""
+import functools
+import importlib
+import inspect
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Protocol
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+TRACEPARENT_RE = re.compile(
+    r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$"
+)
+
+
+@dataclass(slots=True)
+class Span:
+    """A timed operation within a trace."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_span_id: str | None
+    finished: list["Span"]
+    kind: str = "INTERNAL"
+    start_time_ns: int = field(default_factory=time.time_ns)
+    end_time_ns: int = 0
+    attributes: dict[str, Any] = field(default_factory=dict)
+    status: str = "UNSET"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)
+
+    def end(self) -> None:
+        self.end_time_ns = time.time_ns()
+        self.finished.append(self)
+
+    def to_dict(self) -> dict[str, Any]:
+        """Serialize the span using OTLP JSON field names."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id or "",
+            "name": self.name,
+            "kind": f"SPAN_KIND_{self.kind}",
+            "startTimeUnixNano": self.start_time_ns,
+            "endTimeUnixNano": self.end_time_ns,
+            "attributes": self.attributes,
+            "status": {"code": f"STATUS_CODE_{self.status}"},
+            "resource": {"service.name": settings.TRACING_SERVICE_NAME},
+        }
+
+
+_current_span: ContextVar[Span | None] = ContextVar(
+    "current_span", default=None
+)
+
+
+def current_span() -> Span | None:
+    """Get the active span, or None if the request is not sampled."""
+    return _current_span.get()
+
+
+def _new_trace_id() -> str:
+    return os.urandom(16).hex()
+
+
+def _new_span_id() -> str:
+    return os.urandom(8).hex()
+
+
+class start_span:
+    """
+    Context manager opening a child span of the active span.
+
+    Does nothing when there is no active span, so instrumented code pays
+    only a context variable lookup on unsampled requests.
+    """
+
+    __slots__ = ("name", "kind", "attributes", "span", "_token")
+
+    def __init__(
+        self,
+        name: str,
+        kind: str = "INTERNAL",
+        attributes: dict[str, Any] | None = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span = None
+        self._token = None
+
+    def __enter__(self) -> Span | None:
+        parent = _current_span.get()
+        if parent is None:
+            return None
+        self.span = Span(
+            name=self.name,
+            trace_id=parent.trace_id,
+            span_id=_new_span_id(),
+            parent_span_id=parent.span_id,
+            finished=parent.finished,
+            kind=self.kind,
+            attributes=self.attributes or {},
+        )
+        self._token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.span is None:
+            return
+        if exc is not None:
+            self.span.record_exception(exc)
+        _current_span.reset(self._token)
+        self.span.end()
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorate a sync or async function so each call is recorded as a span.
+
+    Args:
+        name: Span name
+
+    Returns:
+        Decorator preserving the wrapped function's signature
+    """
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with start_span(name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with start_span(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# Exporters
+
+
+class SpanExporter(Protocol):
+    """Interface of span exporters selected with ``TRACING_EXPORTER``."""
+
+    def export(self, spans: list[dict[str, Any]]) -> None: ...
+
+    def shutdown(self) -> None: ...
+
+
+class ConsoleSpanExporter:
+    """Write spans to stdout as JSON lines."""
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        for span in spans:
+            sys.stdout.write(json.dumps(span) + "\n")
+        sys.stdout.flush()
+
+    def shutdown(self) -> None:
+        pass
+
+
+class FileSpanExporter:
+    """Append spans to a file as JSON lines."""
+
+    def __init__(self, path: str | None = None):
+        self.path = path or settings.TRACING_FILE_PATH
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        with open(self.path, "a") as f:
+            for span in spans:
+                f.write(json.dumps(span) + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+class InMemorySpanExporter:
+    """Keep exported spans in memory (used by tests)."""
+
+    def __init__(self):
+        self.spans: list[dict[str, Any]] = []
+
+    def export(self, spans: list[dict[str, Any]]) -> None:
+        self.spans.extend(spans)
+
+    def shutdown(self) -> None:
+        pass
+
+
+EXPORTERS: dict[str, Callable[[], SpanExporter]] = {
+    "console": ConsoleSpanExporter,
+    "file": FileSpanExporter,
+}
+
+
+def load_exporter(name: str) -> SpanExporter:
+    """
+    Build the exporter named by ``TRACING_EXPORTER``.
+
+    Args:
+        name: ``console``, ``file`` or a ``package.module:ClassName`` path
+
+    Returns:
+        Exporter instance
+    """
+    if name in EXPORTERS:
+        return EXPORTERS[name]()
+    module_name, _, class_name = name.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+# Span processors
+
+
+class SimpleSpanProcessor:
+    """Export the spans of each trace synchronously when it finishes."""
+
+    def __init__(self, exporter: SpanExporter):
+        self.exporter = exporter
+
+    def on_trace_end(self, spans: list[Span]) -> None:
+        self.exporter.export([span.to_dict() for span in spans])
+
+    def shutdown(self) -> None:
+        self.exporter.shutdown()
+
+
+class BatchSpanProcessor:
+    """Queue finished traces and export them from a background thread."""
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        interval: float = 1.0,
+        max_queue_size: int = 2048,
+    ):
+        self.exporter = exporter
+        self.interval = interval
+        # Oldest traces are dropped rather than blocking requests.
+        self._queue: deque[list[Span]] = deque(maxlen=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="span-exporter", daemon=True
+        )
+        self._thread.start()
+
+    def on_trace_end(self, spans: list[Span]) -> None:
+        self._queue.append(spans)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._flush()
+
+    def _flush(self) -> None:
+        batch = []
+        while self._queue:
+            batch.extend(span.to_dict() for span in self._queue.popleft())
+        if batch:
+            self.exporter.export(batch)
+
+    def shutdown(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self._flush()
+        self.exporter.shutdown()
+
+
+_processor: SimpleSpanProcessor | BatchSpanProcessor | None = None
+
+
+def get_span_processor() -> SimpleSpanProcessor | BatchSpanProcessor:
+    """Get or create the span processor configured in settings."""
+    global _processor
+    if _processor is None:
+        _processor = BatchSpanProcessor(
+            load_exporter(settings.TRACING_EXPORTER),
+            interval=settings.TRACING_EXPORT_INTERVAL_SECONDS,
+        )
+    return _processor
+
+
+def set_span_processor(
+    processor: SimpleSpanProcessor | BatchSpanProcessor | None,
+) -> None:
+    """Replace the active span processor."""
+    global _processor
+    _processor = processor
+
+
+def shutdown_tracing() -> None:
+    """
+    Flush pending spans and stop the exporter.
+
+    Should be called during application shutdown.
+    """
+    global _processor
+    if _processor is not None:
+        _processor.shutdown()
+        _processor = None
+
+
+# Sampling and propagation
+
+
+def parse_traceparent(value: str) -> tuple[str, str, bool] | None:
+    """
+    Parse a W3C ``traceparent`` header.
+
+    Args:
+        value: Header value
+
+    Returns:
+        Tuple of (trace_id, parent_span_id, sampled) or None if invalid
+    """
+    match = TRACEPARENT_RE.match(value)
+    if match is None:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, bool(int(flags, 16) & 1)
+
+
+def should_sample(trace_id: str) -> bool:
+    """Decide deterministically from the trace id whether to sample."""
+    rate = settings.TRACING_SAMPLE_RATE
+    return int(trace_id[16:], 16) < rate * (1 << 64)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span for each sampled request.
+
+    Incoming ``traceparent`` headers are honoured (parent-based sampling);
+    otherwise a new trace is sampled at ``TRACING_SAMPLE_RATE``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+        if parent is not None:
+            trace_id, parent_span_id, sampled = parent
+        else:
+            trace_id, parent_span_id = _new_trace_id(), None
+            sampled = should_sample(trace_id)
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(
+            name=f"{scope['method']} {scope['path']}",
+            trace_id=trace_id,
+            span_id=_new_span_id(),
+            parent_span_id=parent_span_id,
+            finished=[],
+            kind="SERVER",
+            attributes={
+                "http.method": scope["method"],
+                "http.target": scope["path"],
+            },
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.status = "ERROR"
+            await send(message)
+
+        token = _current_span.set(span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as exc:
+            span.record_exception(exc)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = scope.get("route")
+            if route is not None:
+                span.name = f"{scope['method']} {route.path}"
+                span.set_attribute("http.route", route.path)
+            span.end()
+            get_span_processor().on_trace_end(span.finished)
+
+
+# SQLAlchemy instrumentation
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    parent = _current_span.get()
+    if parent is None:
+        return
+    span = Span(
+        name="db.query",
+        trace_id=parent.trace_id,
+        span_id=_new_span_id(),
+        parent_span_id=parent.span_id,
+        finished=parent.finished,
+        kind="CLIENT",
+        attributes={
+            "db.system": conn.dialect.name,
+            "db.statement": statement,
+        },
+    )
+    conn.info.setdefault("trace_spans", []).append(span)
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    if _current_span.get() is not None and conn.info.get("trace_spans"):
+        conn.info["trace_spans"].pop().end()
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get("trace_spans") if connection else None
+    if spans:
+        span = spans.pop()
+        span.record_exception(exception_context.original_exception)
+        span.end()
+
+
+def install_tracing(engine: Engine) -> None:
+    """
+    Attach SQL span hooks to a SQLAlchemy engine.
+
+    Args:
+        engine: Engine whose statements should appear in traces
+    """
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -0,0 +1,133 @@
+"""Worker warm-up and readiness.
+
+Without warm-up, the first requests to a new worker pay for opening
+database and Redis connections, compiling the hot SQL statements,
+generating the OpenAPI schema, parsing the signing keys and Argon2's first
+allocation. ``run_warm_up`` does all of that in the background right after
+startup. ``/ready`` answers 503 until the required steps have succeeded, so
+load balancers only route to warm workers; ``/health`` keeps reporting
+liveness.
+"""
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import text
+from sqlmodel import select
+
+from app.core.config import settings
+from app.core.database import app_session
+from app.core.keys import get_keyring
+from app.core.redis import get_redis_client
+from app.core.security import get_password_hash
+from app.models.item import Item
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+# Redis operations fail open through the circuit breaker, so a worker that
+# cannot reach Redis yet is still put into rotation.
+OPTIONAL_STEPS = ("redis",)
+
+
+class Readiness:
+    """Warm-up progress of this worker, as reported by ``/ready``."""
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.ready = False
+        self.steps: dict[str, dict] = {}
+
+
+readiness = Readiness()
+
+
+def _hot_statements():
+    """Statements run by login, authentication and item reads."""
+    return [
+        select(User).where(User.id == 0),
+        select(User).where((User.username == "") | (User.email == "")),
+        select(Item).where(Item.owner_id == 0).offset(0).limit(1),
+        select(Item).where(Item.id == 0, Item.owner_id == 0),
+    ]
+
+
+def _warm_database(app: FastAPI) -> None:
+    """Open pooled connections and fill the compiled statement cache."""
+    with app_session(app) as session:
+        engine = session.get_bind()
+        count = settings.WARMUP_DB_CONNECTIONS
+        # Connections beyond the pool size would be closed on release
+        pool_size = getattr(engine.pool, "size", None)
+        if callable(pool_size):
+            count = min(count, pool_size())
+        connections = []
+        try:
+            for _ in range(count):
+                connections.append(engine.connect())
+                connections[-1].execute(text("SELECT 1"))
+        finally:
+            for connection in connections:
+                connection.close()
+
+        for statement in _hot_statements():
+            session.exec(statement).first()
+
+
+async def _warm_redis() -> None:
+    """Open pooled Redis connections with concurrent PINGs."""
+    client = await get_redis_client()
+    await asyncio.gather(
+        *(client.ping() for _ in range(settings.WARMUP_REDIS_CONNECTIONS))
+    )
+
+
+async def warm_up(app: FastAPI) -> bool:
+    """
+    Run the warm-up steps that have not succeeded yet.
+
+    Args:
+        app: Application whose routes and dependency overrides are used
+
+    Returns:
+        True if the worker is ready to receive traffic
+    """
+    steps: dict[str, Callable[[], Awaitable]] = {
+        "database": lambda: run_in_threadpool(_warm_database, app),
+        "redis": _warm_redis,
+        "openapi": lambda: run_in_threadpool(app.openapi),
+        "signing_keys": lambda: run_in_threadpool(get_keyring),
+        "password_hash": lambda: run_in_threadpool(
+            get_password_hash, "warm-up"
+        ),
+    }
+    for name, step in steps.items():
+        if readiness.steps.get(name, {}).get("ok"):
+            continue
+        start = time.perf_counter()
+        try:
+            await step()
+        except Exception as exc:
+            logger.warning("Warm-up step %s failed: %s", name, exc)
+            readiness.steps[name] = {"ok": False, "error": str(exc)}
+        else:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            readiness.steps[name] = {"ok": True, "ms": round(elapsed_ms, 1)}
+
+    readiness.ready = all(
+        result["ok"] or name in OPTIONAL_STEPS
+        for name, result in readiness.steps.items()
+    )
+    return readiness.ready
+
+
+async def run_warm_up(app: FastAPI) -> None:
+    """Warm up the worker, retrying failed steps until it is ready."""
+    while not await warm_up(app):
+        await asyncio.sleep(settings.WARMUP_RETRY_SECONDS)
+    logger.info("Worker ready: %s", readiness.steps)
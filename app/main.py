@@ -1,10 +1,24 @@
-from contextlib import asynccontextmanager
+import asyncio
+from contextlib import asynccontextmanager, suppress
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
 
-from app.api.routes import auth, items, users
+from app.api.routes import auth, export, items, users
+from app.core.changefeed import start_change_feed, stop_change_feed
+from app.core.circuit_breaker import RedisUnavailableError
+from app.core.coalescing import CoalescingMiddleware
+from app.core.compression import CompressionMiddleware
 from app.core.config import settings
-from app.core.redis import close_redis_client
+from app.core.jobs import drain_job_queue, start_job_queue
+from app.core.keys import jwks
+from app.core.metrics import PrometheusMiddleware, render_metrics
+from app.core.profiling import ProfilerMiddleware
+from app.core.provisioning import shutdown_hashing_pool
+from app.core.query_budget import QueryBudgetMiddleware
+from app.core.redis import close_redis_client, init_redis_client
+from app.core.tracing import TracingMiddleware, shutdown_tracing
+from app.core.warmup import readiness, run_warm_up
 
 
 @asynccontextmanager
@@ -13,9 +27,28 @@ async def lifespan(app: FastAPI):
     # Startup: Create database tables if they don't exist
     # Note: In production, use Alembic migrations instead
     # create_db_and_tables()
+    await init_redis_client()
+    await start_job_queue(app)
+    await start_change_feed(app)
+    # Warm up in the background; /ready reports when it is done
+    readiness.reset()
+    warmup_task = None
+    if settings.WARMUP_ENABLED:
+        warmup_task = asyncio.create_task(run_warm_up(app))
+    else:
+        readiness.ready = True
     yield
     # Shutdown: cleanup code here if needed
+    if warmup_task is not None:
+        warmup_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await warmup_task
+    # Apply the write-behind jobs still queued before Redis goes away
+    await drain_job_queue()
+    await stop_change_feed()
     await close_redis_client()
+    await asyncio.to_thread(shutdown_hashing_pool)
+    shutdown_tracing()
 
 
 app = FastAPI(
@@ -27,10 +60,41 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Innermost: followers of a coalesced read are still compressed, counted
+# and traced like any other request
+if settings.COALESCING_ENABLED:
+    app.add_middleware(CoalescingMiddleware, routes=app.routes)
+# Inside the others, so metrics, traces and profiles include the compression
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+if settings.QUERY_BUDGET_MODE != "off":
+    app.add_middleware(QueryBudgetMiddleware)
+if settings.METRICS_ENABLED:
+    app.add_middleware(PrometheusMiddleware, routes=app.routes)
+app.add_middleware(TracingMiddleware)
+if settings.PROFILER_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+
+
+@app.exception_handler(RedisUnavailableError)
+async def redis_unavailable_handler(
+    request: Request, exc: RedisUnavailableError
+) -> JSONResponse:
+    """Answer fail-closed operations with 503 while Redis is unavailable."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily unavailable"},
+        headers={
+            "Retry-After": str(int(settings.REDIS_BREAKER_RECOVERY_SECONDS))
+        },
+    )
+
+
 # Include routers
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")
 app.include_router(items.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
 
 
 @app.get("/")
@@ -47,3 +111,28 @@ def root():
 def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+def readiness_check(response: Response):
+    """Readiness endpoint: 503 until this worker has warmed up."""
+    if not readiness.ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if readiness.ready else "warming_up",
+        "steps": readiness.steps,
+    }
+
+
+@app.get("/.well-known/jwks.json")
+def jwks_endpoint(response: Response):
+    """Public keys for verifying access tokens outside this API."""
+    response.headers["Cache-Control"] = "public, max-age=300"
+    return jwks()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus metrics endpoint."""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
@@ -22,6 +22,8 @@ class User(UserBase, table=True):
     hashed_password: str = Field(max_length=255)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Written behind the login request (app.core.jobs)
+    last_login_at: datetime | None = Field(default=None)
 
 
 class UserCreate(SQLModel):
@@ -47,3 +49,4 @@ class UserPublic(UserBase):
     """Schema for public user data (without password)."""
 
     id: int
+    last_login_at: datetime | None = None
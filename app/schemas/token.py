@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class Token(BaseModel):
@@ -28,3 +28,28 @@ class TokenPayload(BaseModel):
     sub: str | None = None
     jti: str | None = None
     type: str | None = None
+    epoch: int = 0
+    fam: str | None = None
+
+
+class TokenIntrospectionRequest(BaseModel):
+    """Batch token introspection request schema."""
+
+    tokens: list[str] = Field(min_length=1)
+
+
+class TokenIntrospection(BaseModel):
+    """Introspection result of one access token."""
+
+    active: bool
+    reason: str | None = None
+    user_id: int | None = None
+    username: str | None = None
+    is_superuser: bool | None = None
+    exp: int | None = None
+
+
+class TokenIntrospectionResponse(BaseModel):
+    """Batch token introspection response, in request order."""
+
+    results: list[TokenIntrospection]
@@ -0,0 +1,285 @@
+"""Production server: pre-forked uvicorn workers.
+
+``python -m app.server`` imports the application once and builds its
+shared, read-only state (routes, OpenAPI schema, signing keys, password
+hasher) in the supervisor, then forks the workers from that warm process:
+they start in milliseconds and share that memory copy-on-write. Nothing
+holding a socket is created before the fork; the database engine, Redis
+client and event loop are created in each worker, whose lifespan then
+runs the per-worker warm-up (``app.core.warmup``).
+
+Workers serve on uvloop and httptools. Each is recycled after
+``SERVER_MAX_REQUESTS`` requests (plus a random jitter, so they do not all
+restart at once) to bound memory growth; the supervisor forks a
+replacement from the warm parent. A worker that crashes soon after
+starting is replaced after a delay that doubles with every crash in a
+row, from ``SERVER_RESPAWN_BACKOFF_SECONDS`` up to
+``SERVER_RESPAWN_BACKOFF_MAX_SECONDS``. SIGTERM or SIGINT stop the workers
+gracefully, killing them after ``SERVER_GRACEFUL_TIMEOUT`` seconds; open
+change feed streams are ended first.
+
+The worker count defaults to the CPUs this process may use, taking the
+CPU affinity mask and cgroup (container) CPU quota into account.
+"""
+import argparse
+import gc
+import logging
+import os
+import random
+import signal
+import socket
+import time
+
+import uvicorn
+
+from app.core.changefeed import stop_change_feed
+from app.core.config import settings
+from app.core.cpus import available_cpus
+from app.core.metrics import mark_process_dead
+
+logger = logging.getLogger(__name__)
+
+# uvicorn's exit code for a worker whose lifespan startup failed
+STARTUP_FAILURE = 3
+
+
+def preload():
+    """
+    Import the application and build its shared state before forking.
+
+    Returns:
+        The ASGI application
+    """
+    from app.core.keys import get_keyring
+    from app.core.security import get_password_hasher
+    from app.main import app
+
+    app.openapi()
+    get_keyring()
+    get_password_hasher()
+    # Move everything allocated so far out of the collector's reach, so
+    # that collections in the workers do not touch (and copy) shared pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+class Server(uvicorn.Server):
+    """uvicorn server that ends the change feed streams on shutdown.
+
+    uvicorn waits for open responses before running the lifespan
+    shutdown, so the event streams (``GET /api/items/events``) would hold
+    every stop or recycle for the whole graceful timeout. Their clients
+    reconnect to another worker.
+    """
+
+    async def shutdown(self, sockets=None) -> None:
+        await stop_change_feed()
+        await super().shutdown(sockets)
+
+
+class Supervisor:
+    """Fork workers serving on a shared socket and keep them running."""
+
+    def __init__(
+        self,
+        app,
+        sock: socket.socket,
+        workers: int,
+        max_requests: int = 0,
+        max_requests_jitter: int = 0,
+        graceful_timeout: int = 30,
+        respawn_backoff: float = 0.5,
+        respawn_backoff_max: float = 30.0,
+    ):
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.respawn_backoff = respawn_backoff
+        self.respawn_backoff_max = respawn_backoff_max
+        self.children: dict[int, int] = {}  # pid -> worker index
+        self.started_at: dict[int, float] = {}  # pid -> monotonic time
+        self.crashes: dict[int, int] = {}  # index -> crashes in a row
+        self.respawns: dict[int, float] = {}  # index -> when to respawn
+        self.stopping = False
+        self.exit_code = 0
+
+    def spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid:
+            self.children[pid] = index
+            self.started_at[pid] = time.monotonic()
+            return
+        # In the worker: let uvicorn install its own signal handlers
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            code = self.serve()
+        except BaseException:
+            logger.exception("Worker %s crashed", index)
+            code = 1
+        finally:
+            os._exit(code)
+
+    def serve(self) -> int:
+        """Run uvicorn in a worker process and return its exit code."""
+        limit = None
+        if self.max_requests:
+            limit = self.max_requests + random.randint(
+                0, self.max_requests_jitter
+            )
+        config = uvicorn.Config(
+            self.app,
+            loop="uvloop",
+            http="httptools",
+            limit_max_requests=limit,
+            timeout_graceful_shutdown=self.graceful_timeout,
+            proxy_headers=True,
+        )
+        server = Server(config)
+        server.run(sockets=[self.sock])
+        return 0 if server.started else STARTUP_FAILURE
+
+    def stop(self, signum=None, frame=None) -> None:
+        if not self.stopping:
+            logger.info("Stopping %d workers", len(self.children))
+        self.stopping = True
+        for pid in self.children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def reap(self) -> None:
+        """Collect exited workers, replacing them unless stopping."""
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            started_at = self.started_at.pop(pid, None)
+            if index is None:
+                continue
+            mark_process_dead(pid)
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                continue
+            if code == STARTUP_FAILURE:
+                # A replacement would fail the same way
+                logger.error("Worker %s failed to start", index)
+                self.exit_code = STARTUP_FAILURE
+                self.stop()
+                continue
+            logger.info("Worker %s (pid %s) exited with %s", index, pid, code)
+            uptime = time.monotonic() - started_at
+            if code == 0 or uptime >= self.respawn_backoff_max:
+                # Recycled, or crashed after running fine for a while
+                self.crashes.pop(index, None)
+                self.spawn(index)
+                continue
+            # Crashing right after starting: back off exponentially
+            crashes = self.crashes[index] = self.crashes.get(index, 0) + 1
+            delay = min(
+                self.respawn_backoff * 2 ** (crashes - 1),
+                self.respawn_backoff_max,
+            )
+            logger.warning(
+                "Worker %s crashed %d times in a row; restarting in %.1fs",
+                index,
+                crashes,
+                delay,
+            )
+            self.respawns[index] = time.monotonic() + delay
+
+    def respawn_due(self) -> None:
+        """Replace the crashed workers whose backoff has elapsed."""
+        now = time.monotonic()
+        for index, due in list(self.respawns.items()):
+            if due <= now:
+                del self.respawns[index]
+                self.spawn(index)
+
+    def run(self) -> int:
+        """Start the workers and supervise them until told to stop."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        logger.info(
+            "Serving with %d workers (pid %s)", self.workers, os.getpid()
+        )
+        while not self.stopping:
+            self.reap()
+            self.respawn_due()
+            time.sleep(0.1)
+
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        for pid in list(self.children):
+            logger.warning("Killing worker pid %s", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            mark_process_dead(pid)
+        self.children.clear()
+        return self.exit_code
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run the production server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=settings.SERVER_WORKERS,
+        help="Worker processes (default: available CPUs)",
+    )
+    parser.add_argument(
+        "--max-requests", type=int, default=settings.SERVER_MAX_REQUESTS
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO, format="%(levelname)s:     %(message)s"
+    )
+
+    workers = args.workers or available_cpus()
+    if (
+        workers > 1
+        and settings.METRICS_ENABLED
+        and "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+    ):
+        logger.warning(
+            "PROMETHEUS_MULTIPROC_DIR is not set: /metrics will only show "
+            "the worker that serves the scrape"
+        )
+
+    sock = uvicorn.Config(None, host=args.host, port=args.port).bind_socket()
+    app = preload()
+    supervisor = Supervisor(
+        app,
+        sock,
+        workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER,
+        graceful_timeout=settings.SERVER_GRACEFUL_TIMEOUT,
+        respawn_backoff=settings.SERVER_RESPAWN_BACKOFF_SECONDS,
+        respawn_backoff_max=settings.SERVER_RESPAWN_BACKOFF_MAX_SECONDS,
+    )
+    try:
+        return supervisor.run()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,316 @@
+"""Fan-out of the item change feed to thousands of concurrent subscribers.
+
+``--mode inprocess`` runs ``--subscribers`` SSE streams
+(``app.core.changefeed.event_stream``) as tasks of one event loop, spread
+over ``--users`` users, and publishes ``--events`` change events through
+the worker's hub, as its listener connection does. A fraction of the
+subscribers (``--slow-fraction``) reads one event per ``--slow-delay``
+seconds and should be disconnected once its queue is full, without
+slowing the others down. Reports the publish-to-frame latency, the
+deliveries per second, the memory per subscriber and the disconnections.
+
+``--mode remote`` opens the streams over HTTP against a running server
+(``make deps-up`` and ``make dev``) and measures from ``POST /api/items/``
+to the event. Thousands of connections need a raised ``ulimit -n``.
+
+Usage:
+    python -m benchmarks.changefeed_load --subscribers 10000
+    python -m benchmarks.changefeed_load --mode remote \\
+        --base-url http://localhost:8000 --subscribers 2000 --users 50
+"""
+import argparse
+import asyncio
+import json
+import resource
+import statistics
+import time
+import tracemalloc
+import uuid
+from pathlib import Path
+
+import httpx
+
+from app.core import changefeed
+from app.core.config import settings
+
+
+def _percentiles(latencies: list[float]) -> dict:
+    if not latencies:
+        return {}
+    ordered = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(ordered) * 1e3,
+        "p99_ms": ordered[int(len(ordered) * 0.99) - 1] * 1e3,
+        "max_ms": ordered[-1] * 1e3,
+    }
+
+
+async def _consume(
+    owner_id: int, delay: float, latencies: list[float], ended: list[str]
+) -> None:
+    """Read one SSE stream as a client would, recording each latency."""
+    async for chunk in changefeed.event_stream(owner_id):
+        for frame in chunk.split("\n\n")[:-1]:
+            if frame.startswith("data: "):
+                sent = json.loads(frame[6:])["sent"]
+                latencies.append(time.perf_counter() - sent)
+            elif frame.startswith("event: overflow"):
+                ended.append("overflow")
+        if delay:
+            await asyncio.sleep(delay)
+
+
+async def run_inprocess(args: argparse.Namespace) -> dict:
+    """Subscribers and publisher in this process, no HTTP."""
+    settings.CHANGE_FEED_BACKEND = "memory"
+    settings.CHANGE_FEED_QUEUE_SIZE = args.queue_size
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    feed = changefeed.ChangeFeed()
+    await feed.start()
+    changefeed._feed = feed
+
+    latencies: list[float] = []
+    slow_latencies: list[float] = []  # Left out of the percentiles
+    ended: list[str] = []
+    slow_every = int(1 / args.slow_fraction) if args.slow_fraction else 0
+    tasks = []
+    slow_count = 0
+    for n in range(args.subscribers):
+        # One in slow_every subscribers of every user is slow
+        slow = slow_every and (n // args.users) % slow_every == 0
+        tasks.append(
+            asyncio.create_task(
+                _consume(
+                    n % args.users,
+                    args.slow_delay if slow else 0,
+                    slow_latencies if slow else latencies,
+                    ended,
+                )
+            )
+        )
+        slow_count += bool(slow)
+    while feed.hub.count < args.subscribers:
+        await asyncio.sleep(0.01)
+    subscribed_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    # Tracing allocations would dominate the cost of the deliveries
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for n in range(args.events):
+        feed.hub.dispatch(
+            json.dumps(
+                {
+                    "type": "updated",
+                    "owner_id": n % args.users,
+                    "sent": time.perf_counter(),
+                }
+            )
+        )
+        if (n + 1) % args.batch == 0:
+            # Let the streams run, as the listener does between reads
+            due = start + (n + 1) / args.rate if args.rate else 0
+            await asyncio.sleep(max(due - time.perf_counter(), 0))
+    # Wait until deliveries stop: only the slow subscribers lag behind
+    finished = time.perf_counter()
+    delivered = -1
+    while len(latencies) != delivered:
+        delivered = len(latencies)
+        finished = time.perf_counter()
+        await asyncio.sleep(0.05)
+    elapsed = finished - start
+
+    await feed.stop()
+    await asyncio.gather(*tasks)
+    changefeed._feed = None
+    return {
+        "mode": "inprocess",
+        "subscribers": args.subscribers,
+        "users": args.users,
+        "events": args.events,
+        "rate": args.rate,
+        "deliveries": len(latencies),
+        "deliveries_per_s": len(latencies) / elapsed,
+        "latency": _percentiles(latencies),
+        "bytes_per_subscriber": subscribed_bytes / args.subscribers,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / 1e3,
+        "slow_subscribers": slow_count,
+        "disconnected_slow": ended.count("overflow"),
+    }
+
+
+async def _sign_up(client: httpx.AsyncClient, username: str) -> str:
+    """Register a user and return an access token."""
+    password = "benchpassword123"
+    response = await client.post(
+        "/api/users/",
+        json={
+            "email": f"{username}@bench.example.com",
+            "username": username,
+            "password": password,
+        },
+    )
+    response.raise_for_status()
+    response = await client.post(
+        "/api/auth/login",
+        data={"username": username, "password": password},
+    )
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def _listen(
+    client: httpx.AsyncClient,
+    token: str,
+    ready: list[bool],
+    sent: dict[str, float],
+    latencies: list[float],
+    ended: list[str],
+) -> None:
+    async with client.stream(
+        "GET",
+        "/api/items/events",
+        headers={"Authorization": f"Bearer {token}"},
+    ) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("retry:"):
+                ready.append(True)
+            elif line.startswith("data: "):
+                event = json.loads(line[6:])
+                if event["type"] == "created":
+                    title = event["item"]["title"]
+                    latencies.append(time.perf_counter() - sent[title])
+            elif line == "event: overflow":
+                ended.append("overflow")
+
+
+async def run_remote(args: argparse.Namespace) -> dict:
+    """Subscribers over HTTP against a running server."""
+    run_id = uuid.uuid4().hex[:8]
+    limits = httpx.Limits(max_connections=None)
+    timeout = httpx.Timeout(30.0, read=None)
+    async with httpx.AsyncClient(
+        base_url=args.base_url, limits=limits, timeout=timeout
+    ) as client:
+        tokens = [
+            await _sign_up(client, f"feed_{run_id}_{n}")
+            for n in range(args.users)
+        ]
+        ready: list[bool] = []
+        sent: dict[str, float] = {}
+        latencies: list[float] = []
+        ended: list[str] = []
+        tasks = [
+            asyncio.create_task(
+                _listen(
+                    client,
+                    tokens[n % args.users],
+                    ready,
+                    sent,
+                    latencies,
+                    ended,
+                )
+            )
+            for n in range(args.subscribers)
+        ]
+        while len(ready) < args.subscribers:
+            failed = [task for task in tasks if task.done()]
+            if failed:
+                failed[0].result()  # Raise the connection error
+            await asyncio.sleep(0.1)
+
+        start = time.perf_counter()
+        for n in range(args.events):
+            title = f"feed {run_id} {n}"
+            sent[title] = time.perf_counter()
+            response = await client.post(
+                "/api/items/",
+                json={"title": title},
+                headers={
+                    "Authorization": f"Bearer {tokens[n % args.users]}"
+                },
+            )
+            response.raise_for_status()
+        expected = args.events * args.subscribers // args.users
+        deadline = time.perf_counter() + 30
+        while len(latencies) < expected and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "mode": "remote",
+        "subscribers": args.subscribers,
+        "users": args.users,
+        "events": args.events,
+        "deliveries": len(latencies),
+        "expected_deliveries": expected,
+        "deliveries_per_s": len(latencies) / elapsed,
+        "latency": _percentiles(latencies),
+        "disconnected_slow": ended.count("overflow"),
+    }
+
+
+def _print(results: dict) -> None:
+    print(
+        f"{results['subscribers']} subscribers over {results['users']} "
+        f"users, {results['events']} events ({results['mode']})"
+    )
+    print(
+        f"deliveries: {results['deliveries']} "
+        f"({results['deliveries_per_s']:.0f}/s)"
+    )
+    latency = results["latency"]
+    if latency:
+        print(
+            f"latency ms: p50 {latency['p50_ms']:.2f}  "
+            f"p99 {latency['p99_ms']:.2f}  max {latency['max_ms']:.2f}"
+        )
+    if "bytes_per_subscriber" in results:
+        print(
+            f"memory: {results['bytes_per_subscriber'] / 1e3:.1f} kB per "
+            f"subscriber, max RSS {results['max_rss_mb']:.0f} MB"
+        )
+        print(
+            f"slow subscribers: {results['slow_subscribers']}, "
+            f"disconnected: {results['disconnected_slow']}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--mode", choices=("inprocess", "remote"), default="inprocess"
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--events", type=int, default=2_000)
+    parser.add_argument(
+        "--rate", type=float, default=200, help="Events per second; 0: max"
+    )
+    parser.add_argument(
+        "--batch", type=int, default=10, help="Events published per loop turn"
+    )
+    # Below the events a slow subscriber misses while it sleeps
+    parser.add_argument("--queue-size", type=int, default=5)
+    parser.add_argument("--slow-fraction", type=float, default=0.01)
+    parser.add_argument("--slow-delay", type=float, default=5.0)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    if args.mode == "remote":
+        results = asyncio.run(run_remote(args))
+    else:
+        results = asyncio.run(run_inprocess(args))
+    _print(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
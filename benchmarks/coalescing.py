@@ -0,0 +1,139 @@
+"""Bursts of identical concurrent reads with and without coalescing.
+
+Runs the application in-process (SQLite and fakeredis, as
+``benchmarks.loadtest --mode inprocess``) and sends ``--bursts`` bursts of
+``--burst-size`` identical concurrent requests to ``GET /api/items/``
+(a page of ``--items`` items) and ``GET /api/users/me``, as a client
+with many tabs open does after a token refresh. In the ``distinct`` runs
+every request carries a unique, ignored query parameter, so none of them
+can be coalesced: the difference is what single-flight saves. Reports
+the SQL statements per request, the latency and the time to answer a
+whole burst.
+
+Usage:
+    python -m benchmarks.coalescing
+    python -m benchmarks.coalescing --burst-size 50 --output c.json
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from benchmarks.loadtest import _login, _register, build_inprocess_app
+
+ENDPOINTS = {
+    "items": "/api/items/?offset=0&limit=100",
+    "me": "/api/users/me",
+}
+
+statements = 0
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    global statements
+    statements += 1
+
+
+async def _burst(
+    client: httpx.AsyncClient, url: str, size: int, distinct: bool
+) -> tuple[float, list[float]]:
+    """Send one burst and return its duration and request latencies."""
+
+    async def get(n: int) -> float:
+        start = time.perf_counter()
+        params = {"burst_request": n} if distinct else None
+        response = await client.get(url, params=params)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*(get(n) for n in range(size)))
+    return time.perf_counter() - start, latencies
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Time the bursts of every endpoint, coalesced and distinct."""
+    global statements
+    tmpdir = tempfile.TemporaryDirectory()
+    app, _ = build_inprocess_app(Path(tmpdir.name) / "bench.db")
+    results = {"burst_size": args.burst_size, "endpoints": {}}
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app),
+        base_url="http://bench",
+        timeout=30.0,
+    ) as client:
+        user = await _register(client, "bench_coalescing")
+        await _login(client, user)
+        client.headers["Authorization"] = f"Bearer {user.access_token}"
+        for n in range(args.items):
+            response = await client.post(
+                "/api/items/", json={"title": f"Item {n}"}
+            )
+            response.raise_for_status()
+
+        for name, url in ENDPOINTS.items():
+            results["endpoints"][name] = {}
+            for mode in ("coalesced", "distinct"):
+                distinct = mode == "distinct"
+                await _burst(client, url, args.burst_size, distinct)
+                statements = 0
+                bursts, latencies = [], []
+                for _ in range(args.bursts):
+                    duration, burst_latencies = await _burst(
+                        client, url, args.burst_size, distinct
+                    )
+                    bursts.append(duration)
+                    latencies.extend(burst_latencies)
+                latencies.sort()
+                results["endpoints"][name][mode] = {
+                    "statements_per_request": statements
+                    / (args.bursts * args.burst_size),
+                    "burst_ms": statistics.median(bursts) * 1e3,
+                    "p50_ms": statistics.median(latencies) * 1e3,
+                    "p99_ms": latencies[int(len(latencies) * 0.99) - 1]
+                    * 1e3,
+                }
+    tmpdir.cleanup()
+    return results
+
+
+def _print(results: dict) -> None:
+    print(f"{results['burst_size']} identical requests per burst")
+    print(
+        f"{'endpoint':<9}{'mode':<11}{'SQL/req':>9}{'burst ms':>10}"
+        f"{'p50 ms':>9}{'p99 ms':>9}"
+    )
+    for name, modes in results["endpoints"].items():
+        for mode, row in modes.items():
+            print(
+                f"{name:<9}{mode:<11}{row['statements_per_request']:>9.2f}"
+                f"{row['burst_ms']:>10.1f}{row['p50_ms']:>9.1f}"
+                f"{row['p99_ms']:>9.1f}"
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--burst-size", type=int, default=20)
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    _print(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
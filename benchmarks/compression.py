@@ -0,0 +1,155 @@
+"""Bandwidth versus CPU of response compression on 100-item pages.
+
+Builds the JSON body of a ``GET /api/items/?limit=100`` page and, for each
+available encoding (gzip always; brotli and zstd when their packages are
+installed) and several levels, reports the compressed size, the median
+time to compress it, and the time to send it over a few link speeds with
+and without compression. The ``cached`` row is the cost of a hit in the
+compressed body cache of ``app.core.compression`` (a digest of the body)
+for the encoding and level the middleware would pick.
+
+Usage:
+    python -m benchmarks.compression
+    python -m benchmarks.compression --description-words 200 --output c.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import statistics
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app.core.compression import CODECS, negotiate
+
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 11), "zstd": (1, 3, 19)}
+LINKS_MBIT = (10, 100, 1_000)
+WORDS = (
+    "order invoice shipment customer product review pending delivered "
+    "priority warehouse returned payment refund discount note update"
+).split()
+
+
+def page(items: int, description_words: int, seed: int) -> bytes:
+    """The JSON body of one page of items, as the API serializes it."""
+    rng = random.Random(seed)
+    now = datetime(2026, 1, 1).isoformat()
+    return json.dumps(
+        [
+            {
+                "title": f"Item {n}",
+                "description": " ".join(
+                    rng.choices(WORDS, k=description_words)
+                ),
+                "id": n,
+                "owner_id": 1,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for n in range(1, items + 1)
+        ],
+        separators=(",", ":"),
+    ).encode()
+
+
+def _median_us(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def _transfer_ms(size: int, mbit: int) -> float:
+    return size * 8 / (mbit * 1e6) * 1e3
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Compress the page with every encoding and level."""
+    body = page(args.items, args.description_words, args.seed)
+    rows = [
+        {
+            "encoding": "identity",
+            "level": None,
+            "bytes": len(body),
+            "compress_us": 0.0,
+        }
+    ]
+    for name, codec in CODECS.items():
+        for level in LEVELS[name]:
+            compressed = codec.compress(body, level)
+            rows.append(
+                {
+                    "encoding": name,
+                    "level": level,
+                    "bytes": len(compressed),
+                    "compress_us": _median_us(
+                        lambda: codec.compress(body, level), args.repeat
+                    ),
+                }
+            )
+    # What the middleware serves to a client accepting every encoding
+    preferred = negotiate("*")
+    rows.append(
+        {
+            "encoding": "cached",
+            "level": None,
+            "bytes": len(preferred.compress(body)),
+            "compress_us": _median_us(
+                lambda: hashlib.blake2b(body, digest_size=16).digest(),
+                args.repeat,
+            ),
+        }
+    )
+    for row in rows:
+        row["ratio"] = len(body) / row["bytes"]
+        for mbit in LINKS_MBIT:
+            # Time until the client has the body: CPU plus the wire
+            row[f"total_ms_{mbit}mbit"] = row["compress_us"] / 1e3 + (
+                _transfer_ms(row["bytes"], mbit)
+            )
+    return {"items": args.items, "body_bytes": len(body), "rows": rows}
+
+
+def _print(results: dict) -> None:
+    print(
+        f"{results['items']}-item page: {results['body_bytes']} bytes "
+        f"uncompressed"
+    )
+    links = "".join(f"  {mbit:>5} Mbit/s" for mbit in LINKS_MBIT)
+    print(
+        f"{'encoding':<10}{'level':>6}{'bytes':>9}{'ratio':>7}"
+        f"{'CPU µs':>9}{links}"
+    )
+    for row in results["rows"]:
+        level = "" if row["level"] is None else row["level"]
+        totals = "".join(
+            f"  {row[f'total_ms_{mbit}mbit']:>9.3f} ms"
+            for mbit in LINKS_MBIT
+        )
+        print(
+            f"{row['encoding']:<10}{level:>6}{row['bytes']:>9}"
+            f"{row['ratio']:>7.1f}{row['compress_us']:>9.0f}{totals}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--description-words", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    _print(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
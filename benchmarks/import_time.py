@@ -0,0 +1,97 @@
+"""Import-time profile of the application entry points.
+
+Runs ``python -X importtime -c "import <module>"`` in a fresh interpreter
+for each module and reports the total import time and the heaviest
+packages, so slow startup (uvicorn workers, ``create_superuser.py``,
+Alembic) shows up in CI before it reaches production.
+
+Usage:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --module app.main --budget 2.0
+    python -m benchmarks.import_time --output import-time.json
+"""
+import argparse
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+DEFAULT_MODULES = ("app.main", "create_superuser", "app.core.config")
+
+
+def profile_import(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter and parse ``-X importtime``.
+
+    Args:
+        module: Dotted module name
+
+    Returns:
+        Dictionary with the total time in seconds and the self time of
+        each top-level package in milliseconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    packages: dict[str, float] = defaultdict(float)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        if not self_us.strip().isdigit():
+            continue  # Header line
+        if name.strip() == module and not name.startswith("  "):
+            total_us = int(cumulative_us)
+        # Our own modules are reported one by one, dependencies by package
+        name = name.strip()
+        if name.split(".")[0] not in ("app", module):
+            name = name.split(".")[0]
+        packages[name] += int(self_us) / 1000
+    return {
+        "module": module,
+        "total_seconds": total_us / 1_000_000,
+        "packages_ms": dict(
+            sorted(packages.items(), key=lambda item: item[1], reverse=True)
+        ),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--module",
+        action="append",
+        help=f"Module to profile (default: {', '.join(DEFAULT_MODULES)})",
+    )
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--budget", type=float, help="Fail if any import takes longer (s)"
+    )
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    modules = args.module or DEFAULT_MODULES
+    results = [profile_import(module) for module in modules]
+    over_budget = []
+    for result in results:
+        print(f"{result['module']}: {result['total_seconds'] * 1000:.0f} ms")
+        top = list(result["packages_ms"].items())[: args.top]
+        for package, self_ms in top:
+            print(f"  {package:<24} {self_ms:8.1f} ms")
+        if args.budget and result["total_seconds"] > args.budget:
+            over_budget.append(result["module"])
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    for module in over_budget:
+        print(f"OVER BUDGET {module} (> {args.budget} s)")
+    return 1 if over_budget else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,331 @@
+"""Reproducible load-testing harness for the API.
+
+Runs the scripted scenarios from ``benchmarks.scenarios`` either against a
+running server (``--mode remote``, e.g. uvicorn backed by the PostgreSQL and
+Redis from ``local-deps.yml``) or fully in-process against SQLite and
+fakeredis (``--mode inprocess``), and reports RPS, latency percentiles and
+error rates as JSON.
+
+Usage:
+    python -m benchmarks.loadtest --mode inprocess --output results.json
+    python -m benchmarks.loadtest --mode remote --base-url http://localhost:8000 \\
+        --admin-username admin --admin-password admin123
+    python -m benchmarks.loadtest --baseline benchmarks/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.report import compare, summarize
+from benchmarks.scenarios import (
+    BENCH_PASSWORD,
+    SCENARIOS,
+    BenchState,
+    BenchUser,
+    Scenario,
+)
+
+ADMIN_PASSWORD = "benchadmin123"
+
+
+def build_inprocess_app(db_path: Path):
+    """
+    Configure the application to use SQLite and fakeredis.
+
+    Args:
+        db_path: SQLite database file to create
+
+    Returns:
+        Tuple of (ASGI app, admin user credentials)
+    """
+    try:
+        from fakeredis import FakeAsyncRedis
+    except ImportError:
+        sys.exit("In-process mode requires fakeredis: pip install fakeredis")
+    from sqlmodel import Session, SQLModel, create_engine
+
+    import app.core.redis as app_redis
+    from app.core.database import get_session
+    from app.core.security import get_password_hash
+    from app.main import app
+    from app.models.user import User
+
+    engine = create_engine(
+        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+    )
+    SQLModel.metadata.create_all(engine)
+
+    def get_session_override():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    app_redis.redis_client = FakeAsyncRedis(decode_responses=True)
+
+    admin = BenchUser(username="bench_admin", password=ADMIN_PASSWORD)
+    with Session(engine) as session:
+        session.add(
+            User(
+                email="bench_admin@example.com",
+                username=admin.username,
+                hashed_password=get_password_hash(admin.password),
+                is_superuser=True,
+            )
+        )
+        session.commit()
+    return app, admin
+
+
+async def _login(client: httpx.AsyncClient, user: BenchUser) -> None:
+    response = await client.post(
+        "/api/auth/login",
+        data={"username": user.username, "password": user.password},
+    )
+    response.raise_for_status()
+    tokens = response.json()
+    user.access_token = tokens["access_token"]
+    user.refresh_token = tokens["refresh_token"]
+
+
+async def _register(client: httpx.AsyncClient, username: str) -> BenchUser:
+    response = await client.post(
+        "/api/users/",
+        json={
+            "email": f"{username}@bench.example.com",
+            "username": username,
+            "password": BENCH_PASSWORD,
+        },
+    )
+    response.raise_for_status()
+    return BenchUser(username=username)
+
+
+async def seed(
+    client: httpx.AsyncClient,
+    users: int,
+    page_items: int,
+    blocked: int,
+    admin: BenchUser | None,
+) -> BenchState:
+    """
+    Create the accounts and data used by the scenarios through the API.
+
+    Args:
+        client: HTTP client bound to the target app
+        users: Number of regular benchmark users
+        page_items: Items owned by the deep-pagination user
+        blocked: Accounts to lock out with failed logins
+        admin: Superuser credentials, if available
+
+    Returns:
+        Seeded benchmark state
+    """
+    run_id = uuid.uuid4().hex[:8]
+    bench_users = [
+        await _register(client, f"bench_{run_id}_{i}") for i in range(users)
+    ]
+    for user in bench_users:
+        await _login(client, user)
+    if admin is not None:
+        await _login(client, admin)
+
+    page_user = bench_users[0]
+    for start in range(0, page_items, 50):
+        await asyncio.gather(
+            *(
+                client.post(
+                    "/api/items/",
+                    json={"title": f"page-{i}"},
+                    headers=page_user.headers,
+                )
+                for i in range(start, min(start + 50, page_items))
+            )
+        )
+
+    for i in range(blocked):
+        victim = await _register(client, f"blocked_{run_id}_{i}")
+        for _ in range(5):
+            response = await client.post(
+                "/api/auth/login",
+                data={"username": victim.username, "password": "wrong"},
+            )
+            if response.status_code == 403:
+                break
+
+    return BenchState(
+        users=bench_users,
+        page_user=page_user,
+        page_items=page_items,
+        admin=admin,
+    )
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    state: BenchState,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    seed_value: int,
+) -> dict[str, float]:
+    """
+    Run one scenario with a fixed number of requests.
+
+    Each worker uses its own seeded RNG so that the sequence of operations
+    is the same from run to run.
+
+    Returns:
+        Summary statistics for the scenario
+    """
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async def worker(index: int) -> None:
+        nonlocal errors, remaining
+        rng = random.Random(seed_value * 1000 + index)
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                response = await scenario.run(client, state, rng)
+                ok = response.status_code in scenario.expected
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Seed the target and run every selected scenario."""
+    admin = None
+    if args.mode == "inprocess":
+        tmpdir = tempfile.TemporaryDirectory()
+        app, admin = build_inprocess_app(Path(tmpdir.name) / "bench.db")
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://bench"
+    else:
+        transport = None
+        base_url = args.base_url
+        if args.admin_username:
+            admin = BenchUser(
+                username=args.admin_username, password=args.admin_password
+            )
+
+    names = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    results = {}
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, timeout=30.0
+    ) as client:
+        state = await seed(
+            client, args.users, args.page_items, args.blocked, admin
+        )
+        for name in names:
+            scenario = SCENARIOS[name]
+            if scenario.needs_admin and state.admin is None:
+                print(f"Skipping {name}: no superuser credentials")
+                continue
+            await run_scenario(
+                client, state, scenario, args.warmup, args.concurrency,
+                args.seed,
+            )
+            results[name] = await run_scenario(
+                client, state, scenario, args.requests, args.concurrency,
+                args.seed,
+            )
+            print(
+                f"{name:>16}: {results[name]['rps']:8.1f} rps  "
+                f"p50 {results[name]['p50_ms']:7.2f} ms  "
+                f"p99 {results[name]['p99_ms']:7.2f} ms  "
+                f"errors {results[name]['error_rate']:.2%}"
+            )
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "mode": args.mode,
+            "python": platform.python_version(),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+        },
+        "scenarios": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--mode", choices=("inprocess", "remote"), default="inprocess"
+    )
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument(
+        "--scenarios", help=f"Comma separated subset of {', '.join(SCENARIOS)}"
+    )
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--page-items", type=int, default=1000)
+    parser.add_argument("--blocked", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--admin-username")
+    parser.add_argument("--admin-password")
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument(
+        "--baseline", type=Path, help="Fail on regressions against this file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.15,
+        help="Allowed relative degradation before flagging a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Micro-benchmarks (pytest-benchmark)
@@ -0,0 +1,52 @@
+"""Fixtures for micro-benchmarks of authentication building blocks."""
+import pytest
+from fakeredis import FakeAsyncRedis
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+
+import app.core.redis as app_redis
+from app.core.security import create_access_token, get_password_hash
+from app.models.user import User
+
+PASSWORD = "benchpassword123"
+
+
+@pytest.fixture(name="session", scope="session")
+def session_fixture():
+    """In-memory database holding a single active user."""
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(name="user", scope="session")
+def user_fixture(session: Session) -> User:
+    """Persisted user whose password hash uses the configured cost."""
+    user = User(
+        email="bench@example.com",
+        username="bench",
+        hashed_password=get_password_hash(PASSWORD),
+    )
+    session.add(user)
+    session.commit()
+    session.refresh(user)
+    return user
+
+
+@pytest.fixture(name="access_token", scope="session")
+def access_token_fixture(user: User) -> str:
+    """Valid access token for the benchmark user."""
+    return create_access_token(subject=user.id)
+
+
+@pytest.fixture(name="fake_redis", autouse=True)
+def fake_redis_fixture():
+    """Serve Redis calls from memory so network latency is excluded."""
+    app_redis.redis_client = FakeAsyncRedis(decode_responses=True)
+    yield app_redis.redis_client
+    app_redis.redis_client = None
@@ -0,0 +1,52 @@
+"""Sign and verify throughput of the supported JWT algorithms.
+
+Compares HS256 with EdDSA (Ed25519) and ES256 (P-256), and shows the cost
+of re-parsing a PEM key on every verification compared with the parsed key
+objects cached by ``app.core.keys``.
+"""
+import jwt
+import pytest
+from cryptography.hazmat.primitives import serialization
+
+from app.core.keys import generate_private_key, load_key
+
+CLAIMS = {"sub": "1", "epoch": 0, "exp": 4102444800}
+
+
+def _keys(algorithm: str) -> tuple:
+    if algorithm == "HS256":
+        secret = "benchmark-secret-key-of-reasonable-length"
+        return secret, secret
+    key = load_key("bench", generate_private_key(algorithm))
+    return key.private, key.public
+
+
+@pytest.mark.parametrize("algorithm", ["HS256", "EdDSA", "ES256"])
+def test_sign(benchmark, algorithm):
+    private, _ = _keys(algorithm)
+    token = benchmark(
+        jwt.encode, CLAIMS, private, algorithm=algorithm,
+        headers={"kid": "bench"},
+    )
+    assert token.count(".") == 2
+
+
+@pytest.mark.parametrize("algorithm", ["HS256", "EdDSA", "ES256"])
+def test_verify(benchmark, algorithm):
+    private, public = _keys(algorithm)
+    token = jwt.encode(CLAIMS, private, algorithm=algorithm)
+    claims = benchmark(jwt.decode, token, public, algorithms=[algorithm])
+    assert claims["sub"] == "1"
+
+
+@pytest.mark.parametrize("algorithm", ["EdDSA", "ES256"])
+def test_verify_parsing_pem_per_call(benchmark, algorithm):
+    """Baseline: what verification costs without cached key objects."""
+    private, public = _keys(algorithm)
+    pem = public.public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    token = jwt.encode(CLAIMS, private, algorithm=algorithm)
+    claims = benchmark(jwt.decode, token, pem, algorithms=[algorithm])
+    assert claims["sub"] == "1"
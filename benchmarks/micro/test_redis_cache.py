@@ -0,0 +1,47 @@
+"""Micro-benchmark of the Redis-backed auth checks with and without the
+client-side cache.
+
+Runs against the Redis at ``REDIS_URL`` (``make deps-up`` starts the one in
+``local-deps.yml``) because the point is to measure the avoided network
+round trips; skipped when it is not reachable.
+"""
+import asyncio
+
+import pytest
+from redis.exceptions import ConnectionError
+
+import app.core.redis as app_redis
+from app.core.security import get_token_epoch, is_user_blocked
+
+
+@pytest.fixture(name="fake_redis", params=["no_cache", "client_cache"])
+def local_redis_fixture(request):
+    """Real Redis client, optionally fronted by the client-side cache."""
+    loop = asyncio.new_event_loop()
+    client = app_redis.create_redis_client()
+    try:
+        loop.run_until_complete(client.ping())
+    except ConnectionError:
+        loop.run_until_complete(client.aclose(close_connection_pool=True))
+        loop.close()
+        pytest.skip("local Redis not reachable (make deps-up)")
+
+    app_redis.redis_client = client
+    if request.param == "client_cache":
+        app_redis.client_cache = app_redis.ClientSideCache(client)
+        loop.run_until_complete(app_redis.client_cache.start())
+    yield loop
+    loop.run_until_complete(app_redis.close_redis_client())
+    loop.close()
+
+
+def test_auth_redis_checks(benchmark, fake_redis):
+    """Token epoch and block lookups done for authenticated requests."""
+    loop = fake_redis
+
+    async def check() -> bool:
+        epoch = await get_token_epoch(-1)
+        blocked, _ = await is_user_blocked("bench")
+        return epoch > 0 or blocked
+
+    assert benchmark(lambda: loop.run_until_complete(check())) is False
@@ -0,0 +1,54 @@
+"""Micro-benchmarks for JWT and password hashing primitives.
+
+Run with ``make bench-micro``; results are saved per commit under
+``.benchmarks/`` so slowdowns from code or dependency changes show up in
+``make bench-micro-compare``.
+"""
+from app.core.security import (
+    create_access_token,
+    create_refresh_token,
+    decode_token,
+    get_password_hash,
+    verify_password,
+)
+from app.schemas.token import TokenPayload
+from benchmarks.micro.conftest import PASSWORD
+
+
+def test_create_access_token(benchmark):
+    token = benchmark(create_access_token, subject=1)
+    assert token.count(".") == 2
+
+
+def test_create_refresh_token(benchmark):
+    token = benchmark(create_refresh_token, subject=1)
+    assert token.count(".") == 2
+
+
+def test_decode_access_token(benchmark, access_token: str):
+    """Token verification exactly as called by deps.get_current_user."""
+    payload = benchmark(decode_token, access_token)
+    assert "sub" in payload
+
+
+def test_token_payload_validation(benchmark, access_token: str):
+    payload = decode_token(access_token)
+    token_data = benchmark(lambda: TokenPayload(**payload))
+    assert token_data.sub is not None
+
+
+def test_get_password_hash(benchmark):
+    # Argon2 is deliberately slow; a few rounds are enough for a stable mean.
+    hashed = benchmark.pedantic(
+        get_password_hash, args=(PASSWORD,), rounds=5, iterations=1
+    )
+    assert hashed.startswith("$argon2id$")
+
+
+def test_verify_password(benchmark, user):
+    assert benchmark.pedantic(
+        verify_password,
+        args=(PASSWORD, user.hashed_password),
+        rounds=5,
+        iterations=1,
+    )
@@ -0,0 +1,146 @@
+"""Refresh-token rotation churn benchmark.
+
+Drives ``start_refresh_family`` and ``rotate_refresh_token`` directly
+against the Redis at ``REDIS_URL`` (``make deps-up``), so millions of
+rotations can be measured without the HTTP and password-hashing overhead.
+A fraction of the refreshes replays an already rotated token to check
+that every reuse is detected and revokes its family.
+
+Usage:
+    python -m benchmarks.refresh_churn --refreshes 1000000 --families 1000
+    python -m benchmarks.refresh_churn --reuse-rate 0.01 --output churn.json
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+
+import app.core.redis as app_redis
+from app.core.security import rotate_refresh_token, start_refresh_family
+from benchmarks.report import summarize
+
+
+async def _worker(
+    sessions: list[dict],
+    remaining: list[int],
+    rng: random.Random,
+    reuse_rate: float,
+    latencies: list[float],
+    counts: dict[str, int],
+) -> None:
+    while remaining[0] > 0:
+        session = rng.choice(sessions)
+        if session["busy"]:
+            continue
+        remaining[0] -= 1
+        session["busy"] = True
+        replay = session["previous"] is not None and rng.random() < reuse_rate
+        jti = session["previous"] if replay else session["jti"]
+        new_jti = uuid.uuid4().hex
+        start = time.perf_counter()
+        status, _ = await rotate_refresh_token(
+            session["user_id"], session["family"], jti, new_jti, 0
+        )
+        latencies.append(time.perf_counter() - start)
+        counts[status] = counts.get(status, 0) + 1
+        if replay:
+            counts["replayed"] += 1
+        if status == "ok":
+            session["previous"], session["jti"] = session["jti"], new_jti
+        else:
+            # Family revoked: log in again
+            session["family"], session["jti"] = await start_refresh_family(
+                session["user_id"]
+            )
+            session["previous"] = None
+        session["busy"] = False
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Run the churn benchmark and return its summary."""
+    await app_redis.init_redis_client()
+    rng = random.Random(args.seed)
+    sessions = []
+    for index in range(args.families):
+        user_id = -(index + 1)
+        family, jti = await start_refresh_family(user_id)
+        sessions.append(
+            {
+                "user_id": user_id,
+                "family": family,
+                "jti": jti,
+                "previous": None,
+                "busy": False,
+            }
+        )
+
+    remaining = [args.refreshes]
+    latencies: list[float] = []
+    counts = {"replayed": 0}
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(
+            *(
+                _worker(
+                    sessions,
+                    remaining,
+                    random.Random(rng.random()),
+                    args.reuse_rate,
+                    latencies,
+                    counts,
+                )
+                for _ in range(args.concurrency)
+            )
+        )
+        elapsed = time.perf_counter() - start
+    finally:
+        client = await app_redis.get_redis_client()
+        await client.delete(
+            *(f"refresh_family:{session['family']}" for session in sessions)
+        )
+        await app_redis.close_redis_client()
+
+    # Detected replays are the expected outcome, not errors
+    expected = counts.get("ok", 0) + counts.get("reused", 0)
+    summary = summarize(latencies, len(latencies) - expected, elapsed)
+    summary["outcomes"] = counts
+    summary["undetected_reuse"] = counts["replayed"] - counts.get("reused", 0)
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--refreshes", type=int, default=100_000)
+    parser.add_argument("--families", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument(
+        "--reuse-rate",
+        type=float,
+        default=0.001,
+        help="Fraction of refreshes that replay the previous token",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+    if args.families < args.concurrency:
+        # Every worker needs an idle family to rotate
+        parser.error("--families must be at least --concurrency")
+
+    summary = asyncio.run(run(args))
+    print(
+        f"{summary['rps']:.1f} rps  p50 {summary['p50_ms']:.2f} ms  "
+        f"p99 {summary['p99_ms']:.2f} ms  outcomes {summary['outcomes']}"
+    )
+    if args.output:
+        args.output.write_text(json.dumps(summary, indent=2) + "\n")
+    if summary["undetected_reuse"]:
+        print(f"UNDETECTED REUSE {summary['undetected_reuse']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,87 @@
+"""Latency statistics and baseline comparison for benchmark results."""
+import math
+from typing import Any
+
+# Metrics where a larger value is a regression.
+LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "error_rate")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Get a percentile using the nearest-rank method.
+
+    Args:
+        sorted_values: Values sorted in ascending order
+        q: Percentile between 0 and 100
+
+    Returns:
+        The percentile value, or 0.0 for an empty sample
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(
+    latencies: list[float], errors: int, elapsed: float
+) -> dict[str, float]:
+    """
+    Summarize one scenario run.
+
+    Args:
+        latencies: Per-request latencies in seconds
+        errors: Number of failed requests
+        elapsed: Wall-clock duration of the run in seconds
+
+    Returns:
+        Dictionary with request counts, RPS, percentiles and error rate
+    """
+    values = sorted(latencies)
+    count = len(values)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "rps": count / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / count * 1000 if count else 0.0,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+    }
+
+
+def compare(
+    current: dict[str, Any], baseline: dict[str, Any], tolerance: float
+) -> list[str]:
+    """
+    Compare a result file against a stored baseline.
+
+    Args:
+        current: Results of this run
+        baseline: Previously stored results
+        tolerance: Allowed relative degradation (0.1 = 10%)
+
+    Returns:
+        Human readable descriptions of every regression found
+    """
+    regressions = []
+    for name, stats in current["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        for metric in LOWER_IS_BETTER:
+            if metric == "error_rate":
+                worse = stats[metric] > base[metric] + tolerance / 10
+            else:
+                worse = stats[metric] > base[metric] * (1 + tolerance)
+            if worse:
+                regressions.append(
+                    f"{name}: {metric} {base[metric]:.3f} -> "
+                    f"{stats[metric]:.3f}"
+                )
+        if stats["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: rps {base['rps']:.1f} -> {stats['rps']:.1f}"
+            )
+    return regressions
@@ -0,0 +1,126 @@
+"""Encode/decode throughput of the item list in JSON, MessagePack and Arrow.
+
+Serializes a page of ``Item`` rows the way ``GET /api/items/`` does for
+each format of ``app.api.formats`` (validation through ``ItemPublic``
+included), then decodes it the way a client would: ``json.loads``,
+``msgpack.unpackb`` with native timestamps, or reading the Arrow stream
+into a table. Formats whose package is not installed are skipped.
+
+Usage:
+    python -m benchmarks.response_formats
+    python -m benchmarks.response_formats --items 100 --output formats.json
+"""
+import argparse
+import json
+import statistics
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from app.api import formats
+from app.models.item import Item, ItemPublic
+
+
+def items(count: int) -> list[Item]:
+    """Rows as the ORM returns them."""
+    start = datetime(2026, 1, 1)
+    return [
+        Item(
+            id=n,
+            title=f"Item {n}",
+            description=f"Description of item {n}" if n % 3 else None,
+            owner_id=1,
+            created_at=start + timedelta(seconds=n),
+            updated_at=start + timedelta(seconds=n, microseconds=n),
+        )
+        for n in range(1, count + 1)
+    ]
+
+
+def _codecs() -> dict:
+    """Encoder and client-side decoder of every available format."""
+    adapter = TypeAdapter(list[ItemPublic])
+    codecs = {
+        # What FastAPI does with the route's response model
+        "json": (
+            lambda rows: adapter.dump_json(
+                adapter.validate_python(rows, from_attributes=True)
+            ),
+            json.loads,
+        ),
+    }
+    if formats.msgpack is not None:
+        codecs["msgpack"] = (
+            lambda rows: formats.encode_msgpack(rows, list[ItemPublic]),
+            lambda body: formats.msgpack.unpackb(body, timestamp=3),
+        )
+    if formats.pa is not None:
+        codecs["arrow"] = (
+            lambda rows: formats.encode_arrow(rows, ItemPublic),
+            lambda body: formats.pa.ipc.open_stream(body).read_all(),
+        )
+    return codecs
+
+
+def _median_us(function, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def run(args: argparse.Namespace) -> dict:
+    """Time encoding and decoding of the page in every format."""
+    rows = items(args.items)
+    results = {"items": args.items, "formats": {}}
+    for name, (encode, decode) in _codecs().items():
+        body = encode(rows)
+        encode_us = _median_us(lambda: encode(rows), args.repeat)
+        decode_us = _median_us(lambda: decode(body), args.repeat)
+        results["formats"][name] = {
+            "bytes": len(body),
+            "encode_us": encode_us,
+            "decode_us": decode_us,
+            "encode_rows_per_s": args.items / encode_us * 1e6,
+            "decode_rows_per_s": args.items / decode_us * 1e6,
+        }
+    return results
+
+
+def _print(results: dict) -> None:
+    print(f"{results['items']} items per page")
+    print(
+        f"{'format':<9}{'bytes':>9}{'encode µs':>11}{'rows/s':>12}"
+        f"{'decode µs':>11}{'rows/s':>12}"
+    )
+    for name, row in results["formats"].items():
+        print(
+            f"{name:<9}{row['bytes']:>9}{row['encode_us']:>11.0f}"
+            f"{row['encode_rows_per_s']:>12.0f}{row['decode_us']:>11.0f}"
+            f"{row['decode_rows_per_s']:>12.0f}"
+        )
+    missing = {"msgpack", "arrow"} - results["formats"].keys()
+    if missing:
+        print(f"Skipped (package not installed): {', '.join(sorted(missing))}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    _print(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,138 @@
+"""Scripted load-testing scenarios for the API."""
+import asyncio
+import random
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass, field
+
+import httpx
+
+BENCH_PASSWORD = "benchpassword123"
+
+
+@dataclass
+class BenchUser:
+    """A user account driven by the benchmark."""
+
+    username: str
+    password: str = BENCH_PASSWORD
+    access_token: str | None = None
+    refresh_token: str | None = None
+    item_ids: list[int] = field(default_factory=list)
+    # Refresh tokens are single use, so one user's refreshes must not
+    # overlap or they would be flagged as token reuse.
+    refresh_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+    @property
+    def headers(self) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+
+@dataclass
+class BenchState:
+    """Seeded accounts and data shared by all scenarios."""
+
+    users: list[BenchUser]
+    page_user: BenchUser
+    page_items: int
+    admin: BenchUser | None = None
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """One scripted operation and the statuses that count as success."""
+
+    name: str
+    run: Callable[
+        [httpx.AsyncClient, BenchState, random.Random],
+        Awaitable[httpx.Response],
+    ]
+    expected: frozenset[int] = frozenset({200})
+    needs_admin: bool = False
+
+
+async def login_storm(
+    client: httpx.AsyncClient, state: BenchState, rng: random.Random
+) -> httpx.Response:
+    """Log in as a random user (Argon2 verification on every call)."""
+    user = rng.choice(state.users)
+    return await client.post(
+        "/api/auth/login",
+        data={"username": user.username, "password": user.password},
+    )
+
+
+async def item_crud(
+    client: httpx.AsyncClient, state: BenchState, rng: random.Random
+) -> httpx.Response:
+    """Run a read-heavy mix of item list, read, create, update and delete."""
+    user = rng.choice(state.users)
+    roll = rng.random()
+    if roll < 0.15 or not user.item_ids:
+        response = await client.post(
+            "/api/items/",
+            json={"title": f"bench-{rng.random():.8f}"},
+            headers=user.headers,
+        )
+        if response.status_code == 201:
+            user.item_ids.append(response.json()["id"])
+        return response
+    if roll < 0.65:
+        return await client.get("/api/items/", headers=user.headers)
+    if roll < 0.85:
+        item_id = rng.choice(user.item_ids)
+        return await client.get(f"/api/items/{item_id}", headers=user.headers)
+    if roll < 0.95:
+        item_id = rng.choice(user.item_ids)
+        return await client.patch(
+            f"/api/items/{item_id}",
+            json={"description": f"updated {rng.random():.8f}"},
+            headers=user.headers,
+        )
+    item_id = user.item_ids.pop(rng.randrange(len(user.item_ids)))
+    return await client.delete(f"/api/items/{item_id}", headers=user.headers)
+
+
+async def deep_pagination(
+    client: httpx.AsyncClient, state: BenchState, rng: random.Random
+) -> httpx.Response:
+    """Read a random page of a large item collection."""
+    offset = rng.randrange(0, max(state.page_items, 1), 100)
+    return await client.get(
+        f"/api/items/?offset={offset}&limit=100",
+        headers=state.page_user.headers,
+    )
+
+
+async def refresh_churn(
+    client: httpx.AsyncClient, state: BenchState, rng: random.Random
+) -> httpx.Response:
+    """Exchange a refresh token and keep the newly issued pair."""
+    user = rng.choice(state.users)
+    async with user.refresh_lock:
+        response = await client.post(
+            "/api/auth/refresh", json={"refresh_token": user.refresh_token}
+        )
+        if response.status_code == 200:
+            tokens = response.json()
+            user.access_token = tokens["access_token"]
+            user.refresh_token = tokens["refresh_token"]
+    return response
+
+
+async def blocked_listing(
+    client: httpx.AsyncClient, state: BenchState, rng: random.Random
+) -> httpx.Response:
+    """List temporarily blocked accounts as a superuser."""
+    return await client.get("/api/users/blocked", headers=state.admin.headers)
+
+
+SCENARIOS: dict[str, Scenario] = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("login_storm", login_storm),
+        Scenario("item_crud", item_crud, frozenset({200, 201, 204})),
+        Scenario("deep_pagination", deep_pagination),
+        Scenario("refresh_churn", refresh_churn),
+        Scenario("blocked_listing", blocked_listing, needs_admin=True),
+    )
+}
@@ -0,0 +1,153 @@
+"""Multi-core scaling benchmark of the production server.
+
+Starts ``python -m app.server`` with 1, 2, 4 ... N workers against a
+throwaway SQLite database and the Redis at ``REDIS_URL``, waits for
+``/ready`` and runs the CPU-bound ``login_storm`` scenario (Argon2) from
+``benchmarks.scenarios`` against it, reporting RPS and speedup over a
+single worker.
+
+Usage:
+    python -m benchmarks.server_scaling
+    python -m benchmarks.server_scaling --workers 1,2,4,8 --requests 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app.core.cpus import available_cpus
+from benchmarks.loadtest import run_scenario, seed
+from benchmarks.scenarios import SCENARIOS
+
+ROOT = Path(__file__).parent.parent
+
+
+def _worker_counts(limit: int) -> list[int]:
+    counts = [1]
+    while counts[-1] * 2 <= limit:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != limit:
+        counts.append(limit)
+    return counts
+
+
+def _create_database(path: Path) -> None:
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from sqlmodel import SQLModel, create_engine\n"
+            "import app.models.item, app.models.user\n"
+            f"SQLModel.metadata.create_all(create_engine('sqlite:///{path}'))",
+        ],
+        cwd=ROOT,
+        check=True,
+    )
+
+
+async def _wait_until_ready(client: httpx.AsyncClient, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready")
+
+
+async def measure(workers: int, args: argparse.Namespace) -> dict:
+    """Run the login scenario against a server with ``workers`` workers."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = Path(tmpdir) / "scaling.db"
+        _create_database(db_path)
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "DEBUG": "False",
+            "SERVER_MAX_REQUESTS": "0",
+        }
+        server = subprocess.Popen(
+            [
+                sys.executable, "-m", "app.server", "--host", "127.0.0.1",
+                "--port", str(args.port), "--workers", str(workers),
+            ],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            async with httpx.AsyncClient(
+                base_url=f"http://127.0.0.1:{args.port}", timeout=60.0
+            ) as client:
+                await _wait_until_ready(client, timeout=30)
+                state = await seed(
+                    client, args.users, page_items=0, blocked=0, admin=None
+                )
+                scenario = SCENARIOS["login_storm"]
+                return await run_scenario(
+                    client,
+                    state,
+                    scenario,
+                    args.requests,
+                    args.concurrency or 4 * workers,
+                    seed_value=42,
+                )
+        finally:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=60)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    """Measure every worker count and compute the speedups."""
+    if args.workers:
+        counts = [int(count) for count in args.workers.split(",")]
+    else:
+        counts = _worker_counts(available_cpus())
+    results = {}
+    for workers in counts:
+        summary = await measure(workers, args)
+        baseline = results.get(1, summary)["rps"] or 1.0
+        summary["speedup"] = summary["rps"] / baseline
+        results[workers] = summary
+        print(
+            f"{workers:>3} workers: {summary['rps']:8.1f} rps  "
+            f"p50 {summary['p50_ms']:7.2f} ms  "
+            f"p99 {summary['p99_ms']:7.2f} ms  "
+            f"x{summary['speedup']:.2f}"
+        )
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--workers", help="Comma separated worker counts (default: 1..CPUs)"
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument(
+        "--concurrency", type=int, help="Default: 4 per worker"
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
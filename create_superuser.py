@@ -1,7 +1,7 @@
 """Script para crear un superusuario."""
 
-from sqlmodel import Session
-from app.core.database import engine
+from sqlmodel import Session, select
+from app.core.database import get_engine
 from app.core.security import get_password_hash
 from app.models.user import User
 
@@ -13,13 +13,13 @@ def create_superuser(
     full_name: str = "Administrator",
 ) -> None:
     """Create a superuser in the database."""
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
         # Check if user already exists
-        existing = (
-            session.query(User)
-            .filter((User.email == email) | (User.username == username))
-            .first()
-        )
+        existing = session.exec(
+            select(User).where(
+                (User.email == email) | (User.username == username)
+            )
+        ).first()
 
         if existing:
             print(f"User with email '{email}' or username '{username}' already exists!")
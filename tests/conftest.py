@@ -1,15 +1,56 @@
 """Pytest configuration and fixtures for testing."""
 import pytest
+import redis
 from fastapi.testclient import TestClient
 from sqlmodel import Session, SQLModel, create_engine
 from sqlmodel.pool import StaticPool
 
 from app.main import app
+from app.core.circuit_breaker import fallback_store
+from app.core.config import settings
 from app.core.database import get_session
+from app.core.metrics import instrument_engine
+from app.core.query_budget import install_query_budget
+from app.core.tracing import install_tracing
 from app.core.security import get_password_hash
 from app.models.user import User
 
 
+@pytest.fixture(autouse=True)
+def disable_warmup(monkeypatch):
+    """Skip the background warm-up, which tests/test_warmup.py covers."""
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", False)
+
+
+@pytest.fixture(autouse=True)
+def inline_jobs(monkeypatch):
+    """Run write-behind jobs inline; tests/test_jobs.py covers the queues."""
+    monkeypatch.setattr(settings, "JOBS_BACKEND", "inline")
+
+
+@pytest.fixture(autouse=True)
+def memory_change_feed(monkeypatch):
+    """Deliver change events in-process; test_changefeed.py covers more."""
+    monkeypatch.setattr(settings, "CHANGE_FEED_BACKEND", "memory")
+
+
+@pytest.fixture(autouse=True)
+def fresh_user_status():
+    """Forget cached user statuses: every test database reuses the IDs."""
+    yield
+    client = redis.Redis.from_url(settings.REDIS_URL)
+    try:
+        keys = list(client.scan_iter("user_status:*"))
+        if keys:
+            client.delete(*keys)
+    except redis.RedisError:
+        pass
+    finally:
+        client.close()
+    for key, _, _ in fallback_store.scan("user_status:"):
+        fallback_store.delete(key)
+
+
 @pytest.fixture(name="session")
 def session_fixture():
     """Create a test database session."""
@@ -19,6 +60,9 @@ def session_fixture():
         poolclass=StaticPool,
     )
     SQLModel.metadata.create_all(engine)
+    instrument_engine(engine)
+    install_query_budget(engine)
+    install_tracing(engine)
     with Session(engine) as session:
         yield session
 
@@ -30,8 +74,8 @@ def client_fixture(session: Session):
         return session
 
     app.dependency_overrides[get_session] = get_session_override
-    client = TestClient(app)
-    yield client
+    with TestClient(app) as client:
+        yield client
     app.dependency_overrides.clear()
 
 
@@ -0,0 +1,33 @@
+"""Pytest plugin asserting SQL statement counts for every API request.
+
+Every request issued by a test runs with ``QUERY_BUDGET_MODE=raise`` and
+is checked against its route budget (``@query_budget`` or
+``QUERY_BUDGET_DEFAULT``), so a new N+1 pattern fails the test that
+exercises it.
+"""
+import pytest
+
+from app.core.config import settings
+from app.core.query_budget import (
+    QueryReport,
+    add_report_listener,
+    remove_report_listener,
+)
+
+
+@pytest.fixture(name="query_reports", autouse=True)
+def query_reports_fixture(monkeypatch) -> list[QueryReport]:
+    """Collect query reports and fail the test on any budget violation."""
+    monkeypatch.setattr(settings, "QUERY_BUDGET_MODE", "raise")
+    reports: list[QueryReport] = []
+    add_report_listener(reports.append)
+    yield reports
+    remove_report_listener(reports.append)
+
+    violations = [
+        f"{r.method} {r.route}: {r.count} statements (budget {r.budget})"
+        for r in reports
+        if r.over_budget or r.repeated
+    ]
+    if violations:
+        pytest.fail("Query budget violations:\n" + "\n".join(violations))
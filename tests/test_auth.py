@@ -1,7 +1,12 @@
 """Tests for authentication endpoints."""
+from datetime import timedelta
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlmodel import Session
 
+from app.core.config import settings
+from app.core.security import create_access_token
 from app.models.user import User
 
 
@@ -85,3 +90,217 @@ def test_get_current_user_invalid_token(client: TestClient):
         headers={"Authorization": "Bearer invalid_token"},
     )
     assert response.status_code == 401
+
+
+def test_logout_revokes_only_this_session(
+    client: TestClient, test_user: User
+):
+    """Test that logout ends the caller's session and keeps the others."""
+    login_data = {"username": "testuser", "password": "testpassword123"}
+    first = client.post("/api/auth/login", data=login_data).json()
+    second = client.post("/api/auth/login", data=login_data).json()
+
+    response = client.post(
+        "/api/auth/logout",
+        headers={"Authorization": f"Bearer {first['access_token']}"},
+    )
+    assert response.status_code == 200
+
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": first["refresh_token"]}
+    )
+    assert response.status_code == 401
+    response = client.get(
+        "/api/users/me",
+        headers={"Authorization": f"Bearer {second['access_token']}"},
+    )
+    assert response.status_code == 200
+
+    # Access tokens issued by a refresh still name their session
+    refreshed = client.post(
+        "/api/auth/refresh", json={"refresh_token": second["refresh_token"]}
+    ).json()
+    response = client.post(
+        "/api/auth/logout",
+        headers={"Authorization": f"Bearer {refreshed['access_token']}"},
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/auth/refresh",
+        json={"refresh_token": refreshed["refresh_token"]},
+    )
+    assert response.status_code == 401
+
+
+def test_refresh_rejects_inactive_user(
+    client: TestClient,
+    session: Session,
+    test_user: User,
+    superuser_token_headers: dict,
+):
+    """Test that refresh checks the user's status, cached in Redis."""
+    login_data = {"username": "testuser", "password": "testpassword123"}
+    tokens = client.post("/api/auth/login", data=login_data).json()
+
+    # Deactivated directly in the database: read on the first cache miss
+    test_user.is_active = False
+    session.add(test_user)
+    session.commit()
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Inactive user"
+
+    # Reactivating through the API updates the cached status
+    response = client.patch(
+        f"/api/users/{test_user.id}",
+        headers=superuser_token_headers,
+        json={"is_active": True},
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+    )
+    assert response.status_code == 200
+
+
+def test_logout_all_revokes_all_sessions(
+    client: TestClient, test_user: User
+):
+    """Test that logout-all rejects every token issued to the user."""
+    login_data = {"username": "testuser", "password": "testpassword123"}
+    first = client.post("/api/auth/login", data=login_data).json()
+    second = client.post("/api/auth/login", data=login_data).json()
+
+    response = client.post(
+        "/api/auth/logout-all",
+        headers={"Authorization": f"Bearer {first['access_token']}"},
+    )
+    assert response.status_code == 200
+
+    for tokens in (first, second):
+        response = client.get(
+            "/api/users/me",
+            headers={"Authorization": f"Bearer {tokens['access_token']}"},
+        )
+        assert response.status_code == 401
+        response = client.post(
+            "/api/auth/refresh",
+            json={"refresh_token": tokens["refresh_token"]},
+        )
+        assert response.status_code == 401
+
+    # A new login is issued in the new epoch and works again
+    tokens = client.post("/api/auth/login", data=login_data).json()
+    response = client.get(
+        "/api/users/me",
+        headers={"Authorization": f"Bearer {tokens['access_token']}"},
+    )
+    assert response.status_code == 200
+
+
+def test_refresh_rotation_detects_reuse(client: TestClient, test_user: User):
+    """Test that replaying a rotated refresh token revokes the session."""
+    login_data = {"username": "testuser", "password": "testpassword123"}
+    tokens = client.post("/api/auth/login", data=login_data).json()
+    original = tokens["refresh_token"]
+
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": original}
+    )
+    assert response.status_code == 200
+    rotated = response.json()["refresh_token"]
+    assert rotated != original
+
+    # Replaying the old token is detected and revokes the family...
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": original}
+    )
+    assert response.status_code == 401
+    assert "reuse" in response.json()["detail"]
+
+    # ...so the legitimately rotated token no longer works either
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": rotated}
+    )
+    assert response.status_code == 401
+
+    # Other sessions of the same user are unaffected
+    other = client.post("/api/auth/login", data=login_data).json()
+    response = client.post(
+        "/api/auth/refresh", json={"refresh_token": other["refresh_token"]}
+    )
+    assert response.status_code == 200
+
+
+def test_introspect_batch(
+    client: TestClient,
+    test_user: User,
+    superuser_token_headers: dict,
+    user_token_headers: dict,
+):
+    """Test batch introspection of valid, revoked and invalid tokens."""
+    valid = user_token_headers["Authorization"].split()[1]
+    login_data = {"username": "testuser", "password": "testpassword123"}
+    tokens = client.post("/api/auth/login", data=login_data).json()
+    expired = create_access_token(
+        subject=test_user.id, expires_delta=timedelta(seconds=-1)
+    )
+
+    response = client.post(
+        "/api/auth/introspect",
+        headers=superuser_token_headers,
+        json={
+            "tokens": [
+                valid,
+                "not-a-jwt",
+                valid,
+                expired,
+                tokens["refresh_token"],
+            ]
+        },
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 5
+    assert results[0]["active"] is True
+    assert results[0]["username"] == "testuser"
+    assert results[2] == results[0]
+    assert [result["reason"] for result in results[1::2]] == [
+        "invalid", "expired"
+    ]
+    # Refresh tokens are not accepted as access tokens
+    assert results[4]["reason"] == "invalid"
+
+    # Logging out everywhere bumps the epoch, which the batch MGET picks up
+    client.post("/api/auth/logout-all", headers=user_token_headers)
+    response = client.post(
+        "/api/auth/introspect",
+        headers=superuser_token_headers,
+        json={"tokens": [valid]},
+    )
+    assert response.json()["results"][0]["reason"] == "revoked"
+
+
+def test_introspect_requires_superuser_and_limits_batch(
+    client: TestClient,
+    user_token_headers: dict,
+    superuser_token_headers: dict,
+    monkeypatch,
+):
+    """Test that introspection is restricted and batches are bounded."""
+    response = client.post(
+        "/api/auth/introspect",
+        headers=user_token_headers,
+        json={"tokens": ["x"]},
+    )
+    assert response.status_code == 403
+
+    monkeypatch.setattr(settings, "INTROSPECTION_MAX_TOKENS", 2)
+    response = client.post(
+        "/api/auth/introspect",
+        headers=superuser_token_headers,
+        json={"tokens": ["a", "b", "c"]},
+    )
+    assert response.status_code == 400
@@ -0,0 +1,309 @@
+"""Tests for the item change feed."""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+
+import pytest
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+from sqlmodel import Session, SQLModel
+
+from app.main import app
+from app.core import changefeed
+from app.core.changefeed import ChangeHub, event_stream
+from app.core.config import settings
+from app.core.database import get_session
+from app.core.security import get_password_hash
+from app.core.redis import create_redis_client
+from app.models.item import Item
+from app.models.user import User
+
+# The largest item the API accepts, at 4 bytes of UTF-8 per character
+LARGEST_ITEM = {"title": "🚀" * 255, "description": "🚀" * 1000}
+
+
+def _event(owner_id: int, n: int = 0) -> str:
+    return json.dumps({"type": "created", "owner_id": owner_id, "n": n})
+
+
+def test_hub_fans_out_by_owner_and_drops_slow_consumers():
+    """Test per-user delivery and the bounded subscriber queues."""
+
+    async def scenario():
+        hub = ChangeHub(queue_size=2)
+        first, second = hub.subscribe(1), hub.subscribe(1)
+        other = hub.subscribe(2)
+
+        assert hub.dispatch(_event(1)) == 2
+        assert hub.dispatch("not json") == 0
+        assert other.queue.empty()
+
+        second.queue.get_nowait()  # Only the second one keeps up
+        hub.dispatch(_event(1, 1))
+        assert hub.dispatch(_event(1, 2)) == 1
+        assert first.overflowed and not second.overflowed
+        assert first.queue.get_nowait() is None
+        assert hub.count == 2
+
+        hub.unsubscribe(first)  # Already gone: harmless
+        hub.unsubscribe(second)
+        hub.unsubscribe(other)
+        assert hub.count == 0
+
+    asyncio.run(scenario())
+
+
+def test_event_stream_framing(monkeypatch):
+    """Test the SSE frames: events, keep-alives and the overflow notice."""
+    monkeypatch.setattr(settings, "CHANGE_FEED_HEARTBEAT_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "CHANGE_FEED_QUEUE_SIZE", 1)
+
+    async def scenario():
+        feed = changefeed.ChangeFeed()
+        await feed.start()
+        monkeypatch.setattr(changefeed, "_feed", feed)
+        stream = event_stream(7)
+        frames = [await anext(stream)]
+        frames.append(await anext(stream))  # Idle
+        feed.hub.dispatch(_event(7))
+        frames.append(await anext(stream))
+        feed.hub.dispatch(_event(7, 1))
+        feed.hub.dispatch(_event(7, 2))  # Queue full
+        frames.extend([frame async for frame in stream])
+        return frames, feed.hub.count
+
+    frames, count = asyncio.run(scenario())
+    assert frames == [
+        "retry: 1000\n\n",
+        ": keep-alive\n\n",
+        f"data: {_event(7)}\n\n",
+        "event: overflow\ndata: {}\n\n",
+    ]
+    assert count == 0
+
+
+def test_item_routes_publish_after_commit(
+    client: TestClient, user_token_headers: dict, test_user
+):
+    """Test the events of creating, updating and deleting an item."""
+    feed = changefeed._feed
+    subscription = client.portal.call(feed.hub.subscribe, test_user.id)
+
+    def next_event() -> dict:
+        return json.loads(client.portal.call(subscription.queue.get))
+
+    response = client.post(
+        "/api/items/", json={"title": "Live"}, headers=user_token_headers
+    )
+    item_id = response.json()["id"]
+    event = next_event()
+    assert event["type"] == "created"
+    assert event["owner_id"] == test_user.id
+    assert event["item"] == response.json()
+
+    client.patch(
+        f"/api/items/{item_id}",
+        json={"title": "Edited"},
+        headers=user_token_headers,
+    )
+    event = next_event()
+    assert (event["type"], event["item"]["title"]) == ("updated", "Edited")
+
+    client.delete(f"/api/items/{item_id}", headers=user_token_headers)
+    assert next_event() == {
+        "type": "deleted",
+        "owner_id": test_user.id,
+        "item": {"id": item_id},
+    }
+    assert subscription.queue.empty()
+
+
+def test_rolled_back_changes_are_not_published(
+    client: TestClient, session: Session, test_user
+):
+    """Test that events are discarded with their transaction."""
+    feed = changefeed._feed
+    subscription = client.portal.call(feed.hub.subscribe, test_user.id)
+
+    item = Item(title="Draft", owner_id=test_user.id)
+    session.add(item)
+    session.flush()
+    changefeed.publish_item_event(session, "created", item)
+    session.rollback()
+    session.commit()
+    time.sleep(0.05)
+
+    assert client.portal.call(subscription.queue.empty)
+
+
+def test_item_events_fit_in_a_notification(
+    client: TestClient, user_token_headers: dict, test_user, monkeypatch
+):
+    """Test that events are unescaped and only the id when too large."""
+    feed = changefeed._feed
+    subscription = client.portal.call(feed.hub.subscribe, test_user.id)
+
+    def next_payload() -> str:
+        return client.portal.call(subscription.queue.get)
+
+    response = client.post(
+        "/api/items/", json=LARGEST_ITEM, headers=user_token_headers
+    )
+    assert response.status_code == 201
+    payload = next_payload()
+    assert len(payload.encode()) <= changefeed.MAX_PAYLOAD_BYTES
+    assert json.loads(payload)["item"] == response.json()
+
+    monkeypatch.setattr(changefeed, "MAX_PAYLOAD_BYTES", 1000)
+    response = client.patch(
+        f"/api/items/{response.json()['id']}",
+        json={"title": "Café ☕"},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 200
+    assert json.loads(next_payload()) == {
+        "type": "updated",
+        "owner_id": test_user.id,
+        "item": {"id": response.json()["id"]},
+    }
+
+
+def test_event_stream_endpoint(
+    client: TestClient, user_token_headers: dict, test_user
+):
+    """Test the SSE response, ended here by stopping the feed."""
+    feed = changefeed._feed
+    payload = _event(test_user.id)
+
+    def publish_then_stop():
+        deadline = time.monotonic() + 5
+        while feed.hub.count == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        client.portal.call(feed.hub.dispatch, payload)
+        client.portal.call(feed.stop)
+
+    thread = threading.Thread(target=publish_then_stop)
+    thread.start()
+    response = client.get("/api/items/events", headers=user_token_headers)
+    thread.join()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.headers["cache-control"] == "no-cache"
+    assert response.text == f"retry: 1000\n\ndata: {payload}\n\n"
+
+    response = client.get("/api/items/events")
+    assert response.status_code == 401
+
+
+def test_redis_backend(monkeypatch):
+    """Test events crossing workers through Redis pub/sub."""
+    monkeypatch.setattr(
+        settings, "CHANGE_FEED_CHANNEL", f"test-changes:{uuid.uuid4()}"
+    )
+
+    async def scenario():
+        publisher = changefeed.RedisChangeFeed(create_redis_client())
+        listener = changefeed.RedisChangeFeed(create_redis_client())
+        await publisher.start()
+        await listener.start()
+        try:
+            await asyncio.wait_for(listener.listening.wait(), 5)
+            subscription = listener.hub.subscribe(3)
+            publisher.deliver(_event(3))
+            return await asyncio.wait_for(subscription.queue.get(), 5)
+        finally:
+            for feed in (publisher, listener):
+                await feed.stop()
+                await feed._client.aclose()
+
+    assert asyncio.run(scenario()) == _event(3)
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(
+    "MIGRATION_TEST_DATABASE_URL" not in os.environ,
+    reason="set MIGRATION_TEST_DATABASE_URL to a scratch PostgreSQL database",
+)
+def test_postgres_backend(monkeypatch):
+    """Test NOTIFY sent on commit only, received by LISTEN."""
+    monkeypatch.setattr(
+        settings, "CHANGE_FEED_CHANNEL", f"test_changes_{uuid.uuid4().hex}"
+    )
+    engine = sa.create_engine(os.environ["MIGRATION_TEST_DATABASE_URL"])
+
+    async def scenario():
+        feed = changefeed.PostgresChangeFeed(engine)
+        await feed.start()
+        try:
+            await asyncio.wait_for(feed.listening.wait(), 5)
+            subscription = feed.hub.subscribe(5)
+            with Session(engine) as session:
+                feed.publish(session, _event(5, 0))
+                session.rollback()
+                feed.publish(session, _event(5, 1))
+                session.commit()
+            return await asyncio.wait_for(subscription.queue.get(), 5)
+        finally:
+            await feed.stop()
+            engine.dispose()
+
+    assert asyncio.run(scenario()) == _event(5, 1)
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(
+    "MIGRATION_TEST_DATABASE_URL" not in os.environ,
+    reason="set MIGRATION_TEST_DATABASE_URL to a scratch PostgreSQL database",
+)
+def test_postgres_backend_accepts_the_largest_item(monkeypatch):
+    """Test that a max-length emoji item is saved and its event sent."""
+    monkeypatch.setattr(settings, "CHANGE_FEED_BACKEND", "postgres")
+    monkeypatch.setattr(
+        settings, "CHANGE_FEED_CHANNEL", f"test_changes_{uuid.uuid4().hex}"
+    )
+    engine = sa.create_engine(os.environ["MIGRATION_TEST_DATABASE_URL"])
+    SQLModel.metadata.create_all(engine)
+    session = Session(engine)
+    app.dependency_overrides[get_session] = lambda: session
+    try:
+        user = User(
+            email="largest@example.com",
+            username="largest",
+            hashed_password=get_password_hash("largestpassword123"),
+        )
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        with TestClient(app) as client:
+            feed = changefeed._feed
+            assert isinstance(feed, changefeed.PostgresChangeFeed)
+            client.portal.call(
+                asyncio.wait_for, feed.listening.wait(), 5
+            )
+            subscription = client.portal.call(feed.hub.subscribe, user.id)
+            token = client.post(
+                "/api/auth/login",
+                data={"username": "largest", "password": "largestpassword123"},
+            ).json()["access_token"]
+
+            response = client.post(
+                "/api/items/",
+                json=LARGEST_ITEM,
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            assert response.status_code == 201
+            event = json.loads(
+                client.portal.call(
+                    asyncio.wait_for, subscription.queue.get(), 5
+                )
+            )
+            assert event["item"] == {"id": response.json()["id"]}
+    finally:
+        app.dependency_overrides.clear()
+        session.close()
+        SQLModel.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,137 @@
+"""Tests for Redis degradation: circuit breaker, fallback and policies."""
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.core.redis as app_redis
+from app.core.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    LocalFallbackStore,
+    fallback_store,
+    guarded,
+    redis_breaker,
+)
+from app.core.config import settings
+from app.models.user import User
+
+
+@pytest.fixture(name="redis_down")
+def redis_down_fixture(monkeypatch):
+    """Point the application at a Redis server that refuses connections."""
+    monkeypatch.setattr(settings, "REDIS_URL", "redis://localhost:1/0")
+    monkeypatch.setattr(settings, "REDIS_CLIENT_CACHE_ENABLED", False)
+    app_redis.redis_client = app_redis.create_redis_client()
+    redis_breaker.reset()
+    fallback_store.clear()
+    yield
+    redis_breaker.reset()
+    fallback_store.clear()
+
+
+def _login(client: TestClient, password: str = "testpassword123"):
+    return client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": password},
+    )
+
+
+def test_breaker_opens_and_recovers():
+    """Test the closed -> open -> half-open -> closed cycle."""
+    breaker = CircuitBreaker(failure_threshold=2, recovery_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # Only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_cancelled_calls_do_not_open_breaker():
+    """Test that cancelled guarded calls are not counted as failures."""
+    redis_breaker.reset()
+
+    async def cancel_calls(count: int) -> None:
+        calls = [
+            asyncio.create_task(
+                guarded("ping", lambda: asyncio.sleep(10), lambda: None)
+            )
+            for _ in range(count)
+        ]
+        await asyncio.sleep(0)
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+
+    asyncio.run(cancel_calls(redis_breaker.failure_threshold * 2))
+    assert redis_breaker.state == CLOSED
+    assert redis_breaker.failures == 0
+
+    # A cancelled half-open trial lets the next one through
+    redis_breaker._set_state(HALF_OPEN)
+    asyncio.run(cancel_calls(1))
+    assert redis_breaker.state == HALF_OPEN
+    assert redis_breaker.allow()
+    redis_breaker.reset()
+
+
+def test_fallback_store_expiry_and_counters():
+    """Test that local entries expire and counters keep their expiry."""
+    store = LocalFallbackStore(max_keys=2)
+    assert store.incr("login_attempts:bob", ttl=60) == 1
+    assert store.incr("login_attempts:bob", ttl=60) == 2
+    store.set("blacklist:x", "revoked", ttl=0)
+    assert store.get("blacklist:x") is None
+    store.set("a", "1", ttl=60)
+    store.set("b", "2", ttl=60)
+    assert len(store) == 2
+    assert store.get("login_attempts:bob") is None
+
+
+def test_fail_open_uses_local_store(
+    redis_down, monkeypatch, client: TestClient, test_user: User
+):
+    """Test that auth keeps working and enforcing blocks without Redis."""
+    # Sessions are not started without Redis by default
+    assert _login(client).status_code == 503
+    monkeypatch.setitem(settings.REDIS_FAILURE_POLICY, "refresh_issue", "open")
+    response = _login(client)
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert redis_breaker.failures > 0
+
+    # Logout is recorded locally and still revokes the token
+    response = client.post("/api/auth/logout-all", headers=headers)
+    assert response.status_code == 200
+    assert client.get("/api/users/me", headers=headers).status_code == 401
+
+    # Failed attempts are counted locally and still block the account
+    for _ in range(settings.MAX_LOGIN_ATTEMPTS):
+        response = _login(client, password="wrong")
+    assert response.status_code == 403
+    assert _login(client).status_code == 403
+
+
+def test_fail_closed_returns_503(
+    redis_down, monkeypatch, client: TestClient, test_user: User
+):
+    """Test that fail-closed operations are refused while Redis is down."""
+    monkeypatch.setitem(settings.REDIS_FAILURE_POLICY, "refresh_issue", "open")
+    response = _login(client)
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    monkeypatch.setitem(settings.REDIS_FAILURE_POLICY, "epoch", "closed")
+
+    response = client.get("/api/users/me", headers=headers)
+    assert response.status_code == 503
+    assert "Retry-After" in response.headers
@@ -0,0 +1,243 @@
+"""Tests for the single-flight coalescing of identical reads."""
+import asyncio
+import uuid
+
+import httpx
+import jwt
+import pytest
+from sqlmodel import Session
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.core import coalescing
+from app.core.coalescing import (
+    CoalescingMiddleware,
+    coalesced,
+    coalescing_key,
+    end_flights,
+)
+from app.core.config import settings
+from app.core.redis import create_redis_client
+from app.models.item import Item
+from app.models.user import User
+
+
+def _scope(query: bytes = b"", **headers) -> dict:
+    return {
+        "type": "http",
+        "method": "GET",
+        "path": "/things",
+        "query_string": query,
+        "headers": [
+            (name.encode(), value.encode()) for name, value in headers.items()
+        ],
+    }
+
+
+def test_coalescing_key():
+    """Test that only equivalent requests share a key."""
+    key = coalescing_key(_scope(b"a=1&b=2", authorization="Bearer x"))
+
+    assert coalescing_key(
+        _scope(b"b=2&a=1", authorization="Bearer x")
+    ) == key
+    assert coalescing_key(
+        _scope(b"a=1&b=2", authorization="Bearer y")
+    ) != key
+    assert coalescing_key(
+        _scope(b"a=1&b=2", authorization="Bearer x", accept="a/b")
+    ) != key
+    assert coalescing_key(_scope(b"a=1", authorization="Bearer x")) != key
+
+
+@pytest.fixture
+def things():
+    """A slow coalesced endpoint counting its calls."""
+    calls = []
+
+    @coalesced
+    async def read_things(request):
+        calls.append(request.query_params.get("n"))
+        await asyncio.sleep(0.05)
+        if request.query_params.get("fail") and len(calls) == 1:
+            raise RuntimeError("boom")
+        return JSONResponse({"calls": len(calls)})
+
+    async def uncoalesced(request):
+        calls.append(None)
+        await asyncio.sleep(0.05)
+        return JSONResponse({"calls": len(calls)})
+
+    routes = [
+        Route("/things", read_things),
+        Route("/other", uncoalesced),
+    ]
+    return Starlette(routes=routes), calls
+
+
+async def _get_all(middlewares, requests) -> list[httpx.Response]:
+    """Send requests concurrently, spread over the given workers."""
+    clients = [
+        httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=middleware),
+            base_url="http://test",
+        )
+        for middleware in middlewares
+    ]
+    try:
+        return await asyncio.gather(
+            *(
+                clients[n % len(clients)].get(url, headers=headers)
+                for n, (url, headers) in enumerate(requests)
+            ),
+            return_exceptions=True,
+        )
+    finally:
+        for client in clients:
+            await client.aclose()
+
+
+def test_concurrent_identical_reads_share_one_call(things):
+    """Test followers getting the leader's bytes, per credential."""
+    app, calls = things
+    middleware = CoalescingMiddleware(app, app.routes)
+    alice = {"Authorization": "Bearer alice"}
+    bob = {"Authorization": "Bearer bob"}
+
+    responses = asyncio.run(
+        _get_all(
+            [middleware],
+            [("/things?n=1", alice)] * 5
+            + [("/things?n=1", bob), ("/other", alice), ("/other", alice)],
+        )
+    )
+
+    assert [r.status_code for r in responses] == [200] * 8
+    assert len({r.content for r in responses[:5]}) == 1
+    assert calls.count("1") == 2  # One flight per credential
+    assert calls.count(None) == 2  # Not coalesced
+
+    # A flight only lasts while it runs: no caching
+    calls.clear()
+    asyncio.run(_get_all([middleware], [("/things", alice)]))
+    asyncio.run(_get_all([middleware], [("/things", alice)]))
+    assert len(calls) == 2
+
+
+def test_followers_run_themselves_when_the_leader_fails(things):
+    """Test that a failed flight is not shared."""
+    app, calls = things
+    middleware = CoalescingMiddleware(app, app.routes)
+
+    responses = asyncio.run(
+        _get_all([middleware], [("/things?fail=1", {})] * 3)
+    )
+
+    assert isinstance(responses[0], RuntimeError)
+    assert [r.status_code for r in responses[1:]] == [200, 200]
+    assert len(calls) == 3
+
+
+def test_redis_flights_span_workers(things, monkeypatch):
+    """Test workers answering with another worker's response."""
+    app, calls = things
+    monkeypatch.setattr(settings, "COALESCING_BACKEND", "redis")
+    # Unique per run, as the key is shared through Redis
+    url = f"/things?n={uuid.uuid4()}"
+
+    async def scenario():
+        client = create_redis_client()
+        workers = [
+            CoalescingMiddleware(app, app.routes, client=client)
+            for _ in range(3)
+        ]
+        try:
+            return await _get_all(workers, [(url, {})] * 6)
+        finally:
+            await client.aclose()
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 6
+    assert len(calls) == 1
+    assert {r.json()["calls"] for r in responses} == {1}
+    assert all(
+        r.headers["content-type"] == "application/json" for r in responses
+    )
+
+
+def test_followers_headers_are_their_own(things):
+    """Test that outer middlewares editing headers do not leak across."""
+    app, calls = things
+    middleware = CoalescingMiddleware(app, app.routes)
+
+    async def tagging(scope, receive, send):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"].append((b"x-tag", b"1"))
+            await send(message)
+
+        await middleware(scope, receive, send_wrapper)
+
+    responses = asyncio.run(_get_all([tagging], [("/things", {})] * 4))
+
+    assert len(calls) == 1
+    assert [r.headers.get_list("x-tag") for r in responses] == [["1"]] * 4
+
+
+def test_followers_stop_waiting_for_a_slow_leader(things, monkeypatch):
+    """Test that followers run themselves after COALESCING_WAIT_SECONDS."""
+    app, calls = things
+    monkeypatch.setattr(settings, "COALESCING_WAIT_SECONDS", 0.01)
+    middleware = CoalescingMiddleware(app, app.routes)
+
+    responses = asyncio.run(_get_all([middleware], [("/things", {})] * 2))
+
+    assert [r.status_code for r in responses] == [200, 200]
+    assert len(calls) == 2
+
+
+def test_reads_after_a_write_start_a_new_flight(things):
+    """Test that a committed write ends the user's flights."""
+    app, calls = things
+    middleware = CoalescingMiddleware(app, app.routes)
+    token = jwt.encode({"sub": "7"}, "secret")
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def scenario():
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=middleware),
+            base_url="http://test",
+        ) as client:
+            before = [
+                asyncio.create_task(client.get("/things", headers=headers))
+                for _ in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            end_flights(7)
+            after = client.get("/things", headers=headers)
+            return await asyncio.gather(*before, after)
+
+    responses = asyncio.run(scenario())
+
+    assert [r.status_code for r in responses] == [200] * 3
+    # The two reads sent before the write share one call
+    assert len(calls) == 2
+
+
+def test_committing_changes_ends_their_users_flights(
+    session: Session, test_user: User
+):
+    """Test that the Session hook bumps the generation of written users."""
+    user_id = str(test_user.id)
+    generation = coalescing._generations.get(user_id)
+
+    session.add(Item(title="Rolled back", owner_id=test_user.id))
+    session.flush()
+    session.rollback()
+    assert coalescing._generations.get(user_id) == generation
+
+    session.add(Item(title="Committed", owner_id=test_user.id))
+    session.commit()
+    assert coalescing._generations.get(user_id) != generation
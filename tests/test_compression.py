@@ -0,0 +1,136 @@
+"""Tests for response compression."""
+import gzip
+import json
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core import compression
+from app.core.compression import CompressionMiddleware, negotiate
+from app.core.config import settings
+
+PAGE = [{"id": n, "title": f"Item {n}", "owner_id": 1} for n in range(100)]
+
+
+@pytest.fixture
+def compressed_app():
+    """A small app behind the middleware, with an empty body cache."""
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware)
+
+    @app.get("/page")
+    def page():
+        return PAGE
+
+    @app.get("/small")
+    def small():
+        return {"ok": True}
+
+    @app.get("/stream")
+    def stream():
+        lines = (f"line {n}\n" * 50 for n in range(20))
+        return StreamingResponse(lines, media_type="text/plain")
+
+    @app.get("/events")
+    def events():
+        return PlainTextResponse(
+            "data: x\n\n" * 500, media_type="text/event-stream"
+        )
+
+    compression.compressed_bodies.clear()
+    yield TestClient(app)
+    compression.compressed_bodies.clear()
+
+
+def _get(client: TestClient, path: str, accept_encoding: str):
+    # Keep the raw body: httpx would otherwise decode it
+    with client.stream(
+        "GET", path, headers={"Accept-Encoding": accept_encoding}
+    ) as response:
+        return response, b"".join(response.iter_raw())
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("gzip", "gzip"),
+        ("gzip;q=0", None),
+        ("identity", None),
+        ("*", "br"),
+        ("*, br;q=0", "gzip"),
+        ("gzip, br", "br"),
+        ("br;q=1.0, gzip;q=0.5", "br"),
+        ("deflate, gzip;level=1;q=0.5", "gzip"),
+        ("", None),
+    ],
+)
+def test_negotiate(header, expected, monkeypatch):
+    """Test Accept-Encoding parsing, q-values and server preference."""
+    gzip_codec = compression.CODECS["gzip"]
+    monkeypatch.setattr(
+        compression,
+        "CODECS",
+        {"gzip": gzip_codec, "br": compression.Codec("br", None, "")},
+    )
+    codec = negotiate(header)
+    assert (codec.name if codec else None) == expected
+
+
+def test_large_json_is_gzipped(compressed_app):
+    """Test that a 100-item page is compressed and decodes back."""
+    response, raw = _get(compressed_app, "/page", "gzip, deflate")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert int(response.headers["content-length"]) == len(raw)
+    assert json.loads(gzip.decompress(raw)) == PAGE
+
+
+def test_small_and_unaccepted_responses_are_not_compressed(compressed_app):
+    """Test the size threshold, identity clients and event streams."""
+    response, _ = _get(compressed_app, "/small", "gzip")
+    assert "content-encoding" not in response.headers
+    assert response.headers["vary"] == "Accept-Encoding"
+
+    response, raw = _get(compressed_app, "/page", "identity")
+    assert "content-encoding" not in response.headers
+    assert len(raw) > settings.COMPRESSION_MIN_SIZE
+
+    response, _ = _get(compressed_app, "/events", "gzip")
+    assert "content-encoding" not in response.headers
+
+
+def test_streaming_response_is_compressed_incrementally(compressed_app):
+    """Test chunked responses without a Content-Length."""
+    response, raw = _get(compressed_app, "/stream", "gzip")
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert gzip.decompress(raw) == "".join(
+        f"line {n}\n" * 50 for n in range(20)
+    ).encode()
+
+
+def test_repeated_bodies_are_compressed_once(compressed_app, monkeypatch):
+    """Test the compressed body cache, including the threaded path."""
+    monkeypatch.setattr(settings, "COMPRESSION_THREAD_THRESHOLD", 0)
+    calls = []
+    codec = compression.CODECS["gzip"]
+    monkeypatch.setitem(
+        compression.CODECS,
+        "gzip",
+        compression.Codec(
+            "gzip",
+            lambda level: calls.append(level) or codec.factory(level),
+            codec.level_setting,
+        ),
+    )
+
+    first = _get(compressed_app, "/page", "gzip")[1]
+    second = _get(compressed_app, "/page", "gzip")[1]
+
+    assert first == second
+    assert calls == [settings.COMPRESSION_GZIP_LEVEL]
+    assert compression.compressed_bodies.hits == 1
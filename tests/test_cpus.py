@@ -0,0 +1,21 @@
+"""Tests for the count of available CPUs."""
+import os
+
+from app.core.cpus import available_cpus
+
+
+def test_available_cpus_honours_cgroup_quota(tmp_path):
+    """Test that the worker count follows cgroup v2 and v1 CPU quotas."""
+    affinity = len(os.sched_getaffinity(0))
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert available_cpus(tmp_path) == affinity
+
+    (tmp_path / "cpu.max").write_text("50000 100000\n")
+    assert available_cpus(tmp_path) == 1
+
+    (tmp_path / "cpu.max").unlink()
+    (tmp_path / "cpu").mkdir()
+    (tmp_path / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    (tmp_path / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert available_cpus(tmp_path) == affinity
@@ -0,0 +1,121 @@
+"""Tests for the negotiated binary formats of the item endpoints."""
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import formats
+from app.api.formats import ARROW, JSON, MSGPACK, negotiate_media_type
+
+OFFERS = (JSON, MSGPACK, ARROW)
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        ("", JSON),
+        ("*/*", JSON),
+        ("text/html,application/xhtml+xml,*/*;q=0.8", JSON),
+        ("application/msgpack", MSGPACK),
+        ("application/x-msgpack", MSGPACK),
+        ("application/json;q=0.5, application/msgpack", MSGPACK),
+        (f"{ARROW}, application/msgpack;q=0.9", ARROW),
+        ("application/*", JSON),
+        ("image/png", JSON),
+    ],
+)
+def test_negotiate_media_type(accept, expected):
+    """Test Accept parsing, wildcards, aliases and the JSON fallback."""
+    assert negotiate_media_type(accept, OFFERS) == expected
+
+
+def test_unavailable_formats_fall_back_to_json(
+    client: TestClient, user_token_headers: dict, monkeypatch
+):
+    """Test that a format whose package is missing is not offered."""
+    monkeypatch.setattr(formats, "msgpack", None)
+    response = client.get(
+        "/api/items/",
+        headers={**user_token_headers, "Accept": MSGPACK},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == JSON
+    assert response.headers["vary"].startswith("Accept")
+
+    response = client.post(
+        "/api/items/",
+        content=b"\x81\xa5title\xa1x",
+        headers={**user_token_headers, "Content-Type": MSGPACK},
+    )
+    assert response.status_code == 415
+
+
+def test_msgpack_round_trip(client: TestClient, user_token_headers: dict):
+    """Test MessagePack bodies in and out, with native timestamps."""
+    msgpack = pytest.importorskip("msgpack")
+    headers = {
+        **user_token_headers,
+        "Accept": MSGPACK,
+        "Content-Type": MSGPACK,
+    }
+
+    response = client.post(
+        "/api/items/",
+        content=msgpack.packb({"title": "Packed", "description": "Binary"}),
+        headers=headers,
+    )
+    assert response.status_code == 201
+    assert response.headers["content-type"] == MSGPACK
+    item = msgpack.unpackb(response.content, timestamp=3)
+    assert item["title"] == "Packed"
+    assert isinstance(item["created_at"], datetime)
+
+    response = client.patch(
+        f"/api/items/{item['id']}",
+        content=msgpack.packb({"title": "Repacked"}),
+        headers=headers,
+    )
+    assert msgpack.unpackb(response.content)["title"] == "Repacked"
+
+    response = client.get("/api/items/", headers=headers)
+    items = msgpack.unpackb(response.content, timestamp=3)
+    assert [i["title"] for i in items] == ["Repacked"]
+
+    response = client.post(
+        "/api/items/", content=msgpack.packb({"title": ""}), headers=headers
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        "/api/items/", content=b"\xc1", headers=headers
+    )
+    assert response.status_code == 400
+
+
+def test_arrow_item_list(client: TestClient, user_token_headers: dict):
+    """Test the Arrow IPC stream of the item list."""
+    pa = pytest.importorskip("pyarrow")
+    for n in range(3):
+        client.post(
+            "/api/items/",
+            json={"title": f"Item {n}"},
+            headers=user_token_headers,
+        )
+
+    response = client.get(
+        "/api/items/", headers={**user_token_headers, "Accept": ARROW}
+    )
+
+    assert response.headers["content-type"] == ARROW
+    table = pa.ipc.open_stream(response.content).read_all()
+    assert table.column("title").to_pylist() == ["Item 0", "Item 1", "Item 2"]
+    assert table.column("description").null_count == 3
+    assert pa.types.is_timestamp(table.schema.field("created_at").type)
+
+    # A single item has no Arrow representation
+    item_id = table.column("id")[0].as_py()
+    response = client.get(
+        f"/api/items/{item_id}",
+        headers={**user_token_headers, "Accept": ARROW},
+    )
+    assert response.headers["content-type"] == JSON
@@ -129,3 +129,39 @@ def test_user_cannot_access_other_user_items(
         f"/api/items/{item_id}", headers=user_token_headers
     )
     assert response.status_code == 403
+
+
+def test_user_cannot_modify_other_user_items(
+    client: TestClient, user_token_headers: dict, superuser_token_headers: dict
+):
+    """Test that owner-scoped lookups still tell 403 from 404."""
+    create_response = client.post(
+        "/api/items/",
+        json={"title": "Superuser Item"},
+        headers=superuser_token_headers,
+    )
+    item_id = create_response.json()["id"]
+
+    response = client.patch(
+        f"/api/items/{item_id}",
+        json={"title": "Stolen"},
+        headers=user_token_headers,
+    )
+    assert response.status_code == 403
+    assert response.json()["detail"] == (
+        "Not enough permissions to update this item"
+    )
+    response = client.delete(
+        f"/api/items/{item_id}", headers=user_token_headers
+    )
+    assert response.status_code == 403
+    response = client.delete(
+        f"/api/items/{item_id + 1}", headers=user_token_headers
+    )
+    assert response.status_code == 404
+
+    # The owner still sees it unchanged
+    response = client.get(
+        f"/api/items/{item_id}", headers=superuser_token_headers
+    )
+    assert response.json()["title"] == "Superuser Item"
@@ -0,0 +1,190 @@
+"""Tests for the write-behind job queues."""
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core import jobs
+from app.core.config import settings
+from app.core.database import get_session
+from app.core.redis import create_redis_client
+from app.main import app
+from app.models.user import User
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Register a ``test`` handler recording the batches it applies."""
+    monkeypatch.setattr(settings, "JOBS_BATCH_SIZE", 3)
+    monkeypatch.setattr(settings, "JOBS_FLUSH_INTERVAL_SECONDS", 0.05)
+    monkeypatch.setattr(settings, "JOBS_RETRY_BACKOFF_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "JOBS_MAX_RETRIES", 2)
+    applied: list[list[int]] = []
+    failures = {"left": 0}
+
+    @jobs.job_handler("test")
+    async def record(payloads, engine):
+        if failures["left"]:
+            failures["left"] -= 1
+            raise RuntimeError("database unavailable")
+        applied.append([payload["n"] for payload in payloads])
+
+    yield applied, failures
+    jobs._handlers.pop("test")
+
+
+def test_memory_queue_batches_by_size_and_time(batches):
+    """Test that full batches flush at once and the rest on the timer."""
+    applied, _ = batches
+
+    async def scenario():
+        queue = jobs.JobQueue(engine_factory=lambda: None)
+        await queue.start()
+        for n in range(7):
+            await queue.enqueue("test", {"n": n})
+        await asyncio.sleep(0.2)
+        await queue.drain()
+
+    asyncio.run(scenario())
+    assert applied == [[0, 1, 2], [3, 4, 5], [6]]
+
+
+def test_memory_queue_retries_and_drops(batches):
+    """Test that failed batches are retried, then given up on."""
+    applied, failures = batches
+
+    async def scenario():
+        queue = jobs.JobQueue(engine_factory=lambda: None)
+        await queue.start()
+        failures["left"] = 2  # Succeeds on the last retry
+        await queue.enqueue("test", {"n": 1})
+        await asyncio.sleep(0.2)
+        failures["left"] = 3  # Never succeeds
+        await queue.enqueue("test", {"n": 2})
+        await asyncio.sleep(0.2)
+        await queue.drain()
+
+    asyncio.run(scenario())
+    assert applied == [[1]]
+
+
+def test_full_queue_applies_jobs_inline(batches, monkeypatch):
+    """Test the backpressure: a producer facing a full queue waits, then
+    applies its own job."""
+    applied, _ = batches
+    monkeypatch.setattr(settings, "JOBS_QUEUE_SIZE", 2)
+    monkeypatch.setattr(settings, "JOBS_BATCH_SIZE", 1)
+    monkeypatch.setattr(settings, "JOBS_ENQUEUE_TIMEOUT_SECONDS", 0.01)
+    release = asyncio.Event()
+
+    @jobs.job_handler("slow")
+    async def slow(payloads, engine):
+        await release.wait()
+
+    async def scenario():
+        queue = jobs.JobQueue(engine_factory=lambda: None)
+        await queue.start()
+        await queue.enqueue("slow", {})
+        await asyncio.sleep(0.01)  # The worker is now stuck on it
+        for n in range(3):
+            await queue.enqueue("test", {"n": n})
+        inline = list(applied)
+        release.set()
+        await queue.drain()
+        return inline
+
+    try:
+        inline = asyncio.run(scenario())
+    finally:
+        jobs._handlers.pop("slow")
+    assert inline == [[2]]
+    assert applied == [[2], [0], [1]]
+
+
+def test_drain_applies_queued_jobs(batches, monkeypatch):
+    """Test that draining flushes at once and later jobs run inline."""
+    applied, _ = batches
+    monkeypatch.setattr(settings, "JOBS_FLUSH_INTERVAL_SECONDS", 60.0)
+
+    async def scenario():
+        queue = jobs.JobQueue(engine_factory=lambda: None)
+        await queue.start()
+        await queue.enqueue("test", {"n": 1})
+        await queue.drain(timeout=5)
+        await queue.enqueue("test", {"n": 2})
+
+    asyncio.run(scenario())
+    assert applied == [[1], [2]]
+
+
+def test_redis_stream_queue(batches, monkeypatch):
+    """Test acknowledgement, claiming of stale entries and dead letters."""
+    applied, failures = batches
+    monkeypatch.setattr(settings, "JOBS_STREAM", f"test-jobs:{uuid.uuid4()}")
+    monkeypatch.setattr(settings, "JOBS_STREAM_CLAIM_IDLE_SECONDS", 0.0)
+    monkeypatch.setattr(settings, "JOBS_MAX_RETRIES", 1)
+
+    async def scenario():
+        client = create_redis_client()
+        queue = jobs.RedisStreamJobQueue(lambda: None, client=client)
+        # An entry read by a consumer that died before applying it
+        await queue._create_group()
+        await client.xadd(
+            queue.stream, {"kind": "test", "payload": '{"n": 0}'}
+        )
+        await client.xreadgroup(
+            queue.group, "dead-worker", {queue.stream: ">"}, count=1
+        )
+
+        await queue.start()
+        await queue.enqueue("test", {"n": 1})
+        await asyncio.sleep(0.2)
+        failures["left"] = 4  # Fails on both deliveries
+        await queue.enqueue("test", {"n": 2})
+        await asyncio.sleep(0.3)
+        await queue.drain()
+        try:
+            return (
+                await client.xlen(queue.stream),
+                await client.xrange(queue.dead_letters),
+            )
+        finally:
+            await client.delete(queue.stream, queue.dead_letters)
+            await client.aclose()
+
+    length, dead = asyncio.run(scenario())
+    assert sorted(n for batch in applied for n in batch) == [0, 1]
+    assert length == 0
+    assert [entry["payload"] for _, entry in dead] == ['{"n": 2}']
+
+
+def test_login_bookkeeping_is_written_behind(
+    session: Session, test_user: User, monkeypatch
+):
+    """Test that only the last login is written behind the request."""
+    monkeypatch.setattr(settings, "JOBS_BACKEND", "memory")
+    monkeypatch.setattr(settings, "JOBS_FLUSH_INTERVAL_SECONDS", 60.0)
+    app.dependency_overrides[get_session] = lambda: session
+    try:
+        with TestClient(app) as client:
+            wrong = {"username": "testuser", "password": "wrong"}
+            client.post("/api/auth/login", data=wrong)
+            response = client.post(
+                "/api/auth/login",
+                data={"username": "testuser", "password": "testpassword123"},
+            )
+            assert response.status_code == 200
+            session.expire_all()
+            assert session.get(User, test_user.id).last_login_at is None
+            # The failed attempts were reset by the login itself
+            response = client.post("/api/auth/login", data=wrong)
+            assert response.json()["detail"].endswith(
+                f"remaining: {settings.MAX_LOGIN_ATTEMPTS - 1}"
+            )
+        # The lifespan drained the queue on shutdown
+        session.expire_all()
+        assert session.get(User, test_user.id).last_login_at is not None
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,76 @@
+"""Tests for asymmetric JWT signing, key rotation and JWKS."""
+import jwt
+import pytest
+from fastapi.testclient import TestClient
+
+import app.core.keys as keys
+from app.core.config import settings
+from app.core.security import create_access_token, decode_token
+from app.models.user import User
+
+
+@pytest.fixture(name="keys_dir")
+def keys_dir_fixture(tmp_path, monkeypatch):
+    """Sign with EdDSA using keys from a temporary directory."""
+    (tmp_path / "2026-01.pem").write_bytes(keys.generate_private_key("EdDSA"))
+    monkeypatch.setattr(settings, "ALGORITHM", "EdDSA")
+    monkeypatch.setattr(settings, "JWT_KEYS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "JWT_ACTIVE_KID", None)
+    keys.reload_keyring()
+    yield tmp_path
+    keys._keyring = None
+
+
+def test_tokens_carry_kid_and_verify(keys_dir):
+    """Test that tokens are signed with EdDSA and tagged with the kid."""
+    token = create_access_token(subject=1)
+    header = jwt.get_unverified_header(token)
+    assert header == {"alg": "EdDSA", "kid": "2026-01", "typ": "JWT"}
+    assert decode_token(token)["sub"] == "1"
+
+
+def test_rotation_keeps_old_tokens_valid(keys_dir, monkeypatch):
+    """Test that tokens of the previous key verify after rotating."""
+    old_token = create_access_token(subject=1)
+    (keys_dir / "2026-02.pem").write_bytes(keys.generate_private_key("ES256"))
+    monkeypatch.setattr(settings, "ALGORITHM", "ES256")
+    keys.reload_keyring()
+
+    new_token = create_access_token(subject=1)
+    assert jwt.get_unverified_header(new_token)["kid"] == "2026-02"
+    assert decode_token(old_token)["sub"] == "1"
+    assert decode_token(new_token)["sub"] == "1"
+
+    # Retiring the old key rejects its tokens
+    (keys_dir / "2026-01.pem").unlink()
+    keys.reload_keyring()
+    with pytest.raises(jwt.InvalidTokenError):
+        decode_token(old_token)
+
+
+def test_jwks_publishes_public_keys_only(keys_dir, client: TestClient):
+    """Test that the JWKS endpoint exposes keys other services can use."""
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    [jwk] = response.json()["keys"]
+    assert jwk["kid"] == "2026-01"
+    assert jwk["kty"] == "OKP"
+    assert "d" not in jwk
+
+    public_key = jwt.PyJWK(jwk).key
+    token = create_access_token(subject=1)
+    claims = jwt.decode(token, public_key, algorithms=["EdDSA"])
+    assert claims["sub"] == "1"
+
+
+def test_login_with_asymmetric_keys(
+    keys_dir, client: TestClient, test_user: User
+):
+    """Test the full login and authenticated request flow with EdDSA."""
+    response = client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpassword123"},
+    )
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    response = client.get("/api/users/me", headers=headers)
+    assert response.status_code == 200
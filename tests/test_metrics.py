@@ -0,0 +1,76 @@
+"""Tests for the Prometheus metrics endpoint and middleware."""
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, text
+from sqlalchemy.pool import StaticPool
+
+from app.core.metrics import RequestStats, instrument_engine, request_stats
+
+
+def _sample(body: str, prefix: str) -> float:
+    """Return the value of the first sample line starting with prefix."""
+    for line in body.splitlines():
+        if line.startswith(prefix):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_metrics_endpoint(client: TestClient):
+    """Test that metrics are exposed in the Prometheus text format."""
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "http_requests_total" in response.text
+
+
+def test_metrics_use_route_template(
+    client: TestClient, user_token_headers: dict
+):
+    """Test that requests are labelled by route template, not raw path."""
+    client.get("/api/items/12345", headers=user_token_headers)
+    body = client.get("/metrics").text
+    assert 'route="/api/items/{item_id}"' in body
+    assert "/api/items/12345" not in body
+
+
+def test_metrics_record_db_and_redis_per_request(
+    client: TestClient, test_user
+):
+    """Test that DB queries and Redis commands are counted per route."""
+    prefix_db = 'db_queries_per_request_sum{route="/api/auth/login"}'
+    prefix_redis = 'redis_commands_per_request_sum{route="/api/auth/login"}'
+    before = client.get("/metrics").text
+
+    client.post(
+        "/api/auth/login",
+        data={"username": "testuser", "password": "testpassword123"},
+    )
+
+    after = client.get("/metrics").text
+    assert _sample(after, prefix_db) > _sample(before, prefix_db)
+    assert _sample(after, prefix_redis) > _sample(before, prefix_redis)
+
+
+def test_metrics_unmatched_route(client: TestClient):
+    """Test that unknown paths share a single label."""
+    client.get("/does-not-exist/42")
+    body = client.get("/metrics").text
+    assert 'route="<unmatched>"' in body
+
+
+def test_failed_statements_are_recorded_and_do_not_leak():
+    """Test that a failing statement pops its start time and is counted."""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    instrument_engine(engine)
+    stats = RequestStats()
+    token = request_stats.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(exc.OperationalError):
+                conn.execute(text("SELECT * FROM missing"))
+            conn.execute(text("SELECT 1"))
+            assert conn.info["query_start_time"] == []
+    finally:
+        request_stats.reset(token)
+    assert stats.db_count == 2
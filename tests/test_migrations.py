@@ -0,0 +1,135 @@
+"""Tests for the zero-downtime migration helpers."""
+import logging
+import os
+
+import pytest
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from app.core import migrations
+
+SEED_ROWS = 1_000_000
+
+
+def _seed(engine: sa.Engine, rows: int) -> None:
+    """Create a ``big_items`` table with ``rows`` rows."""
+    with engine.begin() as connection:
+        connection.execute(sa.text("DROP TABLE IF EXISTS big_items"))
+        connection.execute(
+            sa.text(
+                "CREATE TABLE big_items "
+                "(id INTEGER PRIMARY KEY, title VARCHAR(255) NOT NULL)"
+            )
+        )
+        insert = sa.text("INSERT INTO big_items (id, title) VALUES (:id, :t)")
+        for start in range(1, rows + 1, 100_000):
+            connection.execute(
+                insert,
+                [
+                    {"id": i, "t": f"Item {i}"}
+                    for i in range(start, min(start + 100_000, rows + 1))
+                ],
+            )
+
+
+def _migrate(engine: sa.Engine) -> int:
+    """Add, backfill, constrain and index a column like a revision would."""
+    with engine.connect() as connection:
+        migrations.set_migration_timeouts(connection)
+        context = MigrationContext.configure(connection)
+        with Operations.context(context), context.begin_transaction():
+            migrations.add_column(
+                "big_items", sa.Column("slug", sa.String(255), nullable=True)
+            )
+            updated = migrations.backfill(
+                "big_items", "slug = lower(title)", batch_size=100_000
+            )
+            migrations.set_not_null("big_items", "slug")
+            migrations.create_index_concurrently(
+                "ix_big_items_slug", "big_items", ["slug"]
+            )
+        # SQLite DDL is not transactional for Alembic; commit what is left
+        connection.commit()
+    return updated
+
+
+def _check(engine: sa.Engine) -> None:
+    inspector = sa.inspect(engine)
+    columns = {c["name"]: c for c in inspector.get_columns("big_items")}
+    assert columns["slug"]["nullable"] is False
+    assert "ix_big_items_slug" in {
+        index["name"] for index in inspector.get_indexes("big_items")
+    }
+    with engine.connect() as connection:
+        assert connection.execute(
+            sa.text("SELECT slug FROM big_items WHERE id = 42")
+        ).scalar() == "item 42"
+
+
+@pytest.mark.slow
+def test_helpers_on_a_million_rows(tmp_path, caplog):
+    """Test the full add/backfill/constrain/index flow on a large table."""
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'big.db'}")
+    _seed(engine, SEED_ROWS)
+
+    with caplog.at_level(logging.INFO, logger="app.core.migrations"):
+        assert _migrate(engine) == SEED_ROWS
+
+    _check(engine)
+    assert "Backfill of big_items: 100.0% done" in caplog.text
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+@pytest.mark.skipif(
+    "MIGRATION_TEST_DATABASE_URL" not in os.environ,
+    reason="set MIGRATION_TEST_DATABASE_URL to a scratch PostgreSQL database",
+)
+def test_helpers_on_postgresql():
+    """Test CONCURRENTLY indexes and the NOT VALID constraint path."""
+    engine = sa.create_engine(os.environ["MIGRATION_TEST_DATABASE_URL"])
+    _seed(engine, SEED_ROWS)
+    try:
+        assert _migrate(engine) == SEED_ROWS
+        _check(engine)
+        with engine.connect() as connection:
+            assert connection.execute(
+                sa.text(
+                    "SELECT i.indisvalid FROM pg_index i "
+                    "JOIN pg_class c ON c.oid = i.indexrelid "
+                    "WHERE c.relname = 'ix_big_items_slug'"
+                )
+            ).scalar() is True
+    finally:
+        with engine.begin() as connection:
+            connection.execute(sa.text("DROP TABLE big_items"))
+
+
+def test_add_column_refuses_table_rewrites(tmp_path):
+    """Test that columns needing a scan or rewrite are rejected."""
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'small.db'}")
+    _seed(engine, 10)
+    with engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        with Operations.context(context):
+            with pytest.raises(ValueError, match="backfill"):
+                migrations.add_column(
+                    "big_items", sa.Column("rank", sa.Integer, nullable=False)
+                )
+            with pytest.raises(ValueError, match="Volatile"):
+                migrations.add_column(
+                    "big_items",
+                    sa.Column(
+                        "token",
+                        sa.String(36),
+                        server_default=sa.text("gen_random_uuid()"),
+                    ),
+                )
+            # A constant default is a metadata-only change
+            migrations.add_column(
+                "big_items",
+                sa.Column(
+                    "rank", sa.Integer, nullable=False, server_default="0"
+                ),
+            )
@@ -0,0 +1,118 @@
+"""Tests for the hash partitioning of the items table."""
+import os
+
+import pytest
+import sqlalchemy as sa
+from sqlmodel import SQLModel
+
+from app.core import partitioning
+from app.models.item import Item  # noqa: F401 - registers the items table
+from app.models.user import User  # noqa: F401 - registers the users table
+
+
+def test_partition_ddl():
+    """Test the partitioned table layout."""
+    statements = partitioning.partition_ddl(4)
+    assert statements[0] == (
+        "CREATE TABLE items_partitioned (LIKE items INCLUDING DEFAULTS) "
+        "PARTITION BY HASH (owner_id)"
+    )
+    partitions = [s for s in statements if "PARTITION OF" in s]
+    assert [s.split()[2] for s in partitions] == [
+        "items_p0", "items_p1", "items_p2", "items_p3",
+    ]
+    assert all("MODULUS 4" in s for s in partitions)
+    assert any("PRIMARY KEY (id, owner_id)" in s for s in statements)
+    assert statements[-1].startswith("CREATE TRIGGER items_mirror")
+
+    with pytest.raises(ValueError):
+        partitioning.partition_ddl(0)
+
+
+def _plan(connection: sa.Connection, sql: str) -> str:
+    return "\n".join(
+        connection.execute(sa.text(f"EXPLAIN {sql}")).scalars()
+    )
+
+
+@pytest.mark.slow
+@pytest.mark.integration
+@pytest.mark.skipif(
+    "MIGRATION_TEST_DATABASE_URL" not in os.environ,
+    reason="set MIGRATION_TEST_DATABASE_URL to a scratch PostgreSQL database",
+)
+def test_online_migration_on_postgresql():
+    """Test that writes during the copy survive the swap and pruning."""
+    engine = sa.create_engine(os.environ["MIGRATION_TEST_DATABASE_URL"])
+    SQLModel.metadata.drop_all(engine)
+    SQLModel.metadata.create_all(engine)
+    try:
+        with engine.begin() as connection:
+            connection.execute(
+                sa.text(
+                    "INSERT INTO users (email, username, is_active, "
+                    "is_superuser, hashed_password, created_at, updated_at) "
+                    "SELECT g || '@test.dev', 'u' || g, true, false, 'x', "
+                    "now(), now() FROM generate_series(1, 50) g"
+                )
+            )
+            connection.execute(
+                sa.text(
+                    "INSERT INTO items (title, owner_id, created_at, "
+                    "updated_at) SELECT 'Item ' || g, 1 + g % 50, now(), "
+                    "now() FROM generate_series(1, 10000) g"
+                )
+            )
+
+        with engine.connect() as connection:
+            partitioning.prepare(connection, partitions=8)
+            # Writes between prepare and the copy are mirrored
+            connection.execute(
+                sa.text("UPDATE items SET title = 'Renamed' WHERE id = 1")
+            )
+            connection.execute(sa.text("DELETE FROM items WHERE id = 2"))
+            connection.execute(
+                sa.text(
+                    "INSERT INTO items (title, owner_id, created_at, "
+                    "updated_at) VALUES ('New', 7, now(), now())"
+                )
+            )
+            connection.commit()
+        partitioning.migrate(8, batch_size=1_000, pause=0, engine=engine)
+
+        with engine.connect() as connection:
+            assert partitioning.is_partitioned(connection)
+            assert connection.execute(
+                sa.text("SELECT count(*) FROM items")
+            ).scalar() == 10_000
+            assert connection.execute(
+                sa.text("SELECT title FROM items WHERE id = 1")
+            ).scalar() == "Renamed"
+            # The sequence carries on after the swap
+            new_id = connection.execute(
+                sa.text(
+                    "INSERT INTO items (title, owner_id, created_at, "
+                    "updated_at) VALUES ('After', 3, now(), now()) "
+                    "RETURNING id"
+                )
+            ).scalar()
+            assert new_id == 10_002
+            connection.commit()
+
+            plan = _plan(
+                connection,
+                "SELECT * FROM items WHERE id = 5 AND owner_id = 6",
+            )
+            assert plan.count(" on items_p") == 1
+            indexes = {
+                index["name"] for index in sa.inspect(engine).get_indexes(
+                    "items"
+                )
+            }
+            assert {"ix_items_owner_id", "ix_items_title"} <= indexes
+    finally:
+        with engine.begin() as connection:
+            connection.execute(
+                sa.text("DROP TABLE IF EXISTS items_unpartitioned")
+            )
+        SQLModel.metadata.drop_all(engine)
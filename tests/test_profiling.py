@@ -0,0 +1,131 @@
+"""Tests for the opt-in request profiler."""
+import asyncio
+import threading
+import time
+
+import anyio
+from fastapi.testclient import TestClient
+
+from app.core import profiling
+from app.core.config import settings
+from app.core.database import get_session
+from app.main import app
+
+
+def test_superuser_can_profile_request(
+    client: TestClient, superuser_token_headers: dict, tmp_path, monkeypatch
+):
+    """Test that a superuser gets a Server-Timing breakdown and a profile."""
+    monkeypatch.setattr(settings, "PROFILER_OUTPUT_DIR", str(tmp_path))
+    response = client.get(
+        "/api/users/me?profile=1", headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    assert "server-timing" in response.headers
+
+    [profile] = tmp_path.glob("*-GET-api_users_me.collapsed")
+    for line in profile.read_text().splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.split(";", 1)[0] in {
+            "argon2", "jwt", "sqlalchemy", "redis", "serialization", "app",
+        }
+        assert int(count) > 0
+
+
+def test_profile_flag_ignored_for_normal_user(
+    client: TestClient, user_token_headers: dict, tmp_path, monkeypatch
+):
+    """Test that non-superusers cannot enable profiling."""
+    monkeypatch.setattr(settings, "PROFILER_OUTPUT_DIR", str(tmp_path))
+    response = client.get(
+        "/api/users/me",
+        headers={**user_token_headers, "X-Profile": "1"},
+    )
+    assert response.status_code == 200
+    assert "server-timing" not in response.headers
+    assert not list(tmp_path.iterdir())
+
+
+def test_superuser_check_opens_session_off_the_loop(
+    client: TestClient, session, superuser_token_headers: dict, tmp_path,
+    monkeypatch,
+):
+    """Test that the profiler's session is not opened on the event loop."""
+    monkeypatch.setattr(settings, "PROFILER_OUTPUT_DIR", str(tmp_path))
+    on_loop = []
+
+    def get_session_override():
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(True)
+        except RuntimeError:
+            on_loop.append(False)
+        yield session
+
+    app.dependency_overrides[get_session] = get_session_override
+    response = client.get(
+        "/health?profile=1", headers=superuser_token_headers
+    )
+    assert "server-timing" in response.headers
+    # The profiler's own session, before any route dependency
+    assert on_loop[0] is False
+
+
+def test_profile_flag_must_be_exact(
+    client: TestClient, superuser_token_headers: dict, tmp_path, monkeypatch
+):
+    """Test that look-alike query parameters do not enable profiling."""
+    monkeypatch.setattr(settings, "PROFILER_OUTPUT_DIR", str(tmp_path))
+    for query in ("noprofile=1", "profile=10"):
+        response = client.get(
+            f"/api/users/me?{query}", headers=superuser_token_headers
+        )
+        assert "server-timing" not in response.headers
+    assert not list(tmp_path.iterdir())
+
+
+def test_sample_rate_profiles_without_flag(
+    client: TestClient, superuser_token_headers: dict, tmp_path, monkeypatch
+):
+    """Test that sampled requests are profiled, timings only for admins."""
+    monkeypatch.setattr(settings, "PROFILER_OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILER_SAMPLE_RATE", 1.0)
+    response = client.get("/health")
+    assert "server-timing" not in response.headers
+    assert len(list(tmp_path.iterdir())) == 1
+
+    response = client.get("/health", headers=superuser_token_headers)
+    assert "server-timing" in response.headers
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def _busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _other_request(seconds: float) -> None:
+    _busy(seconds)
+
+
+def test_sampler_ignores_other_threads():
+    """Test that only the profiled request's threads are sampled."""
+
+    async def scenario():
+        sampler = profiling.StackSampler(0.001)
+        other = threading.Thread(target=_other_request, args=(0.2,))
+        other.start()
+        token = profiling._profiled.set(sampler)
+        sampler.start()
+        try:
+            await anyio.to_thread.run_sync(_busy, 0.1)
+        finally:
+            sampler.stop()
+            profiling._profiled.reset(token)
+        other.join()
+        return sampler.samples
+
+    samples = asyncio.run(scenario())
+    assert any(":_busy" in stack for stack in samples)
+    assert not any("_other_request" in stack for stack in samples)
@@ -0,0 +1,154 @@
+"""Tests for bulk user provisioning."""
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+
+from app.core import provisioning
+from app.core.config import settings
+from app.core.security import verify_password
+from app.models.user import User
+
+CSV = """email,username,password,full_name
+ana@example.com,ana,anapassword,Ana
+test@example.com,taken,password123,
+bob@example.com,bob,short,
+ana@example.com,ana2,anapassword,
+carla@example.com,carla,carlapassword,
+"""
+
+
+@pytest.fixture(autouse=True)
+def hash_in_process(monkeypatch):
+    """Skip the process pool unless a test asks for it."""
+    monkeypatch.setattr(settings, "PROVISION_WORKERS", 1)
+
+
+def test_provision_users_from_csv(session: Session, test_user: User):
+    """Test that valid rows are created and the others reported."""
+    report = provisioning.provision_users(
+        session,
+        provisioning.read_rows(io.StringIO(CSV), "csv"),
+        chunk_size=2,
+    )
+
+    assert report.created == 2
+    assert [(row.line, row.reason) for row in report.rejected] == [
+        (3, "Email already registered"),
+        (4, "password: String should have at least 8 characters"),
+        (5, "Email repeated in the file"),
+    ]
+    ana = session.exec(select(User).where(User.username == "ana")).one()
+    assert ana.full_name == "Ana"
+    assert not ana.is_superuser
+    assert verify_password("anapassword", ana.hashed_password)
+
+
+def test_provision_users_from_ndjson_with_a_process_pool(session: Session):
+    """Test NDJSON input hashed by a pool kept between imports."""
+    lines = [
+        '{"email": "u%d@example.com", "username": "u%d", '
+        '"password": "password%d"}' % (n, n, n)
+        for n in range(6)
+    ]
+    lines.insert(2, "{not json")
+    stream = io.StringIO("\n".join(lines) + "\n")
+
+    try:
+        report = provisioning.provision_users(
+            session, provisioning.read_rows(stream, "ndjson"), workers=2
+        )
+        pool = provisioning._pool
+        stream = io.StringIO(
+            '{"email": "v@example.com", "username": "v", '
+            '"password": "password6"}\n'
+        )
+        again = provisioning.provision_users(
+            session, provisioning.read_rows(stream, "ndjson"), workers=2
+        )
+        assert pool is not None and provisioning._pool is pool
+    finally:
+        provisioning.shutdown_hashing_pool()
+
+    assert report.created == 6
+    assert again.created == 1
+    assert provisioning._pool is None
+    assert [(row.line, row.reason) for row in report.rejected] == [
+        (3, "Unreadable record")
+    ]
+    user = session.exec(select(User).where(User.username == "u5")).one()
+    assert verify_password("password5", user.hashed_password)
+
+
+def test_rows_lost_to_a_concurrent_registration_are_rejected(
+    session: Session, test_user: User, monkeypatch
+):
+    """Test that a conflict missed by every check rejects only its row."""
+    # As if test@example.com had been registered after both checks
+    monkeypatch.setattr(
+        provisioning, "_reject_registered", lambda session, users, _: users
+    )
+    csv = (
+        "email,username,password\n"
+        "dan@example.com,dan,danpassword\n"
+        "test@example.com,taken,password123\n"
+        "eve@example.com,eve,evepassword\n"
+    )
+
+    report = provisioning.provision_users(
+        session, provisioning.read_rows(io.StringIO(csv), "csv")
+    )
+
+    assert report.created == 2
+    assert [(row.line, row.reason) for row in report.rejected] == [
+        (3, "Email or username already registered")
+    ]
+    usernames = session.exec(select(User.username)).all()
+    assert sorted(usernames) == ["dan", "eve", "testuser"]
+
+
+def test_cli_writes_rejected_rows(tmp_path, monkeypatch, session: Session):
+    """Test the command line entry point and its rejected-rows report."""
+    monkeypatch.setattr(provisioning, "get_engine", session.get_bind)
+    source = tmp_path / "users.csv"
+    source.write_text(CSV)
+    rejected = tmp_path / "rejected.csv"
+
+    status = provisioning.main([str(source), "--rejected", str(rejected)])
+
+    assert status == 1
+    assert rejected.read_text().splitlines() == [
+        "line,email,username,reason",
+        "4,bob@example.com,bob,password: String should have at least 8 "
+        "characters",
+        "5,ana@example.com,ana2,Email repeated in the file",
+    ]
+
+
+def test_bulk_endpoint(
+    client: TestClient,
+    superuser_token_headers: dict,
+    user_token_headers: dict,
+    monkeypatch,
+):
+    """Test the superuser-only upload endpoint and its row limit."""
+    files = {"file": ("users.csv", CSV, "text/csv")}
+    response = client.post(
+        "/api/users/bulk", files=files, headers=user_token_headers
+    )
+    assert response.status_code == 403
+
+    response = client.post(
+        "/api/users/bulk", files=files, headers=superuser_token_headers
+    )
+    assert response.status_code == 200
+    body = response.json()
+    assert body["created"] == 2
+    assert [row["line"] for row in body["rejected"]] == [3, 4, 5]
+
+    monkeypatch.setattr(settings, "PROVISION_MAX_ROWS_PER_REQUEST", 3)
+    response = client.post(
+        "/api/users/bulk", files=files, headers=superuser_token_headers
+    )
+    assert response.status_code == 413
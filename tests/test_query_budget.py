@@ -0,0 +1,86 @@
+"""Tests for per-request query budgets and N+1 detection."""
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import Session, select
+from starlette.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.query_budget import QueryBudgetExceeded, QueryBudgetMiddleware
+from app.core.security import get_password_hash
+from app.models.item import Item
+from app.models.user import User
+
+
+def _items_with_distinct_owners(session: Session, count: int) -> None:
+    """Create one item per freshly created owner."""
+    for i in range(count):
+        owner = User(
+            email=f"owner{i}@example.com",
+            username=f"owner{i}",
+            hashed_password=get_password_hash("password123"),
+        )
+        session.add(owner)
+        session.commit()
+        session.add(Item(title=f"Item {i}", owner_id=owner.id))
+    session.commit()
+    session.expunge_all()
+
+
+def _listing_app(session: Session):
+    """ASGI app that lists items and lazily loads each owner (N+1)."""
+    async def endpoint(scope, receive, send):
+        for item in session.exec(select(Item)).all():
+            item.owner
+        await PlainTextResponse("ok")(scope, receive, send)
+
+    return QueryBudgetMiddleware(endpoint)
+
+
+def test_read_items_constant_query_count(
+    client: TestClient, user_token_headers: dict, query_reports: list
+):
+    """Test that listing items does not scale queries with row count."""
+    for i in range(5):
+        client.post(
+            "/api/items/", json={"title": f"Item {i}"}, headers=user_token_headers
+        )
+    query_reports.clear()
+
+    client.get("/api/items/", headers=user_token_headers)
+
+    [report] = query_reports
+    assert report.route == "/api/items/"
+    assert report.count == 2
+    assert report.budget == 2
+
+
+def test_repeated_statements_raise(
+    session: Session, monkeypatch, query_reports: list
+):
+    """Test that lazy loading in a loop is flagged as N+1 in raise mode."""
+    monkeypatch.setattr(settings, "QUERY_REPEAT_THRESHOLD", 3)
+    _items_with_distinct_owners(session, 3)
+
+    with pytest.raises(QueryBudgetExceeded, match="N\\+1"):
+        TestClient(_listing_app(session)).get("/")
+    query_reports.clear()
+
+
+def test_budget_exceeded_logs_in_log_mode(
+    session: Session, monkeypatch, caplog, query_reports: list
+):
+    """Test that log mode reports violations without failing the request."""
+    monkeypatch.setattr(settings, "QUERY_BUDGET_MODE", "log")
+    monkeypatch.setattr(settings, "QUERY_BUDGET_DEFAULT", 2)
+    _items_with_distinct_owners(session, 3)
+
+    with caplog.at_level(logging.WARNING, logger="app.core.query_budget"):
+        response = TestClient(_listing_app(session)).get("/")
+
+    assert response.status_code == 200
+    assert "Query budget exceeded" in caplog.text
+    [report] = query_reports
+    assert report.over_budget
+    query_reports.clear()
@@ -0,0 +1,146 @@
+"""Tests for the Redis client pool and command batching."""
+import asyncio
+
+from fakeredis import FakeAsyncRedis
+
+from app.core.config import settings
+from app.core.redis import (
+    ClientSideCache,
+    LocalCache,
+    RedisBatcher,
+    create_redis_client,
+)
+
+
+class CountingRedis(FakeAsyncRedis):
+    """Fake client counting pipelines and direct commands."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pipelines = 0
+        self.direct = 0
+
+    def pipeline(self, *args, **kwargs):
+        self.pipelines += 1
+        return super().pipeline(*args, **kwargs)
+
+    async def execute_command(self, *args, **options):
+        self.direct += 1
+        return await super().execute_command(*args, **options)
+
+
+def test_pool_configured_from_settings():
+    """Test that the client uses a bounded blocking pool with timeouts."""
+    client = create_redis_client()
+    pool = client.connection_pool
+    assert pool.max_connections == settings.REDIS_MAX_CONNECTIONS
+    assert pool.timeout == settings.REDIS_POOL_TIMEOUT
+    kwargs = pool.connection_kwargs
+    assert kwargs["socket_timeout"] == settings.REDIS_SOCKET_TIMEOUT
+    assert kwargs["health_check_interval"] == (
+        settings.REDIS_HEALTH_CHECK_INTERVAL
+    )
+    assert kwargs["retry"].get_retries() == settings.REDIS_RETRY_ATTEMPTS
+
+
+def test_batcher_coalesces_concurrent_commands():
+    """Test that commands issued in the same tick share one pipeline."""
+    async def scenario():
+        client = CountingRedis(decode_responses=True)
+        await client.set("token_epoch:a", "3")
+        client.direct = 0
+        batcher = RedisBatcher(client)
+        results = await asyncio.gather(
+            *(batcher.execute("GET", f"token_epoch:{k}") for k in "abcd")
+        )
+        return client, results
+
+    client, results = asyncio.run(scenario())
+    assert results == ["3", None, None, None]
+    assert client.pipelines == 1
+
+
+def test_batcher_sends_single_command_directly():
+    """Test that a lone command skips the pipeline."""
+    async def scenario():
+        client = CountingRedis(decode_responses=True)
+        batcher = RedisBatcher(client)
+        await batcher.execute("GET", "user_blocked:nobody")
+        return client
+
+    client = asyncio.run(scenario())
+    assert client.pipelines == 0
+    assert client.direct == 1
+
+
+def test_batcher_respects_max_size():
+    """Test that a full batch is flushed without waiting for the tick."""
+    async def scenario():
+        client = CountingRedis(decode_responses=True)
+        batcher = RedisBatcher(client, max_size=2)
+        await asyncio.gather(
+            *(batcher.execute("GET", f"k{i}") for i in range(4))
+        )
+        return client
+
+    assert asyncio.run(scenario()).pipelines == 2
+
+
+def test_local_cache_evicts_least_recently_used():
+    """Test that the local cache stays within its size bound."""
+    cache = LocalCache(max_size=2)
+    cache.set("a", "1")
+    cache.set("b", None)
+    cache.get("a")
+    cache.set("c", "3")
+    assert len(cache) == 2
+    assert "a" in cache and "c" in cache
+    assert "b" not in cache
+
+
+def test_client_side_cache_invalidated_by_redis():
+    """Test that writes from another client evict the cached value."""
+    async def scenario():
+        client = create_redis_client()
+        writer = create_redis_client()
+        key = "token_epoch:test-client-cache"
+        await writer.delete(key)
+        cache = ClientSideCache(client)
+        await cache.start()
+        fetches = 0
+
+        async def fetch():
+            nonlocal fetches
+            fetches += 1
+            return await client.get(key)
+
+        try:
+            assert cache.connected
+            first = await cache.get(key, fetch)
+            second = await cache.get(key, fetch)
+            await writer.set(key, "1")
+            # Wait for the invalidation pushed by Redis
+            for _ in range(100):
+                if key not in cache.local:
+                    break
+                await asyncio.sleep(0.01)
+            third = await cache.get(key, fetch)
+        finally:
+            await writer.delete(key)
+            await cache.stop()
+            await client.aclose(close_connection_pool=True)
+            await writer.aclose(close_connection_pool=True)
+        return first, second, third, fetches
+
+    first, second, third, fetches = asyncio.run(scenario())
+    assert (first, second, third) == (None, None, "1")
+    assert fetches == 2
+
+
+def test_client_side_cache_ignores_other_prefixes():
+    """Test that only the configured key prefixes are cached."""
+    cache = ClientSideCache(FakeAsyncRedis())
+    cache.connected = True
+    assert cache.handles("token_epoch:42")
+    assert cache.handles("user_blocked:bob")
+    assert not cache.handles("login_attempts:bob")
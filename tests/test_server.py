@@ -0,0 +1,94 @@
+"""Tests for the pre-forking production server."""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+from app.server import Supervisor
+
+ROOT = Path(__file__).parent.parent
+
+
+class CrashingSupervisor(Supervisor):
+    """Supervisor whose workers crash as soon as they start."""
+
+    spawned = 0
+
+    def spawn(self, index: int) -> None:
+        self.spawned += 1
+        super().spawn(index)
+
+    def serve(self) -> int:
+        raise RuntimeError("boom")
+
+
+def test_crashing_workers_are_respawned_with_backoff():
+    """Test that a crash loop does not fork a worker every tick."""
+    supervisor = CrashingSupervisor(
+        None, None, 1, respawn_backoff=0.05, respawn_backoff_max=1.0
+    )
+    supervisor.spawn(0)
+    deadline = time.monotonic() + 0.6
+    while time.monotonic() < deadline:
+        supervisor.reap()
+        supervisor.respawn_due()
+        time.sleep(0.01)
+    supervisor.stopping = True
+    while supervisor.children:
+        supervisor.reap()
+        time.sleep(0.01)
+
+    # Delays of 0.05, 0.1, 0.2 and 0.4 s: a handful of forks, not ~60
+    assert 3 <= supervisor.spawned <= 5
+    assert supervisor.crashes[0] >= 3
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_workers_are_recycled_and_stop_gracefully():
+    """Test that workers are replaced after max requests and stop on TERM."""
+    port = _free_port()
+    env = {
+        **os.environ,
+        "WARMUP_ENABLED": "False",
+        "SERVER_MAX_REQUESTS_JITTER": "0",
+    }
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "app.server", "--host", "127.0.0.1",
+            "--port", str(port), "--workers", "1", "--max-requests", "2",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    try:
+        codes = []
+        deadline = time.monotonic() + 15
+        while len(codes) < 6 and time.monotonic() < deadline:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/health")
+                codes.append(response.status_code)
+            except httpx.TransportError:
+                time.sleep(0.1)  # Starting, or a worker being replaced
+        assert codes == [200] * 6
+    finally:
+        process.send_signal(signal.SIGTERM)
+        output, _ = process.communicate(timeout=30)
+
+    assert process.returncode == 0
+    # uvicorn checks the limit on its 0.1 s tick, so a worker may serve a
+    # few more requests before exiting; at least one was replaced
+    assert "exited with 0" in output
+    assert "Started server process" in output.split("exited with 0")[1]
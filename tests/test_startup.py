@@ -0,0 +1,45 @@
+"""Tests for application startup cost."""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+# Generous compared to the ~1.1 s measured locally, to catch regressions
+# such as a heavy eager import without flaking on slow CI machines.
+IMPORT_TIME_BUDGET_SECONDS = 3.0
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+import sys
+import app.core.database as database
+import app.core.redis as app_redis
+from app.core.security import get_password_hasher
+print(json.dumps({
+    "elapsed": elapsed,
+    "engine": database._engine is not None,
+    "redis": app_redis.redis_client is not None,
+    "hasher": get_password_hasher.cache_info().currsize > 0,
+    "psycopg2": "psycopg2" in sys.modules,
+}))
+"""
+
+
+def test_import_app_main_within_budget():
+    """Test that importing the app is fast and defers heavy setup."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=Path(__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    probe = json.loads(result.stdout)
+    assert probe["elapsed"] < IMPORT_TIME_BUDGET_SECONDS
+    # Engine, driver, Redis client and hasher are created on first use
+    assert not probe["engine"]
+    assert not probe["redis"]
+    assert not probe["hasher"]
+    assert not probe["psycopg2"]
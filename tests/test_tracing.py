@@ -0,0 +1,83 @@
+"""Tests for request tracing."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.tracing import (
+    InMemorySpanExporter,
+    SimpleSpanProcessor,
+    parse_traceparent,
+    set_span_processor,
+)
+from app.models.user import User
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+PARENT_ID = "00f067aa0ba902b7"
+
+
+@pytest.fixture(name="exporter")
+def exporter_fixture(monkeypatch):
+    """Enable tracing with a synchronous in-memory exporter."""
+    monkeypatch.setattr(settings, "TRACING_ENABLED", True)
+    monkeypatch.setattr(settings, "TRACING_SAMPLE_RATE", 1.0)
+    exporter = InMemorySpanExporter()
+    set_span_processor(SimpleSpanProcessor(exporter))
+    yield exporter
+    set_span_processor(None)
+
+
+def test_spans_propagate_incoming_trace(
+    client: TestClient, user_token_headers: dict, exporter
+):
+    """Test that auth and SQL spans join the caller's trace."""
+    client.get(
+        "/api/users/me",
+        headers={
+            **user_token_headers,
+            "traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01",
+        },
+    )
+    spans = {span["name"]: span for span in exporter.spans}
+
+    root = spans["GET /api/users/me"]
+    assert root["parentSpanId"] == PARENT_ID
+    assert root["attributes"]["http.status_code"] == 200
+    for name in (
+        "deps.get_current_user",
+        "security.get_token_epoch",
+        "db.query",
+    ):
+        assert spans[name]["traceId"] == TRACE_ID
+    assert (
+        spans["security.get_token_epoch"]["parentSpanId"]
+        == spans["deps.get_current_user"]["spanId"]
+    )
+
+
+def test_login_records_password_verification(
+    client: TestClient, test_user: User, exporter
+):
+    """Test that Argon2 verification appears as its own span."""
+    client.post(
+        "/api/auth/login",
+        data={"username": test_user.username, "password": "testpassword123"},
+    )
+    names = {span["name"] for span in exporter.spans}
+    assert "security.verify_password" in names
+
+
+def test_unsampled_parent_is_not_traced(client: TestClient, exporter):
+    """Test that head-based sampling honours the caller's decision."""
+    client.get(
+        "/health", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-00"}
+    )
+    assert exporter.spans == []
+
+
+def test_parse_traceparent_rejects_invalid():
+    """Test traceparent validation."""
+    assert parse_traceparent("garbage") is None
+    assert parse_traceparent(f"00-{'0' * 32}-{PARENT_ID}-01") is None
+    assert parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (
+        TRACE_ID, PARENT_ID, True,
+    )
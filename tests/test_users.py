@@ -74,3 +74,27 @@ def test_read_user_me(
     data = response.json()
     assert data["email"] == test_user.email
     assert data["username"] == test_user.username
+
+
+def test_list_blocked_users_as_superuser(
+    client: TestClient, superuser_token_headers: dict
+):
+    """Test that the blocked list is not shadowed by /users/{user_id}."""
+    response = client.get("/api/users/blocked", headers=superuser_token_headers)
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+
+
+def test_password_change_revokes_tokens(
+    client: TestClient, user_token_headers: dict
+):
+    """Test that changing the password revokes existing tokens."""
+    response = client.patch(
+        "/api/users/me",
+        headers=user_token_headers,
+        json={"password": "newpassword123"},
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/users/me", headers=user_token_headers)
+    assert response.status_code == 401
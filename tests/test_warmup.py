@@ -0,0 +1,47 @@
+"""Tests for worker warm-up and the readiness endpoint."""
+import time
+
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.core.database import get_session
+from app.core.warmup import readiness
+from app.main import app
+
+
+def _wait_until_ready(client: TestClient, timeout: float = 10.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        response = client.get("/ready")
+        if response.status_code == 200 or time.monotonic() > deadline:
+            return response
+        time.sleep(0.05)
+
+
+def test_ready_after_warmup(session: Session, monkeypatch):
+    """Test that /ready reports every warm-up step once it is done."""
+    monkeypatch.setattr(settings, "WARMUP_ENABLED", True)
+    monkeypatch.setitem(app.dependency_overrides, get_session, lambda: session)
+    with TestClient(app) as client:
+        response = _wait_until_ready(client)
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "ready"
+    assert set(body["steps"]) == {
+        "database", "redis", "openapi", "signing_keys", "password_hash"
+    }
+    assert all(step["ok"] for step in body["steps"].values())
+    # The OpenAPI schema is already built for the first /docs request
+    assert app.openapi_schema is not None
+
+
+def test_not_ready_while_warming_up(client: TestClient):
+    """Test that /ready answers 503 until warm-up succeeds."""
+    readiness.reset()
+    readiness.steps["database"] = {"ok": False, "error": "refused"}
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming_up"
+    # Liveness is reported separately
+    assert client.get("/health").status_code == 200